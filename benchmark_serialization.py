@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+响应序列化性能测试
+对比 FastAPI默认路径（jsonable_encoder + 标准库json）与 ORJSONResponse 直接序列化
+测试数据：20辆车的列表页（含缩略图BASE64），以及单辆车详情（含原图BASE64）
+另外对比查询结果行转为响应dict的两种方式：逐字段查字段表，与crud.car_serializer预先构建的序列化函数
+"""
+
+import base64
+import json
+import os
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timezone
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+ROUNDS = 200
+
+def fake_data_url(size):
+    return "data:image/jpeg;base64," + base64.b64encode(os.urandom(size)).decode('utf-8')
+
+def build_list_page(count=20, thumbnail_size=15 * 1024):
+    """与crud.get_cars返回结构一致的列表页"""
+    return {
+        "cars": [
+            {
+                "id": index,
+                "region": "南山",
+                "contact": "13800138000",
+                "description": "宝马X5 2020款 白色 一手车 无事故",
+                "created_at": datetime(2024, 5, 1, 12, 30, index, tzinfo=timezone.utc),
+                "thumbnail_base64": fake_data_url(thumbnail_size)
+            }
+            for index in range(count)
+        ],
+        "total": 1000,
+        "page": 1,
+        "limit": count,
+        "has_more": True
+    }
+
+def build_details(image_size=300 * 1024):
+    """与crud.get_car_details返回结构一致的详情"""
+    return {
+        "id": 1,
+        "region": "南山",
+        "image_base64": fake_data_url(image_size),
+        "contact": "13800138000",
+        "description": "宝马X5 2020款 白色",
+        "created_at": datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    }
+
+def default_path(content):
+    """FastAPI对普通dict返回值的处理：jsonable_encoder后由JSONResponse用json.dumps渲染"""
+    return JSONResponse(jsonable_encoder(content)).body
+
+def orjson_path(content):
+    """直接返回ORJSONResponse，orjson原生处理datetime，不经过jsonable_encoder"""
+    return ORJSONResponse(content).body
+
+def measure(func, content):
+    # 计时
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        body = func(content)
+    elapsed_ms = (time.perf_counter() - started) * 1000 / ROUNDS
+
+    # 单次调用的内存分配峰值
+    tracemalloc.start()
+    func(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed_ms, peak, len(body)
+
+def run_case(name, content):
+    print(f"\n{name}")
+    print("-" * 60)
+    results = {}
+    for label, func in (("jsonable_encoder + json", default_path), ("orjson", orjson_path)):
+        elapsed_ms, peak, size = measure(func, content)
+        results[label] = elapsed_ms
+        print(f"  {label:<24} {elapsed_ms:8.3f} ms/次   分配峰值 {peak / 1024:8.1f} KB   响应 {size / 1024:.1f} KB")
+
+    speedup = results["jsonable_encoder + json"] / results["orjson"]
+    print(f"  orjson 提速: {speedup:.1f}x")
+
+    # 两种序列化结果语义一致
+    assert json.loads(default_path(content)) == json.loads(orjson_path(content))
+
+def build_rows(count=20, thumbnail_size=15 * 1024):
+    """与列表页查询结果一致的行（只含列表字段对应的列，BASE64存储）"""
+    Row = namedtuple("Row", [
+        "id", "region", "contact", "description", "created_at", "thumbnail_base64", "thumbnail_data",
+        "thumbnail_key", "image_width", "image_height", "status"
+    ])
+    return [
+        Row(index, "南山", "13800138000", "宝马X5 2020款 白色", datetime(2024, 5, 1, tzinfo=timezone.utc),
+            fake_data_url(thumbnail_size), None, None, 640, 480, "ready")
+        for index in range(count)
+    ]
+
+def run_rows_case(name, rows, fields):
+    import crud
+
+    def lookup_path(rows):
+        return [{field: crud.CAR_FIELDS[field][1](row) for field in fields} for row in rows]
+
+    def prebuilt_path(rows):
+        serialize = crud.car_serializer(fields)
+        return [serialize(row) for row in rows]
+
+    print(f"\n{name}")
+    print("-" * 60)
+    results = {}
+    for label, func in (("逐字段查表", lookup_path), ("预构建序列化函数", prebuilt_path)):
+        elapsed_ms, peak, _ = measure(func, rows)
+        results[label] = elapsed_ms
+        print(f"  {label:<16} {elapsed_ms * 1000:8.1f} µs/次   分配峰值 {peak / 1024:8.1f} KB")
+    print(f"  预构建提速: {results['逐字段查表'] / results['预构建序列化函数']:.1f}x")
+    assert lookup_path(rows) == prebuilt_path(rows)
+
+def main():
+    print("=" * 60)
+    print("响应序列化性能测试")
+    print("=" * 60)
+    run_case("列表页: 20辆车 + 15KB缩略图", build_list_page())
+    run_case("详情: 300KB原图", build_details())
+
+    import crud
+    rows = build_rows()
+    run_rows_case("行转换: 20行列表字段", rows, crud.LIST_FIELDS)
+    run_rows_case("行转换: 20行 fields=id,region,created_at", rows, ("id", "region", "created_at"))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,419 @@
+"""
+可替换的共享缓存后端
+多个uvicorn工作进程或多台机器部署时，进程内缓存会各自过期、重复占用内存，写操作也只能清除本进程的缓存。
+缓存数据统一放在后端中，按 CACHE_BACKEND 选择：
+    memory  进程内（单进程部署，默认）
+    redis   Redis协议服务（Redis/KeyDB/Dragonfly等），所有进程和机器共享
+    disk    本地目录，同一台机器上的工作进程共享
+失效使用带版本号的命名空间：每个条目记录写入时的命名空间版本，invalidate()只需把版本号加一，
+所有进程读到版本不一致的条目即视为未命中，不需要逐个删除键，也不需要广播。
+读取时版本号和条目在一次往返中取回（Redis使用MGET）。
+值使用紧凑的二进制编码：bytes原样保存（缩略图不经过BASE64），字符串UTF-8，元组逐项带长度前缀，其余按JSON编码；
+不使用pickle，共享后端中的数据不会被反序列化为任意对象。
+Redis和磁盘后端的访问是阻塞I/O：异步代码使用VersionedCache的a*方法，在线程池中访问后端，不阻塞事件循环；
+后端连续失败时熔断器断开一段时间，期间直接按未命中处理，不再等待超时。
+"""
+
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+import orjson
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# 值编码：1字节类型标记 + 数据
+def dumps(value) -> bytes:
+    if isinstance(value, bytes):
+        return b"b" + value
+    if isinstance(value, str):
+        return b"s" + value.encode("utf-8")
+    if isinstance(value, tuple):
+        parts = [dumps(item) for item in value]
+        return b"t" + b"".join(struct.pack(">I", len(part)) + part for part in parts)
+    return b"j" + orjson.dumps(value)
+
+def loads(data: bytes):
+    kind, payload = data[:1], data[1:]
+    if kind == b"b":
+        return bytes(payload)
+    if kind == b"s":
+        return payload.decode("utf-8")
+    if kind == b"t":
+        items = []
+        offset = 0
+        while offset < len(payload):
+            (length,) = struct.unpack_from(">I", payload, offset)
+            offset += 4
+            items.append(loads(payload[offset:offset + length]))
+            offset += length
+        return tuple(items)
+    if kind == b"j":
+        return orjson.loads(payload)
+    raise ValueError(f"未知的缓存值类型: {kind!r}")
+
+class MemoryBackend:
+    """进程内缓存，按总字节数限制大小，最近最少使用的条目先淘汰；版本号单独保存，不会被淘汰"""
+
+    blocking = False
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # 键 -> (过期时间, 值)
+        self._versions = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                if key in self._versions:
+                    values.append(str(self._versions[key]).encode())
+                    continue
+                entry = self._entries.get(key)
+                if entry is None or entry[0] <= now:
+                    values.append(None)
+                    continue
+                self._entries.move_to_end(key)
+                values.append(entry[1])
+        return values
+
+    def set(self, key: str, value: bytes, ttl: float):
+        if len(value) > self.max_bytes // 4:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._discard(key)
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def bump(self, key: str) -> int:
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            return self._versions[key]
+
+class RedisBackend:
+    """Redis协议的共享缓存；redis包在首次使用时才导入"""
+
+    blocking = True
+
+    def __init__(self, url: str = None, client=None):
+        self.url = url
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._client
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return self.client.mget(keys)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    def delete(self, *keys: str):
+        if keys:
+            self.client.delete(*keys)
+
+    def bump(self, key: str) -> int:
+        return self.client.incr(key)
+
+class DiskBackend:
+    """
+    本地目录缓存，同一台机器上的工作进程共享
+    每个键一个文件（文件名为键的哈希），文件头8字节为过期时间；先写临时文件再原子替换，读取方不会读到半个文件
+    """
+
+    HEADER = struct.Struct(">d")
+    SWEEP_EVERY = 1000
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._writes = 0
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._file(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if len(data) < self.HEADER.size:
+            return None
+        (expires,) = self.HEADER.unpack_from(data)
+        if expires and expires <= time.time():
+            return None
+        return data[self.HEADER.size:]
+
+    def _write(self, key: str, value: bytes, expires: float):
+        fd, temp_path = tempfile.mkstemp(dir=self.path, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.HEADER.pack(expires) + value)
+            os.replace(temp_path, self._file(key))
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self._read(key) for key in keys]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._write(key, value, time.time() + ttl)
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            self.sweep()
+
+    def delete(self, *keys: str):
+        for key in keys:
+            try:
+                os.unlink(self._file(key))
+            except FileNotFoundError:
+                pass
+
+    def bump(self, key: str) -> int:
+        """版本号取当前纳秒时间（不小于旧版本加一），多个进程同时失效时不需要加锁也不会产生重复版本"""
+        current = self._read(key)
+        version = max(time.time_ns(), int(current or 0) + 1)
+        self._write(key, str(version).encode(), 0)
+        return version
+
+    def sweep(self) -> int:
+        """删除已过期的文件，返回删除数"""
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.path):
+            file_path = os.path.join(self.path, name)
+            try:
+                with open(file_path, "rb") as f:
+                    header = f.read(self.HEADER.size)
+                if len(header) == self.HEADER.size and 0 < self.HEADER.unpack(header)[0] <= now:
+                    os.unlink(file_path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+class CircuitBreaker:
+    """
+    连续失败max_failures次后断开reset_seconds秒，期间调用方不访问后端（按未命中处理）；
+    到期后放行一次试探请求，成功则恢复，失败则继续断开
+    """
+
+    def __init__(self, max_failures: int = 5, reset_seconds: float = 10):
+        self.max_failures = max_failures
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                # 半开：只放行这一次，其余请求继续跳过，直到试探结果出来
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.max_failures:
+                if self._opened_at is None:
+                    self.trips += 1
+                self._opened_at = time.monotonic()
+
+class BackendUnavailable(Exception):
+    """熔断器断开，未访问后端"""
+
+_VERSION = struct.Struct(">q")
+
+class VersionedCache:
+    """
+    后端中的一个命名空间（如车辆列表页、缩略图）
+    后端访问失败时按未命中处理并记录日志，缓存故障不影响接口。
+    失效和删除失败时记为待重试：之后每次读取前先重试，重试成功前读取按未命中处理、不写入，
+    避免后端恢复后读到本应失效的旧条目
+    """
+
+    def __init__(self, backend, namespace: str, ttl: float = 60, prefix: str = "cache:", breaker: CircuitBreaker = None):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.breaker = breaker or CircuitBreaker()
+        self._prefix = f"{prefix}{namespace}:"
+        self._version_key = f"{prefix}{namespace}:@version"
+        self._invalidate_pending = False
+        self._pending_deletes = set()
+        self._pending_lock = threading.Lock()
+        self.errors = 0
+        self.bypassed = 0
+
+    def _error(self, action: str, error: Exception):
+        if isinstance(error, BackendUnavailable):
+            self.bypassed += 1
+            return
+        self.errors += 1
+        logger.warning(f"缓存{action}失败（{self.namespace}）: {error}")
+
+    def _call(self, method: str, *args):
+        """经过熔断器访问后端"""
+        if not self.breaker.allow():
+            raise BackendUnavailable()
+        try:
+            result = getattr(self.backend, method)(*args)
+        except Exception:
+            self.breaker.failure()
+            raise
+        self.breaker.success()
+        return result
+
+    @property
+    def pending(self) -> bool:
+        return self._invalidate_pending or bool(self._pending_deletes)
+
+    def _flush_pending(self) -> bool:
+        """重试之前失败的失效和删除，全部完成时返回True"""
+        if not self.pending:
+            return True
+        with self._pending_lock:
+            try:
+                if self._invalidate_pending:
+                    self._call("bump", self._version_key)
+                    self._invalidate_pending = False
+                if self._pending_deletes:
+                    keys = list(self._pending_deletes)
+                    self._call("delete", *keys)
+                    self._pending_deletes.difference_update(keys)
+                return True
+            except Exception as e:
+                self._error("失效重试", e)
+                return False
+
+    def lookup(self, key: str) -> Tuple[int, Any]:
+        """返回 (当前命名空间版本, 值)；未命中或条目版本已过时时值为None；版本为-1表示后端不可用，不应写入"""
+        if not self._flush_pending():
+            return -1, None
+        try:
+            raw_version, entry = self._call("get_many", [self._version_key, self._prefix + key])
+            version = int(raw_version or 0)
+            if entry is None or len(entry) < _VERSION.size or _VERSION.unpack_from(entry)[0] != version:
+                return version, None
+            return version, loads(entry[_VERSION.size:])
+        except Exception as e:
+            self._error("读取", e)
+            return -1, None
+
+    def get(self, key: str):
+        return self.lookup(key)[1]
+
+    def set(self, key: str, value, version: int = None, ttl: float = None):
+        """
+        写入条目；version为读取时lookup()返回的版本，期间命名空间已失效时写入的条目自然过时
+        """
+        try:
+            if version is None:
+                version = self.lookup(key)[0]
+            if version < 0 or self.pending:
+                return
+            self._call("set", self._prefix + key, _VERSION.pack(version) + dumps(value), self.ttl if ttl is None else ttl)
+        except Exception as e:
+            self._error("写入", e)
+
+    def delete(self, *keys: str):
+        full_keys = [self._prefix + key for key in keys]
+        try:
+            self._call("delete", *full_keys)
+        except Exception as e:
+            with self._pending_lock:
+                self._pending_deletes.update(full_keys)
+            self._error("删除", e)
+
+    def invalidate(self):
+        """使命名空间内的所有条目失效（所有进程）"""
+        try:
+            self._call("bump", self._version_key)
+            self._invalidate_pending = False
+        except Exception as e:
+            self._invalidate_pending = True
+            self._error("失效", e)
+
+    # 异步版本：阻塞的后端（Redis、磁盘）在线程池中访问
+    async def _run(self, function, *args):
+        if self.backend.blocking:
+            return await run_in_threadpool(function, *args)
+        return function(*args)
+
+    async def alookup(self, key: str) -> Tuple[int, Any]:
+        return await self._run(self.lookup, key)
+
+    async def aset(self, key: str, value, version: int = None, ttl: float = None):
+        await self._run(self.set, key, value, version, ttl)
+
+    async def adelete(self, *keys: str):
+        await self._run(self.delete, *keys)
+
+    async def ainvalidate(self):
+        await self._run(self.invalidate)
+
+def create_backend():
+    """按配置创建缓存后端"""
+    from config import settings
+
+    if settings.CACHE_BACKEND == "redis":
+        return RedisBackend(settings.CACHE_REDIS_URL)
+    if settings.CACHE_BACKEND == "disk":
+        return DiskBackend(settings.CACHE_DISK_PATH)
+    return MemoryBackend(settings.CACHE_MEMORY_MAX_BYTES)
+
+def create_breaker() -> CircuitBreaker:
+    from config import settings
+
+    return CircuitBreaker(settings.CACHE_BREAKER_FAILURES, settings.CACHE_BREAKER_RESET_SECONDS)
+
+# 全局缓存后端和熔断器，各命名空间共用（后端故障时所有命名空间一起熔断）
+cache_backend = create_backend()
+cache_breaker = create_breaker()
\ No newline at end of file
@@ -8,6 +8,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from database import SessionLocal
 import models
@@ -21,8 +22,25 @@ def check_cars_data():
     """检查车辆数据"""
     db = SessionLocal()
     try:
-        # 获取所有车辆记录
-        all_cars = db.query(models.Car).all()
+        # 获取所有车辆记录（只读取元数据和缩略图长度，不加载、不解析图片数据）
+        all_cars = db.query(
+            models.Car.id,
+            models.Car.region,
+            models.Car.contact,
+            models.Car.description,
+            models.Car.created_at,
+            models.Car.image_width,
+            models.Car.image_height,
+            models.Car.image_bytes,
+            models.Car.image_mime,
+            models.Car.image_hash,
+            models.Car.image_data.isnot(None).label("is_binary"),
+            models.Car.image_key,
+            models.Car.thumbnail_key,
+            func.coalesce(
+                func.length(models.Car.thumbnail_data), func.length(models.Car.thumbnail_base64)
+            ).label("thumbnail_length")
+        ).order_by(models.Car.id).all()
         
         logger.info(f"数据库中共有 {len(all_cars)} 条车辆记录")
         
@@ -33,17 +51,21 @@ def check_cars_data():
                 logger.info(f"  联系方式: {car.contact}")
                 logger.info(f"  描述: {car.description}")
                 logger.info(f"  创建时间: {car.created_at}")
-                logger.info(f"  有原始图片: {'是' if car.image_base64 else '否'}")
-                logger.info(f"  有缩略图: {'是' if car.thumbnail_base64 else '否'}")
+                if car.image_key:
+                    logger.info(f"  存储方式: 对象存储 ({car.image_key})")
+                else:
+                    logger.info(f"  存储方式: {'二进制' if car.is_binary else 'BASE64'}")
+                logger.info(f"  有缩略图: {'是' if car.thumbnail_length or car.thumbnail_key else '否'}")
                 
-                if car.image_base64:
-                    # 计算原始图片大小
-                    image_size = len(car.image_base64) / 1024  # KB
-                    logger.info(f"  原始图片大小: {image_size:.2f}KB")
+                if car.image_bytes is not None:
+                    logger.info(f"  原始图片: {car.image_width}x{car.image_height} {car.image_mime} {car.image_bytes / 1024:.2f}KB")
+                    logger.info(f"  内容哈希: {car.image_hash}")
+                else:
+                    logger.info("  原始图片: 缺少元数据，请运行 migration_add_image_metadata.py")
                 
-                if car.thumbnail_base64:
-                    # 计算缩略图大小
-                    thumbnail_size = len(car.thumbnail_base64) / 1024  # KB
+                if car.thumbnail_length:
+                    # 缩略图大小（二进制字节数或BASE64字符串长度）
+                    thumbnail_size = car.thumbnail_length / 1024  # KB
                     logger.info(f"  缩略图大小: {thumbnail_size:.2f}KB")
                 
                 logger.info("-" * 40)
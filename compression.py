@@ -0,0 +1,305 @@
+"""
+按内容类型选择性压缩响应
+JSON/文本元数据（不含内联图片的列表、配置、批量操作结果）压缩率很高，而BASE64编码的JPEG几乎无法再压缩，
+对数MB的图片数据做gzip只会浪费CPU。因此：
+    - 按Accept-Encoding协商br（安装了brotli时）或gzip
+    - 只压缩JSON和文本类型，图片等二进制响应直接透传（不读取响应体）
+    - 太小的响应，以及抽样检测到BASE64长串占比过高的响应不压缩
+    - 带ETag的响应按 (ETag, 编码) 缓存压缩结果，重复请求不再重复压缩
+    - GET/HEAD请求的If-None-Match与ETag匹配时直接返回304，不读取也不压缩响应体
+"""
+
+import gzip
+import re
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+ENCODINGS = ("br", "gzip")  # 同等权重时优先br
+
+# BASE64长串（data URL或裸BASE64），短于此长度的视为普通文本
+_BASE64_RUN = re.compile(rb"[A-Za-z0-9+/]{128,}")
+SNIFF_WINDOW = 4096
+SNIFF_SAMPLES = 16
+# 小响应压缩本身比检测更快，直接压缩
+SNIFF_MIN_BYTES = 32 * 1024
+# 超过此大小的响应在线程池中压缩，避免阻塞事件循环
+THREADPOOL_BYTES = 64 * 1024
+# 压缩后至少节省5%才使用压缩结果
+MIN_SAVING = 0.05
+
+@lru_cache(maxsize=None)
+def _brotli():
+    """brotli为可选依赖，未安装时只提供gzip"""
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+def available_encodings() -> tuple:
+    return tuple(encoding for encoding in ENCODINGS if encoding != "br" or _brotli() is not None)
+
+def negotiate(accept_encoding: Optional[str], available: tuple = None) -> Optional[str]:
+    """按Accept-Encoding（含q值和*）选择压缩编码，不接受压缩时返回None"""
+    if not accept_encoding:
+        return None
+    available = available if available is not None else available_encodings()
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for encoding in available:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+def is_compressible(content_type: str) -> bool:
+    content_type = content_type.lower()
+    return any(content_type.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+def base64_ratio(body: bytes) -> float:
+    """BASE64长串在响应体中的占比；大响应只抽样若干窗口，检测耗时与响应大小无关"""
+    if not body:
+        return 0.0
+    if len(body) <= SNIFF_WINDOW * SNIFF_SAMPLES:
+        windows = [body]
+    else:
+        step = len(body) // SNIFF_SAMPLES
+        windows = [body[index * step:index * step + SNIFF_WINDOW] for index in range(SNIFF_SAMPLES)]
+    sampled = sum(len(window) for window in windows)
+    covered = sum(match.end() - match.start() for window in windows for match in _BASE64_RUN.finditer(window))
+    return covered / sampled
+
+def compress(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 5) -> bytes:
+    if encoding == "br":
+        return _brotli().compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+def variant_etag(etag: str, encoding: str) -> str:
+    """压缩后的表示使用不同的ETag（"abc" -> "abc-gzip"）"""
+    if etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return f"{etag}-{encoding}"
+
+def _opaque_tag(etag: str) -> str:
+    """弱比较只比较引号内的值（W/"abc" 与 "abc" 相同）"""
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+def etag_matches(if_none_match: Optional[str], etags) -> Optional[str]:
+    """If-None-Match（逗号分隔的列表或*）与候选ETag按弱比较匹配，返回匹配的ETag"""
+    if not if_none_match:
+        return None
+    etags = [etag for etag in etags if etag]
+    if if_none_match.strip() == "*":
+        return etags[0] if etags else None
+    requested = {_opaque_tag(tag) for tag in if_none_match.split(",") if tag.strip()}
+    for etag in etags:
+        if _opaque_tag(etag) in requested:
+            return etag
+    return None
+
+# 304响应不带响应体，也不带描述响应体的头
+_BODY_HEADERS = (b"content-length", b"content-type", b"content-encoding")
+
+class ResponseCompressor:
+    def __init__(self, min_bytes: int = 1024, gzip_level: int = 6, brotli_quality: int = 5,
+                 max_base64_ratio: float = 0.5, cache_bytes: int = 16 * 1024 * 1024, enabled: bool = True):
+        self.enabled = enabled
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.max_base64_ratio = max_base64_ratio
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()  # (ETag, 编码) -> 压缩结果，按最近使用淘汰
+        self._cached_bytes = 0
+        self.compressed = {encoding: 0 for encoding in ENCODINGS}
+        self.skipped = {reason: 0 for reason in ("identity", "small", "base64", "incompressible")}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.not_modified = 0
+
+    def negotiate(self, accept_encoding: Optional[str]) -> Optional[str]:
+        return negotiate(accept_encoding) if self.enabled else None
+
+    def _cache_get(self, key) -> Optional[bytes]:
+        content = self._cache.get(key)
+        if content is not None:
+            self._cache.move_to_end(key)
+        return content
+
+    def _cache_put(self, key, content: bytes):
+        if len(content) > self.cache_bytes // 4:
+            return
+        self._cache[key] = content
+        self._cached_bytes += len(content)
+        while self._cached_bytes > self.cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= len(evicted)
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        started = time.perf_counter()
+        content = compress(body, encoding, self.gzip_level, self.brotli_quality)
+        self.seconds += time.perf_counter() - started
+        return content
+
+    async def process(self, response, encoding: Optional[str], if_none_match: Optional[str] = None):
+        """
+        压缩中间件拿到的响应；不需要压缩时原样返回（流式响应不读取响应体）
+        encoding为协商结果，None表示客户端不接受压缩；
+        if_none_match为GET/HEAD请求的If-None-Match，与ETag匹配时返回304
+        """
+        if if_none_match and response.status_code == 200 and "etag" in response.headers:
+            not_modified = self._not_modified(response, encoding, if_none_match)
+            if not_modified is not None:
+                return not_modified
+
+        if (not self.enabled or response.status_code < 200 or response.status_code in (204, 304)
+                or "content-encoding" in response.headers
+                or not is_compressible(response.headers.get("content-type", ""))):
+            return response
+
+        # 可压缩类型的响应随Accept-Encoding变化，缓存代理需要区分
+        vary = response.headers.get("vary")
+        if not vary:
+            response.headers["Vary"] = "Accept-Encoding"
+        elif "accept-encoding" not in vary.lower():
+            response.headers["Vary"] = f"{vary}, Accept-Encoding"
+        if encoding is None:
+            self.skipped["identity"] += 1
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        content = await self._compressed_body(body, encoding, response.headers.get("etag"))
+        if content is None:
+            content = body
+        else:
+            response.headers["Content-Encoding"] = encoding
+            if "etag" in response.headers:
+                response.headers["ETag"] = variant_etag(response.headers["etag"], encoding)
+        response.headers["Content-Length"] = str(len(content))
+        response.body_iterator = _iterate(content)
+        return response
+
+    def _not_modified(self, response, encoding: Optional[str], if_none_match: str) -> Optional[Response]:
+        """
+        客户端缓存的表示仍然有效时返回304：可能是原始表示的ETag，也可能是当前编码下压缩表示的ETag
+        （同一ETag的响应体相同，是否压缩的判断结果也相同）
+        """
+        etag = response.headers["etag"]
+        candidates = [etag]
+        if self.enabled and encoding and is_compressible(response.headers.get("content-type", "")):
+            candidates.insert(0, variant_etag(etag, encoding))
+        matched = etag_matches(if_none_match, candidates)
+        if matched is None:
+            return None
+
+        not_modified = Response(status_code=304)
+        not_modified.raw_headers = [(name, value) for name, value in response.raw_headers if name not in _BODY_HEADERS]
+        not_modified.headers["ETag"] = matched
+        if len(candidates) > 1 and "accept-encoding" not in not_modified.headers.get("vary", "").lower():
+            vary = not_modified.headers.get("vary")
+            not_modified.headers["Vary"] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+        self.not_modified += 1
+        return not_modified
+
+    async def _compressed_body(self, body: bytes, encoding: str, etag: Optional[str]) -> Optional[bytes]:
+        """返回压缩后的响应体，不值得压缩时返回None"""
+        if len(body) < self.min_bytes:
+            self.skipped["small"] += 1
+            return None
+        if len(body) >= SNIFF_MIN_BYTES and base64_ratio(body) > self.max_base64_ratio:
+            self.skipped["base64"] += 1
+            return None
+
+        key = (etag, encoding) if etag else None
+        content = self._cache_get(key) if key else None
+        if content is not None:
+            self.cache_hits += 1
+        else:
+            if key:
+                self.cache_misses += 1
+            if len(body) > THREADPOOL_BYTES:
+                content = await run_in_threadpool(self._compress, body, encoding)
+            else:
+                content = self._compress(body, encoding)
+            if len(content) > len(body) * (1 - MIN_SAVING):
+                self.skipped["incompressible"] += 1
+                return None
+            if key:
+                self._cache_put(key, content)
+
+        self.compressed[encoding] += 1
+        self.bytes_in += len(body)
+        self.bytes_out += len(content)
+        return content
+
+    def metric_lines(self) -> list:
+        """Prometheus文本格式的压缩指标"""
+        lines = [
+            "# HELP compression_responses_total 压缩的响应数",
+            "# TYPE compression_responses_total counter"
+        ]
+        lines += [f'compression_responses_total{{encoding="{encoding}"}} {count}' for encoding, count in self.compressed.items()]
+        lines += [
+            "# HELP compression_skipped_total 可压缩类型但未压缩的响应数（按原因）",
+            "# TYPE compression_skipped_total counter"
+        ]
+        lines += [f'compression_skipped_total{{reason="{reason}"}} {count}' for reason, count in self.skipped.items()]
+        lines += [
+            "# HELP compression_bytes_in_total 压缩前的字节数",
+            "# TYPE compression_bytes_in_total counter",
+            f"compression_bytes_in_total {self.bytes_in}",
+            "# HELP compression_bytes_out_total 压缩后的字节数",
+            "# TYPE compression_bytes_out_total counter",
+            f"compression_bytes_out_total {self.bytes_out}",
+            "# HELP compression_seconds_total 压缩耗时（秒）",
+            "# TYPE compression_seconds_total counter",
+            f"compression_seconds_total {self.seconds:.6f}",
+            "# HELP compression_cache_hits_total 按ETag命中的压缩结果缓存次数",
+            "# TYPE compression_cache_hits_total counter",
+            f"compression_cache_hits_total {self.cache_hits}",
+            "# HELP compression_cache_misses_total 带ETag但未命中缓存的次数",
+            "# TYPE compression_cache_misses_total counter",
+            f"compression_cache_misses_total {self.cache_misses}",
+            "# HELP compression_not_modified_total If-None-Match匹配、返回304的响应数",
+            "# TYPE compression_not_modified_total counter",
+            f"compression_not_modified_total {self.not_modified}"
+        ]
+        return lines
+
+async def _iterate(content: bytes):
+    yield content
+
+# 全局压缩器
+def _create_compressor() -> ResponseCompressor:
+    from config import settings
+
+    return ResponseCompressor(
+        min_bytes=settings.COMPRESSION_MIN_BYTES,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+        max_base64_ratio=settings.COMPRESSION_MAX_BASE64_RATIO,
+        cache_bytes=settings.COMPRESSION_CACHE_BYTES,
+        enabled=settings.COMPRESSION_ENABLED
+    )
+
+response_compressor = _create_compressor()
\ No newline at end of file
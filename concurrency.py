@@ -0,0 +1,182 @@
+"""
+昂贵接口的并发预算与过载保护
+上传处理、原图读取、列表/详情读取各自使用独立的并发上限和有界等待队列，
+一类请求突发时不会占满数据库连接池和图片处理线程，饿死 /api/regions 等轻量请求。
+等待队列已满或排队超时时立即返回 503 + Retry-After，由客户端稍后重试。
+
+用法（路由依赖，在获取数据库会话之前执行，响应发送完成后释放）:
+    @app.get("/api/cars", dependencies=[Depends(read_budget)])
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from fastapi import HTTPException
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class ConcurrencyBudget:
+    """
+    一类请求的并发预算：最多 limit 个同时执行，最多 max_queue 个排队等待
+    只在事件循环线程中使用，不需要加锁
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self._waiters = deque()
+        # 统计
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def _overloaded(self, reason: str) -> HTTPException:
+        return HTTPException(
+            status_code=503,
+            detail=f"服务繁忙（{reason}），请稍后重试",
+            headers={"Retry-After": str(self.retry_after)}
+        )
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise self._overloaded("等待队列已满")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # 超时或取消的同时已被分配到名额，归还给下一个等待者
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise self._overloaded("排队超时")
+            raise
+        finally:
+            self.wait_seconds += time.monotonic() - started
+        self.admitted += 1
+
+    def release(self):
+        # 名额直接转交给最早的等待者，active不变
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    async def __call__(self):
+        """作为FastAPI依赖使用：获取名额，请求结束后释放"""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def __aenter__(self):
+        """在接口内部只对部分代码路径限流: async with upload_budget: ..."""
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_seconds": round(self.wait_seconds, 3)
+        }
+
+def derive_limits(pool_capacity: int, image_workers: int) -> dict:
+    """
+    按每进程连接池容量推导三类请求的并发上限
+    预留约1/4（至少2个）连接给轻量请求和后台任务，其余按 上传:原图:列表 = 1:2:4 分配，
+    上传并发不超过图片处理线程数（多出的名额分给列表读取）
+    """
+    available = max(3, pool_capacity - max(2, pool_capacity // 4))
+    upload = max(1, min(image_workers, available // 7))
+    image = max(1, (available - upload) // 3)
+    return {"upload": upload, "image": image, "read": max(1, available - upload - image)}
+
+def _configured_limits() -> dict:
+    """配置的并发上限，未配置（0）的按连接池容量推导；显式配置的总和超过连接池容量时记录警告"""
+    capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    derived = derive_limits(capacity, settings.IMAGE_PROCESS_WORKERS)
+    limits = {
+        "upload": settings.CONCURRENCY_UPLOAD_LIMIT or derived["upload"],
+        "image": settings.CONCURRENCY_IMAGE_LIMIT or derived["image"],
+        "read": settings.CONCURRENCY_READ_LIMIT or derived["read"]
+    }
+    if sum(limits.values()) > capacity:
+        logger.warning(f"并发上限之和 {sum(limits.values())} 超过每进程连接池容量 {capacity}，请求可能在等待数据库连接时超时")
+    return limits
+
+def _budget(name: str, limit: int, max_queue: int) -> ConcurrencyBudget:
+    return ConcurrencyBudget(
+        name, limit, max_queue,
+        queue_timeout=settings.CONCURRENCY_QUEUE_TIMEOUT,
+        retry_after=settings.CONCURRENCY_RETRY_AFTER
+    )
+
+_limits = _configured_limits()
+# 上传处理（压缩、缩略图、对象存储写入）
+upload_budget = _budget("upload", _limits["upload"], settings.CONCURRENCY_UPLOAD_QUEUE)
+# 读取完整图片数据（BASE64/二进制大字段）
+image_budget = _budget("image", _limits["image"], settings.CONCURRENCY_IMAGE_QUEUE)
+# 列表、检索和缩略图读取
+read_budget = _budget("read", _limits["read"], settings.CONCURRENCY_READ_QUEUE)
+
+budgets = {budget.name: budget for budget in (upload_budget, image_budget, read_budget)}
+
+# Prometheus指标: (指标名, 类型, 说明, snapshot中的键)
+_METRICS = [
+    ("concurrency_limit", "gauge", "最大并发数", "limit"),
+    ("concurrency_queue_limit", "gauge", "等待队列长度上限", "max_queue"),
+    ("concurrency_active", "gauge", "正在执行的请求数", "active"),
+    ("concurrency_waiting", "gauge", "排队等待的请求数", "waiting"),
+    ("concurrency_admitted_total", "counter", "已放行的请求数", "admitted"),
+    ("concurrency_rejected_total", "counter", "因等待队列已满被拒绝的请求数", "rejected"),
+    ("concurrency_timed_out_total", "counter", "排队超时被拒绝的请求数", "timed_out"),
+    ("concurrency_wait_seconds_total", "counter", "累计排队等待时间（秒）", "wait_seconds"),
+]
+
+def metric_lines() -> list:
+    """Prometheus文本格式的并发预算指标"""
+    snapshots = {name: budget.snapshot() for name, budget in budgets.items()}
+    lines = []
+    for metric, metric_type, help_text, key in _METRICS:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {metric_type}")
+        for name, snapshot in snapshots.items():
+            lines.append(f'{metric}{{budget="{name}"}} {snapshot[key]}')
+    return lines
\ No newline at end of file
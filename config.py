@@ -6,11 +6,24 @@ load_dotenv()
 
 class Settings:
     # 数据库配置
+    # DATABASE_URL 可直接指定完整连接串，如 sqlite:///./car_pic.db（单机部署、本地测试，无需MySQL）；
+    # 未设置时按 DB_HOST 等配置连接MySQL
+    DATABASE_URL: str = os.getenv("DATABASE_URL", "")
     DB_HOST: str = os.getenv("DB_HOST", "localhost")
     DB_PORT: int = int(os.getenv("DB_PORT", "3306"))
     DB_NAME: str = os.getenv("DB_NAME", "pic_db")
     DB_USER: str = os.getenv("DB_USER", "root")
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))  # 每个进程的连接池大小
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))  # 每个进程允许的临时溢出连接数
+    DB_REPLICA_URLS: str = os.getenv("DB_REPLICA_URLS", "")  # 只读副本URL，多个用逗号分隔
+    DB_REPLICA_STICKY_SECONDS: int = int(os.getenv("DB_REPLICA_STICKY_SECONDS", "10"))  # 写操作后读请求走主库的时长
+    DB_REPLICA_CHECK_INTERVAL: int = int(os.getenv("DB_REPLICA_CHECK_INTERVAL", "10"))  # 副本健康检查间隔（秒）
+    DB_POOL_WARM_CONNECTIONS: int = int(os.getenv("DB_POOL_WARM_CONNECTIONS", "2"))  # 启动时预先建立的连接数
+    # SQLite模式调优（WAL日志 + synchronous=NORMAL，读写互不阻塞）
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 内存映射读取的字节数
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # 每个连接的页缓存大小
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # 等待写锁的最长时间
     
     # JWT配置
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
@@ -19,6 +32,108 @@ class Settings:
     # 文件存储配置
     STORAGE_TYPE: str = os.getenv("STORAGE_TYPE", "local")  # local 或 qiniu
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "uploads")
+    # 图片存储方式：base64（LONGTEXT存data URL）、binary（LONGBLOB存原始字节，接口返回时再编码）
+    # 或 object（写入S3兼容对象存储，接口返回签名URL）；切换为binary前需先运行 migration_to_binary_storage.py
+    IMAGE_STORAGE_MODE: str = os.getenv("IMAGE_STORAGE_MODE", "base64")
+    
+    # 对象存储配置（S3兼容接口，七牛云使用其S3兼容域名，如 https://s3.cn-south-1.qiniucs.com）
+    # 密钥和存储空间未配置时沿用七牛云配置
+    OBJECT_STORAGE_ENDPOINT: str = os.getenv("OBJECT_STORAGE_ENDPOINT", "")
+    OBJECT_STORAGE_REGION: str = os.getenv("OBJECT_STORAGE_REGION", "")
+    OBJECT_STORAGE_BUCKET: str = os.getenv("OBJECT_STORAGE_BUCKET", os.getenv("QINIU_BUCKET_NAME", ""))
+    OBJECT_STORAGE_ACCESS_KEY: str = os.getenv("OBJECT_STORAGE_ACCESS_KEY", os.getenv("QINIU_ACCESS_KEY", ""))
+    OBJECT_STORAGE_SECRET_KEY: str = os.getenv("OBJECT_STORAGE_SECRET_KEY", os.getenv("QINIU_SECRET_KEY", ""))
+    OBJECT_STORAGE_PUBLIC_URL: str = os.getenv("OBJECT_STORAGE_PUBLIC_URL", "")  # 公开读的访问域名（如CDN），配置后不再签名
+    OBJECT_STORAGE_URL_EXPIRES: int = int(os.getenv("OBJECT_STORAGE_URL_EXPIRES", "3600"))  # 签名URL有效期（秒）
+    OBJECT_STORAGE_URL_CACHE_SIZE: int = int(os.getenv("OBJECT_STORAGE_URL_CACHE_SIZE", "10000"))  # 签名URL缓存条数上限
+    
+    # 图片处理配置
+    IMAGE_PROCESS_WORKERS: int = int(os.getenv("IMAGE_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+    BULK_UPLOAD_MAX_ITEMS: int = int(os.getenv("BULK_UPLOAD_MAX_ITEMS", "50"))
+    # 已压缩过的JPEG（尺寸不超过1920x1080且每像素字节数不超过阈值）不再重新编码，只生成缩略图
+    IMAGE_PASSTHROUGH: bool = os.getenv("IMAGE_PASSTHROUGH", "true").lower() in ("1", "true", "yes")
+    IMAGE_PASSTHROUGH_MAX_BPP: float = float(os.getenv("IMAGE_PASSTHROUGH_MAX_BPP", "0.3"))  # 约相当于质量75的车辆照片
+    # JPEG质量：fixed（原图70、缩略图85）或 adaptive（按目标大小搜索质量，SSIM不低于下限）
+    IMAGE_QUALITY_MODE: str = os.getenv("IMAGE_QUALITY_MODE", "fixed")
+    IMAGE_TARGET_BYTES: int = int(os.getenv("IMAGE_TARGET_BYTES", "200000"))  # 原图目标大小
+    THUMBNAIL_TARGET_BYTES: int = int(os.getenv("THUMBNAIL_TARGET_BYTES", "15000"))  # 缩略图目标大小
+    IMAGE_SSIM_FLOOR: float = float(os.getenv("IMAGE_SSIM_FLOOR", "0.95"))  # 画质下限，0表示只按大小搜索
+    IMAGE_MIN_QUALITY: int = int(os.getenv("IMAGE_MIN_QUALITY", "40"))
+    IMAGE_MAX_QUALITY: int = int(os.getenv("IMAGE_MAX_QUALITY", "85"))
+    IMAGE_QUALITY_MAX_ITERATIONS: int = int(os.getenv("IMAGE_QUALITY_MAX_ITERATIONS", "6"))  # 每张图最多编码次数
+    IMAGE_QUALITY_TIME_BUDGET_MS: int = int(os.getenv("IMAGE_QUALITY_TIME_BUDGET_MS", "400"))  # 每张图搜索耗时上限
+    # 上传处理方式：sync（请求内完成压缩和缩略图）或 queue（保存原图后立即返回，由 worker.py 异步处理）
+    IMAGE_PROCESSING_MODE: str = os.getenv("IMAGE_PROCESSING_MODE", "sync")
+    JOB_LEASE_SECONDS: int = int(os.getenv("JOB_LEASE_SECONDS", "120"))  # 任务租约时长，超时未完成的任务会被重新领取
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))  # 没有任务时的轮询间隔（秒）
+    JOB_FOLLOW_INTERVAL: float = float(os.getenv("JOB_FOLLOW_INTERVAL", "2.0"))  # Web进程跟进已完成任务的间隔（秒）
+    
+    # 并发预算（每个进程）：三类昂贵请求的并发上限之和不超过连接池容量（DB_POOL_SIZE + DB_MAX_OVERFLOW），
+    # 给 /api/regions 等轻量请求留出连接；排队已满或超时返回503
+    # 上限为0（默认）时按本进程的实际连接池容量推导（见concurrency.derive_limits），多进程部署缩小连接池后自动随之缩小
+    CONCURRENCY_UPLOAD_LIMIT: int = int(os.getenv("CONCURRENCY_UPLOAD_LIMIT", "0"))  # 上传处理
+    CONCURRENCY_UPLOAD_QUEUE: int = int(os.getenv("CONCURRENCY_UPLOAD_QUEUE", "20"))
+    CONCURRENCY_IMAGE_LIMIT: int = int(os.getenv("CONCURRENCY_IMAGE_LIMIT", "0"))  # 完整图片读取
+    CONCURRENCY_IMAGE_QUEUE: int = int(os.getenv("CONCURRENCY_IMAGE_QUEUE", "50"))
+    CONCURRENCY_READ_LIMIT: int = int(os.getenv("CONCURRENCY_READ_LIMIT", "0"))  # 列表、检索、缩略图读取
+    CONCURRENCY_READ_QUEUE: int = int(os.getenv("CONCURRENCY_READ_QUEUE", "100"))
+    CONCURRENCY_QUEUE_TIMEOUT: float = float(os.getenv("CONCURRENCY_QUEUE_TIMEOUT", "10"))  # 最长排队时间（秒）
+    CONCURRENCY_RETRY_AFTER: int = int(os.getenv("CONCURRENCY_RETRY_AFTER", "2"))  # 503响应的Retry-After（秒）
+    
+    # 内存索引定期重建间隔（秒），多进程部署时用于同步其他进程的写入，0表示不重建
+    INDEX_REFRESH_SECONDS: int = int(os.getenv("INDEX_REFRESH_SECONDS", "0"))
+    
+    # 共享缓存后端：memory（进程内）、redis（Redis协议，多进程/多机共享）或 disk（本机目录，多进程共享）
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_REDIS_URL: str = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_DISK_PATH: str = os.getenv("CACHE_DISK_PATH", "cache")
+    CACHE_MEMORY_MAX_BYTES: int = int(os.getenv("CACHE_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+    # 缓存后端连续失败次数达到上限后熔断，期间按未命中处理、不访问后端，到期后试探恢复
+    CACHE_BREAKER_FAILURES: int = int(os.getenv("CACHE_BREAKER_FAILURES", "5"))
+    CACHE_BREAKER_RESET_SECONDS: float = float(os.getenv("CACHE_BREAKER_RESET_SECONDS", "10"))
+    
+    # 车辆列表页微缓存：缓存秒数（写操作后立即失效），0表示关闭
+    PAGE_CACHE_TTL: float = float(os.getenv("PAGE_CACHE_TTL", "2"))
+    SITE_CONFIG_CACHE_TTL: float = float(os.getenv("SITE_CONFIG_CACHE_TTL", "60"))  # 站点配置（区域列表），修改区域后立即失效
+    THUMBNAIL_CACHE_TTL: float = float(os.getenv("THUMBNAIL_CACHE_TTL", "600"))  # 缩略图字节，更新/删除车辆后立即删除
+    
+    # 全文检索配置：auto（MySQL使用FULLTEXT索引，其他数据库使用本地倒排索引）或 local
+    SEARCH_BACKEND: str = os.getenv("SEARCH_BACKEND", "auto")
+    
+    # 限流配置：规则格式 "方法 路径=容量/周期秒[:ip|token|route]"，多条规则用分号分隔，为空表示不限流
+    RATE_LIMITS: str = os.getenv(
+        "RATE_LIMITS",
+        "POST /api/homepage/verify=10/60:ip; POST /api/admin/login=5/60:ip; POST /api/cars=30/60:ip"
+    )
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory（单进程）或 redis（多进程共享）
+    RATE_LIMIT_REDIS_URL: str = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+    # 部署在反向代理之后时开启，按 X-Forwarded-For 识别客户端；不开启时代理之后的所有客户端共用代理IP的令牌桶。
+    # Railway的请求都经过其边缘代理，检测到RAILWAY_ENVIRONMENT时默认开启（直接对外时不要开启，该请求头可伪造）
+    RATE_LIMIT_TRUST_FORWARDED: bool = os.getenv(
+        "RATE_LIMIT_TRUST_FORWARDED", "true" if os.getenv("RAILWAY_ENVIRONMENT") else "false"
+    ).lower() in ("1", "true", "yes")
+    # 可信代理的层数：客户端IP取 X-Forwarded-For 从右数第N个地址（更左边的地址由客户端提供，不可信）
+    RATE_LIMIT_PROXY_HOPS: int = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "1"))
+    
+    # 日志配置
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")  # text 或 json
+    LOG_MAX_FIELD_LENGTH: int = int(os.getenv("LOG_MAX_FIELD_LENGTH", "1000"))  # 单条消息/字段的最大字符数，超出部分截断
+    LOG_INFO_SAMPLE_RATE: float = float(os.getenv("LOG_INFO_SAMPLE_RATE", "1.0"))  # INFO及以下级别日志的采样率
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # 日志队列长度，写出跟不上时丢弃新日志
+    
+    # 响应压缩：按Accept-Encoding协商br/gzip，只压缩JSON和文本响应，图片和BASE64为主的响应不压缩
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+    COMPRESSION_MIN_BYTES: int = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))  # 小于此大小的响应不压缩
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))  # 需要安装brotli
+    COMPRESSION_MAX_BASE64_RATIO: float = float(os.getenv("COMPRESSION_MAX_BASE64_RATIO", "0.5"))  # BASE64占比超过此值不压缩
+    COMPRESSION_CACHE_BYTES: int = int(os.getenv("COMPRESSION_CACHE_BYTES", str(16 * 1024 * 1024)))  # 按ETag缓存的压缩结果总大小
+    
+    # 链路追踪：span导出目标，file:路径（OTLP/JSON，每行一批）或OTLP/HTTP采集器地址，为空表示关闭
+    TRACE_EXPORT: str = os.getenv("TRACE_EXPORT", "")
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))  # 根span采样率
     
     # 七牛云配置
     QINIU_ACCESS_KEY: str = os.getenv("QINIU_ACCESS_KEY", "")
@@ -30,10 +145,24 @@ class Settings:
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", "8000"))
     
+    # 生产模式多进程配置（start.py --production）
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "0"))  # 工作进程数，0表示按CPU配额自动检测
+    DB_CONNECTION_BUDGET: int = int(os.getenv("DB_CONNECTION_BUDGET", "60"))  # 所有工作进程共享的数据库连接总数
+    DB_WORKER_CONNECTIONS: int = int(os.getenv("DB_WORKER_CONNECTIONS", "-1"))  # 为worker.py预留的连接数，-1表示按处理模式自动估算
+    MAX_REQUESTS: int = int(os.getenv("MAX_REQUESTS", "2000"))  # 工作进程处理多少请求后平滑重启，0表示不重启
+    MAX_REQUESTS_JITTER: int = int(os.getenv("MAX_REQUESTS_JITTER", "200"))
+    PRELOAD_APP: bool = os.getenv("PRELOAD_APP", "false").lower() in ("1", "true", "yes")
+    
     @property
     def database_url(self) -> str:
+        if self.DATABASE_URL:
+            return self.DATABASE_URL
         return f"mysql+mysqlconnector://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
     
+    @property
+    def replica_urls(self) -> list:
+        return [url.strip() for url in self.DB_REPLICA_URLS.split(",") if url.strip()]
+    
     @property
     def is_qiniu_enabled(self) -> bool:
         return (self.STORAGE_TYPE == "qiniu" and 
@@ -1,156 +1,882 @@
+import asyncio
+import logging
+from collections import Counter
+from functools import lru_cache
+from operator import attrgetter
+from typing import Dict, List
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, or_, delete, insert, update, func, text
+from sqlalchemy.dialects.mysql import match as mysql_match
 from fastapi import HTTPException, UploadFile
-from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+import io
 import models
 import schemas
-from storage_service import storage_service
+import image_jobs
+import tracing
+from storage_service import storage_service, to_data_url, from_data_url
+from image_hash import similarity_index
+from page_cache import car_list_cache, site_config_cache, thumbnail_cache
+from search_index import search_index, split_terms, boolean_query, escape_like, encode_cursor, decode_cursor
+from config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """延迟加载passlib/bcrypt，避免拖慢应用导入"""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+@tracing.traced()
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+def _object_url(key):
+    from object_storage import get_object_storage
+    return get_object_storage().url(key)[0]
+
+def _object_content(key):
+    from object_storage import get_object_storage
+    return get_object_storage().get(key)
+
+def car_image_url(car):
+    """
+    车辆原图地址：对象存储的记录返回签名URL（可直接用作img的src），
+    binary存储的记录在此处编码为data URL（兼容旧客户端），BASE64记录原样返回
+    """
+    if car.image_key:
+        return _object_url(car.image_key)
+    if car.image_data is not None:
+        return to_data_url(car.image_data, car.image_mime or "image/jpeg")
+    return car.image_base64
+
+def car_thumbnail_url(car):
+    """车辆缩略图地址（规则同car_image_url）"""
+    if car.thumbnail_key:
+        return _object_url(car.thumbnail_key)
+    if car.thumbnail_data is not None:
+        return to_data_url(car.thumbnail_data)
+    return car.thumbnail_base64
+
+def car_image_content(car):
+    """车辆原图字节（兼容三种存储方式）"""
+    if car.image_key:
+        return _object_content(car.image_key)
+    if car.image_data is not None:
+        return car.image_data
+    return from_data_url(car.image_base64)
+
+def car_thumbnail_content(car):
+    """车辆缩略图字节（兼容三种存储方式）"""
+    if car.thumbnail_key:
+        return _object_content(car.thumbnail_key)
+    if car.thumbnail_data is not None:
+        return car.thumbnail_data
+    return from_data_url(car.thumbnail_base64)
+
+# 车辆可选字段：字段名 -> (需要读取的列, 取值函数)
+# 接口的fields参数按此选择SQL列，未请求的图片大字段不会从数据库读取
+_IMAGE_COLUMNS = (models.Car.image_base64, models.Car.image_data, models.Car.image_key, models.Car.image_mime)
+_THUMBNAIL_COLUMNS = (models.Car.thumbnail_base64, models.Car.thumbnail_data, models.Car.thumbnail_key)
+
+_PLAIN_FIELDS = (
+    "id", "region", "contact", "description", "created_at", "updated_at", "status",
+    "image_width", "image_height", "image_bytes", "image_mime", "image_quality"
+)
+CAR_FIELDS = {name: ((getattr(models.Car, name),), attrgetter(name)) for name in _PLAIN_FIELDS}
+CAR_FIELDS["image_base64"] = (_IMAGE_COLUMNS, car_image_url)
+CAR_FIELDS["thumbnail_base64"] = (_THUMBNAIL_COLUMNS, car_thumbnail_url)
+
+# 各接口的默认字段：列表只含缩略图，详情含原图，创建/更新只返回基本信息（不回传图片）
+LIST_FIELDS = (
+    "id", "region", "contact", "description", "created_at", "thumbnail_base64",
+    "image_width", "image_height", "status"
+)
+DETAIL_FIELDS = (
+    "id", "region", "image_base64", "image_width", "image_height", "image_bytes",
+    "image_mime", "image_quality", "status", "contact", "description", "created_at"
+)
+MUTATION_FIELDS = ("id", "region", "contact", "description", "created_at", "status")
+
+def parse_fields(fields: str = None, default=LIST_FIELDS) -> tuple:
+    """解析逗号分隔的fields参数（未提供时使用默认字段），id总是包含在内"""
+    if not fields:
+        return tuple(default)
+    names = []
+    for name in fields.split(","):
+        name = name.strip()
+        if not name or name in names:
+            continue
+        if name not in CAR_FIELDS:
+            raise HTTPException(status_code=400, detail=f"不支持的字段: {name}")
+        names.append(name)
+    if "id" not in names:
+        names.insert(0, "id")
+    return tuple(names)
+
+def _car_columns(fields, extra=()) -> list:
+    """字段对应的SQL列（去重，保持顺序）"""
+    columns = {}
+    for name in fields:
+        for column in CAR_FIELDS[name][0]:
+            columns[column.key] = column
+    for column in extra:
+        columns[column.key] = column
+    return list(columns.values())
+
+@lru_cache(maxsize=256)
+def car_serializer(fields: tuple):
+    """
+    预先构建一种字段组合的序列化函数（每种组合只构建一次），列表页逐行调用时不再查字段表
+    datetime由orjson原生序列化，不在此转换
+    """
+    getters = tuple((name, CAR_FIELDS[name][1]) for name in fields)
+    return lambda car: {name: getter(car) for name, getter in getters}
+
+def _car_item(car, fields) -> dict:
+    """按字段构造响应结构"""
+    return car_serializer(fields)(car)
+
+def _select_car(db: Session, car_id: int, fields, extra=()):
+    """只读取所需列的单条车辆记录"""
+    return db.query(*_car_columns(fields, extra)).filter(models.Car.id == car_id).first()
 
-def get_cars(db: Session, region: str = None, page: int = 1, limit: int = 20):
-    """获取车辆列表（支持分页）- 包含缩略图数据"""
+def image_fields(upload_result: dict) -> dict:
+    """图片处理结果对应的车辆字段（按存储模式写入图片和缩略图，另含指纹和元数据）"""
+    images = dict.fromkeys(
+        ("image_base64", "thumbnail_base64", "image_data", "thumbnail_data", "image_key", "thumbnail_key")
+    )
+    if settings.IMAGE_STORAGE_MODE == "object":
+        images["image_key"] = upload_result["image_key"]
+        images["thumbnail_key"] = upload_result["thumbnail_key"]
+    elif settings.IMAGE_STORAGE_MODE == "binary":
+        images["image_data"] = upload_result["content"]
+        images["thumbnail_data"] = upload_result["thumbnail_content"]
+    else:
+        images["image_base64"] = to_data_url(upload_result["content"], upload_result["mime_type"])
+        images["thumbnail_base64"] = to_data_url(upload_result["thumbnail_content"])
+    
+    return {
+        **images,
+        "image_phash": upload_result["phash"],
+        "image_width": upload_result["width"],
+        "image_height": upload_result["height"],
+        "image_bytes": upload_result["size"],
+        "image_mime": upload_result["mime_type"],
+        "image_hash": upload_result["sha256"],
+        "image_quality": upload_result.get("quality")
+    }
+
+@tracing.traced()
+def get_cars(db: Session, region: str = None, page: int = 1, limit: int = 20, fields: str = None):
+    """获取车辆列表（支持分页）- 默认包含缩略图数据，fields指定返回的字段"""
+    fields = parse_fields(fields, LIST_FIELDS)
     query = db.query(models.Car)
     if region:
         query = query.filter(models.Car.region == region)
     
-    # 计算总数
-    total = query.count()
+    # 计算总数（直接COUNT，不生成包含全部列的子查询）
+    total = query.with_entities(func.count(models.Car.id)).scalar()
     
-    # 分页查询 - 包含缩略图字段
-    cars = query.with_entities(
-        models.Car.id,
-        models.Car.region,
-        models.Car.contact,
-        models.Car.description,
-        models.Car.created_at,
-        models.Car.thumbnail_base64
-    ).order_by(models.Car.created_at.desc()).offset((page - 1) * limit).limit(limit).all()
+    # 分页查询 - 只读取请求字段对应的列
+    cars = query.with_entities(*_car_columns(fields)).order_by(
+        models.Car.created_at.desc()
+    ).offset((page - 1) * limit).limit(limit).all()
     
+    serialize = car_serializer(fields)
     return {
-        "cars": [
-            {
-                "id": car.id,
-                "region": car.region,
-                "contact": car.contact,
-                "description": car.description,
-                "created_at": car.created_at,
-                "thumbnail_base64": car.thumbnail_base64
-            }
-            for car in cars
-        ],
+        "cars": [serialize(car) for car in cars],
         "total": total,
         "page": page,
         "limit": limit,
         "has_more": (page * limit) < total
     }
 
+def _search_uses_fulltext(db: Session) -> bool:
+    """MySQL使用FULLTEXT索引，其他数据库使用本地倒排索引"""
+    return db.get_bind().dialect.name == "mysql" and settings.SEARCH_BACKEND != "local"
+
+def _search_like(db: Session, terms: List[str], region: str, offset: int, limit: int):
+    """
+    本地索引尚未重建完成时的回退检索：每个检索词在描述或联系方式中作为子串出现，
+    按ID降序、偏移量分页，不计算相关度（得分为None）
+    """
+    query = db.query(models.Car.id)
+    for term in terms:
+        pattern = f"%{escape_like(term)}%"
+        query = query.filter(or_(
+            models.Car.description.ilike(pattern, escape="\\"),
+            models.Car.contact.ilike(pattern, escape="\\")
+        ))
+    if region:
+        query = query.filter(models.Car.region == region)
+    rows = query.order_by(models.Car.id.desc()).offset(offset).limit(limit + 1).all()
+    return [(None, row.id) for row in rows]
+
+@tracing.traced()
+def search_cars(db: Session, q: str, region: str = None, cursor: str = None, limit: int = 20, fields: str = None):
+    """
+    全文检索车辆描述和联系方式，按相关度排序
+    第一步只在索引上取得 (得分, ID)，第二步再按ID读取当前页的列表字段
+    本地索引使用 (得分, ID) 键集分页；MySQL FULLTEXT的得分是浮点数，不能可靠地按相等比较，
+    与启动时本地索引尚未就绪的LIKE回退查询一样使用偏移量分页
+    """
+    fields = parse_fields(fields, LIST_FIELDS)
+    terms = split_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="检索词不能为空")
+    
+    position = None
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except Exception:
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+    offset = position[0] if position and len(position) == 1 else 0
+    
+    if _search_uses_fulltext(db):
+        if position and len(position) != 1:
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+        score = mysql_match(
+            models.Car.description, models.Car.contact, against=boolean_query(terms)
+        ).in_boolean_mode()
+        query = db.query(models.Car.id, score.label("score")).filter(score > 0)
+        if region:
+            query = query.filter(models.Car.region == region)
+        rows = query.order_by(score.desc(), models.Car.id.desc()).offset(offset).limit(limit + 1).all()
+        ranked = [(float(row.score), row.id) for row in rows]
+    elif search_index.ready and (position is None or len(position) == 2):
+        ranked = search_index.search(terms, region=region, after=position, limit=limit + 1)
+    else:
+        # 索引未就绪，或上一页来自回退查询（保持同一种排序，翻页不重复不遗漏）
+        ranked = _search_like(db, terms, region, offset, limit)
+    
+    has_more = len(ranked) > limit
+    ranked = ranked[:limit]
+    
+    cars = {}
+    if ranked:
+        rows = db.query(*_car_columns(fields)).filter(models.Car.id.in_([car_id for _, car_id in ranked])).all()
+        cars = {car.id: car for car in rows}
+    
+    results = []
+    for score_value, car_id in ranked:
+        if car_id in cars:
+            item = _car_item(cars[car_id], fields)
+            item["score"] = score_value
+            results.append(item)
+    
+    next_cursor = None
+    if has_more:
+        if ranked[-1][0] is None or _search_uses_fulltext(db):
+            next_cursor = encode_cursor(offset + limit)
+        else:
+            next_cursor = encode_cursor(*ranked[-1])
+    
+    return {
+        "cars": results,
+        "q": q,
+        "limit": limit,
+        "has_more": has_more,
+        "next_cursor": next_cursor
+    }
+
+def rebuild_search_index(db: Session):
+    """重建本地倒排索引（使用MySQL FULLTEXT时跳过）"""
+    if _search_uses_fulltext(db):
+        return None
+    rows = db.query(
+        models.Car.id, models.Car.region, models.Car.description, models.Car.contact
+    ).all()
+    search_index.rebuild(rows)
+    return len(rows)
+
+def _refresh_search_docs(db: Session, car_ids: List[int]):
+    """批量更新后刷新本地倒排索引中对应的文档"""
+    if not search_index.ready:
+        return
+    rows = db.query(
+        models.Car.id, models.Car.region, models.Car.description, models.Car.contact
+    ).filter(models.Car.id.in_(car_ids)).all()
+    for row in rows:
+        search_index.update(row.id, row.region, row.description, row.contact)
+
+@tracing.traced()
 def get_car_by_id(db: Session, car_id: int):
     """通过ID获取车辆"""
     return db.query(models.Car).filter(models.Car.id == car_id).first()
 
-async def create_car(db: Session, region: str, contact: str, description: str, image: UploadFile):
-    """创建新车辆记录"""
-    # 上传图片并转换为BASE64
-    upload_result = await storage_service.upload_file(image)
+@tracing.traced()
+def save_car_thumbnail(db: Session, car_id: int, thumbnail_content: bytes):
+    """按存储模式保存补生成的缩略图"""
+    if settings.IMAGE_STORAGE_MODE == "object":
+        values = {models.Car.thumbnail_key: storage_service.put_object("thumbnails/", thumbnail_content, "image/jpeg")}
+    elif settings.IMAGE_STORAGE_MODE == "binary":
+        values = {models.Car.thumbnail_data: thumbnail_content}
+    else:
+        values = {models.Car.thumbnail_base64: to_data_url(thumbnail_content)}
+    db.query(models.Car).filter(models.Car.id == car_id).update(values, synchronize_session=False)
+    db.commit()
+    car_list_cache.invalidate()
+    thumbnail_cache.delete(str(car_id))
+
+@tracing.traced()
+def generate_car_thumbnail(db: Session, car):
+    """为缺少缩略图的车辆从原图补生成缩略图并保存（db应为主库会话），返回缩略图字节"""
+    try:
+        image_content = car_image_content(car)
+        if not image_content:
+            return None
+        
+        thumbnail_content = storage_service.render_thumbnail(image_content)
+        if thumbnail_content:
+            save_car_thumbnail(db, car.id, thumbnail_content)
+        return thumbnail_content
+    except Exception:
+        logger.exception(f"车辆 {car.id} 生成缩略图失败")
+        return None
+
+@tracing.traced()
+async def create_car(db: Session, region: str, contact: str, description: str, image: UploadFile,
+                     fields: str = None):
+    """创建新车辆记录（默认不回传图片，fields指定返回的字段）"""
+    fields = parse_fields(fields, MUTATION_FIELDS)
+    if settings.IMAGE_PROCESSING_MODE == "queue":
+        # 只保存原始文件并返回，图片由工作进程异步处理
+        content = await storage_service.read_upload(image)
+        return await run_in_threadpool(_insert_processing_car, db, region, contact, description, fields, content=content)
+    
+    # 处理图片并按存储模式保存；写入数据库和缓存失效在线程池中执行
+    upload_result = await storage_service.save_upload(image)
+    return await run_in_threadpool(_insert_car, db, region, contact, description, upload_result, fields)
+
+@tracing.traced()
+async def create_car_from_upload(db: Session, upload_id: str, region: str, contact: str, description: str,
+                                fields: str = None):
+    """
+    客户端直传完成后的处理回调：从对象存储读取原始文件，压缩、生成缩略图后创建车辆记录，
+    最后删除直传的临时对象
+    """
+    from object_storage import get_object_storage
+    from storage_service import MAX_UPLOAD_SIZE
+    
+    if settings.IMAGE_STORAGE_MODE != "object":
+        raise HTTPException(status_code=400, detail="未启用对象存储")
+    fields = parse_fields(fields, MUTATION_FIELDS)
+    
+    object_storage = get_object_storage()
+    key = object_storage.upload_key(upload_id)
+    if not key:
+        raise HTTPException(status_code=400, detail="无效的上传ID")
     
-    # 创建车辆记录
+    # 访问对象存储是阻塞的网络调用，在线程池中执行
+    info = await run_in_threadpool(object_storage.head, key)
+    if info is None:
+        raise HTTPException(status_code=404, detail="上传的文件不存在或已处理")
+    if info["size"] > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=400, detail="文件大小不能超过5MB")
+    
+    if settings.IMAGE_PROCESSING_MODE == "queue":
+        # 直传的原始文件即任务的输入，由工作进程处理后删除
+        return await run_in_threadpool(_insert_processing_car, db, region, contact, description, fields, source_key=key)
+    
+    content = await run_in_threadpool(object_storage.get, key)
+    upload_result = await storage_service.store_image_in_pool(content, strict=True)
+    result = await run_in_threadpool(_insert_car, db, region, contact, description, upload_result, fields)
+    await storage_service.delete_file(key)
+    return result
+
+def _insert_processing_car(db: Session, region: str, contact: str, description: str, fields=MUTATION_FIELDS,
+                           content: bytes = None, source_key: str = None):
+    """
+    写入处理中的车辆记录和图片处理任务（同一事务），不等待图片处理
+    先解析文件头，明显无效的图片直接拒绝
+    """
+    if content is not None:
+        storage_service.inspect_image(io.BytesIO(content), len(content))
+        if settings.IMAGE_STORAGE_MODE == "object":
+            # 原始文件放在对象存储，任务表不保存大字段
+            source_key = storage_service.put_object("uploads/", content, "application/octet-stream")
+            content = None
+    
+    db_car = models.Car(region=region, contact=contact, description=description, status="processing")
+    db.add(db_car)
+    db.flush()
+    car_id = db_car.id
+    image_jobs.enqueue(db, car_id, source_data=content, source_key=source_key)
+    _adjust_region_counts(db, {region: 1})
+    db.commit()
+    car_list_cache.invalidate()
+    
+    search_index.update(car_id, region, description, contact)
+    
+    result = _car_item(_select_car(db, car_id, fields), fields)
+    result["status_url"] = f"/api/cars/{car_id}/status"
+    return result
+
+def _insert_car(db: Session, region: str, contact: str, description: str, upload_result: dict,
+                fields=MUTATION_FIELDS):
+    """
+    写入车辆记录并维护区域计数和内存索引
+    提交后不刷新ORM对象（会重新读取刚写入的图片），只按ID读取返回字段对应的列
+    """
     db_car = models.Car(
         region=region,
-        image_base64=upload_result["base64_data"],
-        thumbnail_base64=upload_result["thumbnail_data"],  # 保存缩略图
         contact=contact,
-        description=description
+        description=description,
+        **image_fields(upload_result)  # 图片、缩略图及元数据
     )
     
     db.add(db_car)
+    db.flush()
+    car_id = db_car.id
+    _adjust_region_counts(db, {region: 1})
     db.commit()
-    db.refresh(db_car)
+    car_list_cache.invalidate()
     
-    return {
-        "id": db_car.id,
-        "region": db_car.region,
-        "image_base64": db_car.image_base64,
-        "thumbnail_base64": db_car.thumbnail_base64,
-        "contact": db_car.contact,
-        "description": db_car.description,
-        "created_at": db_car.created_at
-    }
+    similarity_index.update(car_id, upload_result["phash"])
+    search_index.update(car_id, region, description, contact)
+    
+    return _car_item(_select_car(db, car_id, fields), fields)
 
+# 数据库URL -> 一条多行INSERT分配的自增ID是否保证连续（每个进程检查一次）
+_consecutive_auto_ids = {}
 
+def _multirow_ids_consecutive(db: Session) -> bool:
+    """
+    MySQL只有在auto_increment_increment为1且innodb_autoinc_lock_mode为0或1时，
+    才保证一条多行INSERT分配的自增ID连续；多主/Galera集群（步长不为1）和lock_mode=2（MySQL 8默认）下不保证
+    """
+    bind = db.get_bind()
+    if bind.dialect.name not in ("mysql", "mariadb"):
+        return False
+    key = str(bind.url)
+    if key not in _consecutive_auto_ids:
+        increment, lock_mode = db.execute(text("SELECT @@auto_increment_increment, @@innodb_autoinc_lock_mode")).one()
+        _consecutive_auto_ids[key] = int(increment) == 1 and int(lock_mode) in (0, 1)
+    return _consecutive_auto_ids[key]
 
-def get_car_details(db: Session, car_id: int):
-    """获取车辆详情"""
-    car = db.query(models.Car).filter(models.Car.id == car_id).first()
-    if not car:
-        raise HTTPException(status_code=404, detail="车辆不存在")
+def _insert_cars(db: Session, rows: List[dict]) -> List[int]:
+    """
+    写入多辆车（不经过ORM逐行flush），按rows顺序返回新记录的ID
+    支持RETURNING的数据库（SQLite、MariaDB）用一条多行INSERT直接取回ID（一条语句内按VALUES顺序递增分配）；
+    MySQL没有RETURNING：自增ID保证连续时用一条多行INSERT并由第一行的ID推算，否则逐行INSERT取回各自的ID
+    """
+    table = models.Car.__table__
+    if db.get_bind().dialect.insert_returning:
+        return sorted(db.execute(insert(table).values(rows).returning(models.Car.id)).scalars())
+    if _multirow_ids_consecutive(db):
+        first_id = db.execute(insert(table).values(rows)).lastrowid
+        return list(range(first_id, first_id + len(rows)))
+    return [db.execute(insert(table).values(row)).lastrowid for row in rows]
+
+@tracing.traced()
+async def create_cars_bulk(db: Session, items: List[dict]):
+    """
+    批量创建车辆记录
+    items: [{"region", "contact", "description", "image": UploadFile}]
+    图片在线程池中并行处理（并发数受IMAGE_PROCESS_WORKERS限制），
+    成功的记录用一条多行INSERT在同一个事务中插入（在线程池中执行）；单张图片失败不影响其余记录
+    """
+    semaphore = asyncio.Semaphore(settings.IMAGE_PROCESS_WORKERS)
+    
+    async def process(item):
+        async with semaphore:
+            content = await storage_service.read_upload(item["image"])
+            return await storage_service.store_image_in_pool(content, strict=True)
+    
+    outcomes = await asyncio.gather(*(process(item) for item in items), return_exceptions=True)
+    
+    results = []
+    pending = []
+    for index, (item, outcome) in enumerate(zip(items, outcomes)):
+        if isinstance(outcome, Exception):
+            error = outcome.detail if isinstance(outcome, HTTPException) else str(outcome)
+            results.append({"index": index, "success": False, "error": error})
+            continue
+        
+        results.append({"index": index, "success": True})
+        pending.append((results[-1], {
+            "region": item["region"],
+            "contact": item.get("contact"),
+            "description": item.get("description"),
+            **image_fields(outcome)
+        }))
+    
+    if pending:
+        rows = [row for _, row in pending]
+        
+        def insert_rows():
+            try:
+                car_ids = _insert_cars(db, rows)
+                _adjust_region_counts(db, Counter(row["region"] for row in rows))
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            return car_ids
+        
+        car_ids = await run_in_threadpool(insert_rows)
+        await car_list_cache.ainvalidate()
+        
+        for (result, row), car_id in zip(pending, car_ids):
+            result["id"] = car_id
+            similarity_index.update(car_id, row["image_phash"])
+            search_index.update(car_id, row["region"], row["description"], row["contact"])
     
     return {
-        "id": car.id,
-        "region": car.region,
-        "image_base64": car.image_base64,
-        "contact": car.contact,
-        "description": car.description,
-        "created_at": car.created_at
+        "results": results,
+        "created": len(pending),
+        "failed": len(results) - len(pending)
     }
 
+@tracing.traced()
+def get_car_details(db: Session, car_id: int, fields: str = None):
+    """获取车辆详情（默认含原图，fields指定返回的字段）"""
+    fields = parse_fields(fields, DETAIL_FIELDS)
+    car = _select_car(db, car_id, fields)
+    if not car:
+        raise HTTPException(status_code=404, detail="车辆不存在")
+    
+    return _car_item(car, fields)
+
+@tracing.traced()
 async def delete_car(db: Session, car_id: int):
-    """删除车辆"""
-    car = db.query(models.Car).filter(models.Car.id == car_id).first()
+    """删除车辆（直接执行DELETE，不加载图片数据）"""
+    car = db.query(models.Car.region, models.Car.image_key, models.Car.thumbnail_key).filter(models.Car.id == car_id).first()
     if not car:
         raise HTTPException(status_code=404, detail="车辆不存在")
     
-    # BASE64存储不需要删除文件
-    db.delete(car)
+    source_keys = _delete_image_jobs(db, [car_id])
+    deleted = db.query(models.Car).filter(models.Car.id == car_id).delete(synchronize_session=False)
+    if deleted:
+        _adjust_region_counts(db, {car.region: -1})
     db.commit()
+    await car_list_cache.ainvalidate()
+    await thumbnail_cache.adelete(str(car_id))
+    
+    # 对象存储的文件在记录删除后再删除（BASE64和二进制存储没有文件），在线程池中访问对象存储
+    await run_in_threadpool(storage_service.delete_objects, [car.image_key, car.thumbnail_key, *source_keys])
+    
+    similarity_index.remove(car_id)
+    search_index.remove(car_id)
     
     return {"message": "车辆删除成功"}
 
+def _delete_image_jobs(db: Session, car_ids: List[int]) -> List[str]:
+    """删除车辆的图片处理任务，返回需要清理的原始文件对象键"""
+    source_keys = [
+        row.source_key
+        for row in db.query(models.ImageJob.source_key).filter(
+            models.ImageJob.car_id.in_(car_ids), models.ImageJob.source_key.isnot(None),
+            models.ImageJob.status.in_(("pending", "running"))
+        )
+    ]
+    db.query(models.ImageJob).filter(models.ImageJob.car_id.in_(car_ids)).delete(synchronize_session=False)
+    return source_keys
+
+@tracing.traced()
 async def update_car(db: Session, car_id: int, region: str = None, 
-                    contact: str = None, description: str = None, image: UploadFile = None):
-    """更新车辆信息"""
-    car = db.query(models.Car).filter(models.Car.id == car_id).first()
+                    contact: str = None, description: str = None, image: UploadFile = None,
+                    fields: str = None):
+    """
+    更新车辆信息（默认不回传图片，fields指定返回的字段）
+    直接执行UPDATE，不加载原有的图片数据
+    """
+    fields = parse_fields(fields, MUTATION_FIELDS)
+    car = db.query(models.Car.region, models.Car.image_key, models.Car.thumbnail_key).filter(models.Car.id == car_id).first()
     if not car:
         raise HTTPException(status_code=404, detail="车辆不存在")
     
     # 更新字段
-    if region:
-        car.region = region
+    values = {}
+    if region and region != car.region:
+        values["region"] = region
     if contact is not None:
-        car.contact = contact
+        values["contact"] = contact
     if description is not None:
-        car.description = description
+        values["description"] = description
     
     # 更新图片
     if image:
-        # 上传新图片并转换为BASE64
-        upload_result = await storage_service.upload_file(image)
-        car.image_base64 = upload_result["base64_data"]
-        car.thumbnail_base64 = upload_result["thumbnail_data"]  # 同时更新缩略图
+        # 处理新图片并按存储模式保存
+        upload_result = await storage_service.save_upload(image)
+        # 同时更新缩略图、指纹和元数据
+        values.update(image_fields(upload_result))
     
+    if values:
+        # 图片处理完成后才更新区域计数，regions表的行锁只持有到紧接着的提交
+        if "region" in values:
+            _adjust_region_counts(db, {car.region: -1, region: 1})
+        db.query(models.Car).filter(models.Car.id == car_id).update(values, synchronize_session=False)
     db.commit()
-    db.refresh(car)
+    await car_list_cache.ainvalidate()
     
-    return {
-        "id": car.id,
-        "region": car.region,
-        "image_base64": car.image_base64,
-        "contact": car.contact,
-        "description": car.description,
-        "created_at": car.created_at
-    }
+    if image:
+        # 新图片使用新的对象键，提交后删除旧对象
+        await run_in_threadpool(storage_service.delete_objects, [car.image_key, car.thumbnail_key])
+        await thumbnail_cache.adelete(str(car_id))
+        similarity_index.update(car_id, upload_result["phash"])
+    
+    updated = _select_car(db, car_id, fields, extra=(models.Car.region, models.Car.description, models.Car.contact))
+    search_index.update(car_id, updated.region, updated.description, updated.contact)
+    
+    return _car_item(updated, fields)
+
+# 批量管理操作
+BATCH_CHUNK_SIZE = 500
+
+def _batch_conditions(batch: schemas.CarBatchFilter):
+    """将批量筛选条件转换为SQL条件，至少需要一个条件以防误操作全表"""
+    conditions = []
+    if batch.ids is not None:
+        # 显式传入的空列表不能当作“未指定”，否则会作用于全表
+        if not batch.ids:
+            raise HTTPException(status_code=400, detail="ids不能为空列表")
+        conditions.append(models.Car.id.in_(batch.ids))
+    if batch.region:
+        conditions.append(models.Car.region == batch.region)
+    if batch.created_from:
+        conditions.append(models.Car.created_at >= batch.created_from)
+    if batch.created_to:
+        conditions.append(models.Car.created_at < batch.created_to)
+    
+    if not conditions:
+        raise HTTPException(status_code=400, detail="必须指定ids、region或创建时间范围")
+    return conditions
+
+def _iter_id_chunks(db: Session, conditions):
+    """按ID递增分块读取匹配车辆的ID（只读取ID列）"""
+    last_id = 0
+    while True:
+        rows = db.query(models.Car.id).filter(
+            *conditions, models.Car.id > last_id
+        ).order_by(models.Car.id).limit(BATCH_CHUNK_SIZE).all()
+        if not rows:
+            return
+        ids = [row.id for row in rows]
+        yield ids
+        last_id = ids[-1]
+
+@tracing.traced()
+def batch_delete_cars(db: Session, batch: schemas.CarBatchFilter):
+    """批量删除车辆"""
+    conditions = _batch_conditions(batch)
+    affected = 0
+    for ids in _iter_id_chunks(db, conditions):
+        region_counts = _count_by_region(db, ids)
+        object_keys = [
+            key
+            for row in db.query(models.Car.image_key, models.Car.thumbnail_key).filter(
+                models.Car.id.in_(ids), models.Car.image_key.isnot(None)
+            )
+            for key in row
+        ]
+        object_keys += _delete_image_jobs(db, ids)
+        result = db.execute(
+            delete(models.Car).where(models.Car.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        _adjust_region_counts(db, {region: -count for region, count in region_counts.items()})
+        db.commit()
+        car_list_cache.invalidate()
+        thumbnail_cache.delete(*(str(car_id) for car_id in ids))
+        affected += result.rowcount
+        storage_service.delete_objects(object_keys)
+        for car_id in ids:
+            similarity_index.remove(car_id)
+            search_index.remove(car_id)
+    
+    return {"affected": affected, "message": f"已删除 {affected} 辆车"}
+
+@tracing.traced()
+def batch_update_cars(db: Session, batch: schemas.CarBatchFilter, values: dict):
+    """批量更新车辆字段（区域、联系方式、描述）"""
+    conditions = _batch_conditions(batch)
+    if not values:
+        raise HTTPException(status_code=400, detail="没有需要更新的字段")
+    
+    if "region" in values:
+        _check_region(db, values["region"])
+    
+    affected = 0
+    for ids in _iter_id_chunks(db, conditions):
+        deltas = Counter()
+        if "region" in values:
+            for region, count in _count_by_region(db, ids).items():
+                deltas[region] -= count
+                deltas[values["region"]] += count
+        result = db.execute(
+            update(models.Car).where(models.Car.id.in_(ids)).values(**values).execution_options(synchronize_session=False)
+        )
+        _adjust_region_counts(db, deltas)
+        db.commit()
+        car_list_cache.invalidate()
+        affected += result.rowcount
+        _refresh_search_docs(db, ids)
+    
+    return {"affected": affected, "message": f"已更新 {affected} 辆车"}
+
+# 区域相关操作
+DEFAULT_REGIONS = ["福田", "罗湖", "南山", "龙华", "龙岗", "宝安", "沙井", "广州"]
+
+def _adjust_region_counts(db: Session, deltas: Dict[str, int]):
+    """
+    在当前事务中调整区域车辆数，随车辆写操作一起提交
+    不在regions表中的区域不计数（可通过refresh_region_counts修复）
+    按区域名顺序更新，并发事务总是以相同顺序锁定regions表的行，A→B与B→A的移动不会死锁
+    """
+    for region, delta in sorted(deltas.items()):
+        if delta:
+            db.execute(
+                update(models.Region)
+                .where(models.Region.name == region)
+                .values(car_count=models.Region.car_count + delta)
+                .execution_options(synchronize_session=False)
+            )
+
+def _check_region(db: Session, region: str):
+    """目标区域必须在regions表中（表尚未初始化时为默认区域），否则移入的车辆不会被计数"""
+    if db.query(models.Region.id).filter(models.Region.name == region).first():
+        return
+    if region in DEFAULT_REGIONS and not db.query(models.Region.id).first():
+        return
+    raise HTTPException(status_code=400, detail=f"区域不存在: {region}")
+
+def _count_by_region(db: Session, car_ids: List[int]) -> Dict[str, int]:
+    """统计一批车辆在各区域的数量"""
+    rows = db.query(models.Car.region, func.count(models.Car.id)).filter(
+        models.Car.id.in_(car_ids)
+    ).group_by(models.Car.region).all()
+    return {region: count for region, count in rows}
+
+@tracing.traced()
+def get_regions(db: Session, with_counts: bool = False):
+    """获取区域列表，with_counts时附带各区域车辆数（读取regions表维护的计数，无需COUNT车辆表）"""
+    rows = db.query(models.Region.name, models.Region.car_count).order_by(
+        models.Region.sort_order, models.Region.id
+    ).all()
+    
+    if not rows:
+        # regions表尚未初始化时使用默认区域
+        result = {"regions": list(DEFAULT_REGIONS)}
+        if with_counts:
+            counts = dict(db.query(models.Car.region, func.count(models.Car.id)).group_by(models.Car.region).all())
+            result["counts"] = {region: counts.get(region, 0) for region in DEFAULT_REGIONS}
+            result["total"] = sum(counts.values())
+        return result
+    
+    result = {"regions": [row.name for row in rows]}
+    if with_counts:
+        result["counts"] = {row.name: row.car_count for row in rows}
+        result["total"] = sum(row.car_count for row in rows)
+    return result
+
+@tracing.traced()
+def create_region(db: Session, region: schemas.RegionCreate):
+    """创建区域，车辆数按现有车辆统计"""
+    existing = db.query(models.Region.id).filter(models.Region.name == region.name).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="区域已存在")
+    
+    car_count = db.query(func.count(models.Car.id)).filter(models.Car.region == region.name).scalar()
+    db_region = models.Region(name=region.name, sort_order=region.sort_order, car_count=car_count)
+    db.add(db_region)
+    db.commit()
+    site_config_cache.invalidate()
+    db.refresh(db_region)
+    return db_region
+
+@tracing.traced()
+def delete_region(db: Session, name: str):
+    """删除区域（区域下仍有车辆时不允许删除）"""
+    db_region = db.query(models.Region).filter(models.Region.name == name).first()
+    if not db_region:
+        raise HTTPException(status_code=404, detail="区域不存在")
+    if db_region.car_count > 0:
+        raise HTTPException(status_code=400, detail="该区域下仍有车辆，无法删除")
+    
+    db.delete(db_region)
+    db.commit()
+    site_config_cache.invalidate()
+    return {"message": "区域删除成功"}
+
+def init_default_regions(db: Session):
+    """初始化默认区域（regions表为空时）"""
+    if db.query(models.Region.id).first():
+        return 0
+    
+    for index, name in enumerate(DEFAULT_REGIONS):
+        db.add(models.Region(name=name, sort_order=index))
+    db.commit()
+    site_config_cache.invalidate()
+    refresh_region_counts(db)
+    return len(DEFAULT_REGIONS)
+
+def refresh_region_counts(db: Session):
+    """按车辆表重新统计各区域车辆数（用于初始化和修复计数）"""
+    counts = dict(db.query(models.Car.region, func.count(models.Car.id)).group_by(models.Car.region).all())
+    for db_region in db.query(models.Region).all():
+        db_region.car_count = counts.get(db_region.name, 0)
+    db.commit()
+    return counts
+
+# 图片相似度相关操作
+def rebuild_similarity_index(db: Session):
+    """从数据库重建图片相似度索引（只读取ID和哈希列）"""
+    rows = db.query(models.Car.id, models.Car.image_phash).filter(
+        models.Car.image_phash.isnot(None)
+    ).all()
+    similarity_index.rebuild(rows)
+    return len(similarity_index)
+
+@tracing.traced()
+def find_similar_cars(db: Session, car_id: int, max_distance: int = 10, limit: int = 20):
+    """查找图片与指定车辆近似重复的其他车辆"""
+    exists = db.query(models.Car.id).filter(models.Car.id == car_id).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="车辆不存在")
+    
+    matches = similarity_index.find_similar(car_id, max_distance=max_distance, limit=limit)
+    if matches is None:
+        return {"car_id": car_id, "similar": [], "message": "该车辆尚未计算图片指纹"}
+    
+    distances = {other_id: distance for distance, other_id in matches}
+    cars = []
+    if distances:
+        cars = db.query(
+            models.Car.id,
+            models.Car.region,
+            models.Car.contact,
+            models.Car.description,
+            models.Car.created_at
+        ).filter(models.Car.id.in_(list(distances))).all()
+    
+    similar = [
+        {
+            "id": car.id,
+            "distance": distances[car.id],
+            "region": car.region,
+            "contact": car.contact,
+            "description": car.description,
+            "created_at": car.created_at
+        }
+        for car in cars
+    ]
+    similar.sort(key=lambda item: (item["distance"], item["id"]))
+    
+    return {"car_id": car_id, "similar": similar, "message": "查询成功"}
 
 # 用户相关CRUD操作
+@tracing.traced()
 def get_user_by_username(db: Session, username: str):
     """通过用户名获取用户"""
     return db.query(models.User).filter(models.User.username == username).first()
 
+@tracing.traced()
 def create_user(db: Session, user: schemas.UserCreate):
     """创建新用户"""
     hashed_password = get_password_hash(user.password)
@@ -163,6 +889,7 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
+@tracing.traced()
 def authenticate_user(db: Session, username: str, password: str):
     """验证用户"""
     user = get_user_by_username(db, username)
@@ -173,10 +900,12 @@ def authenticate_user(db: Session, username: str, password: str):
     return user
 
 # 站点配置相关CRUD操作
+@tracing.traced()
 def get_site_config(db: Session, config_key: str):
     """获取站点配置"""
     return db.query(models.SiteConfig).filter(models.SiteConfig.config_key == config_key).first()
 
+@tracing.traced()
 def create_site_config(db: Session, config: schemas.SiteConfigCreate):
     """创建站点配置"""
     # 检查是否已存在
@@ -199,6 +928,7 @@ def create_site_config(db: Session, config: schemas.SiteConfigCreate):
     db.refresh(db_config)
     return db_config
 
+@tracing.traced()
 def update_site_config(db: Session, config_key: str, config_update: schemas.SiteConfigUpdate):
     """更新站点配置"""
     db_config = get_site_config(db, config_key)
@@ -218,6 +948,7 @@ def update_site_config(db: Session, config_key: str, config_update: schemas.Site
     db.refresh(db_config)
     return db_config
 
+@tracing.traced()
 def verify_homepage_password(db: Session, password: str):
     """验证首页密码"""
     config = get_site_config(db, "homepage_password")
@@ -1,19 +1,70 @@
-from sqlalchemy import create_engine
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.requests import Request
 from config import settings
+import tracing
 
 # 使用配置文件中的数据库URL
 DATABASE_URL = settings.database_url
 
-# 创建数据库引擎
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=10,
-    max_overflow=20,
-    pool_pre_ping=True,
-    pool_recycle=300
-)
+def _create_engine(url: str) -> Engine:
+    if make_url(url).get_backend_name() == "sqlite":
+        return _create_sqlite_engine(url)
+    return create_engine(
+        url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=300
+    )
+
+def _create_sqlite_engine(url: str) -> Engine:
+    """
+    SQLite嵌入模式（单机部署、本地测试和基准测试）
+    文件数据库：WAL日志使读写互不阻塞，synchronous=NORMAL在WAL下只在检查点时刷盘，
+    内存映射读取减少系统调用；连接可跨线程使用（请求线程池、图片处理线程）
+    内存数据库（sqlite://）只有一个共享连接，否则每个连接看到的是不同的空数据库
+    """
+    database = make_url(url).database
+    in_memory = not database or database == ":memory:"
+    options = {
+        "connect_args": {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}
+    }
+    if in_memory:
+        options["poolclass"] = StaticPool
+    else:
+        # 连接本身很廉价，但每个连接有独立的页缓存，保持少量常驻连接
+        options["pool_size"] = settings.DB_POOL_SIZE
+        options["max_overflow"] = settings.DB_MAX_OVERFLOW
+    sqlite_engine = create_engine(url, **options)
+    
+    @event.listens_for(sqlite_engine, "connect")
+    def _configure_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+    
+    return sqlite_engine
+
+# 每条SQL语句记录为链路追踪的子span（对主库和副本引擎都生效）
+tracing.instrument_engine(Engine)
+
+# 创建数据库引擎（主库，所有写操作）
+engine = _create_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -24,4 +75,109 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+class ReplicaRouter:
+    """
+    只读副本路由：在健康的副本之间轮询分配只读会话
+    后台线程定期检查副本健康状态，请求中连接失败的副本会立即被标记为不可用
+    """
+    
+    def __init__(self, engines, check_interval: int = 10):
+        self.engines = list(engines)
+        self.check_interval = check_interval
+        self._healthy = [True] * len(self.engines)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._checker = None
+    
+    def pick(self) -> Optional[Engine]:
+        """选择一个健康的副本，没有可用副本时返回None"""
+        with self._lock:
+            healthy = [e for e, ok in zip(self.engines, self._healthy) if ok]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+    
+    def mark_unhealthy(self, replica: Engine):
+        with self._lock:
+            self._healthy[self.engines.index(replica)] = False
+    
+    def check_health(self):
+        """逐个探测副本，更新健康状态"""
+        for index, replica in enumerate(self.engines):
+            try:
+                with replica.connect() as connection:
+                    connection.exec_driver_sql("SELECT 1")
+                ok = True
+            except Exception:
+                ok = False
+            with self._lock:
+                self._healthy[index] = ok
+    
+    def status(self) -> list:
+        with self._lock:
+            return [
+                {"url": replica.url.render_as_string(hide_password=True), "healthy": ok}
+                for replica, ok in zip(self.engines, self._healthy)
+            ]
+    
+    def start_health_checks(self):
+        """启动后台健康检查线程（没有配置副本时不启动）"""
+        if not self.engines or self._checker is not None:
+            return
+        
+        def loop():
+            while True:
+                self.check_health()
+                time.sleep(self.check_interval)
+        
+        self._checker = threading.Thread(target=loop, name="replica-health", daemon=True)
+        self._checker.start()
+
+replica_router = ReplicaRouter(
+    [_create_engine(url) for url in settings.replica_urls],
+    check_interval=settings.DB_REPLICA_CHECK_INTERVAL
+)
+
+# 管理员写操作后设置此Cookie，有效期内该客户端的读请求走主库（读己之写）
+PRIMARY_STICKY_COOKIE = "db_primary_until"
+
+def prefers_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(PRIMARY_STICKY_COOKIE)) > time.time()
+    except (TypeError, ValueError):
+        return False
+
+@contextmanager
+def read_session(primary: bool = False):
+    """
+    只读会话：优先使用健康的副本，副本不可用或primary为True时使用主库
+    不依赖请求，缓存加载函数等在请求之外执行的代码用它打开自己的会话
+    """
+    db = None
+    if not primary:
+        replica = replica_router.pick()
+        if replica is not None:
+            db = SessionLocal(bind=replica)
+            try:
+                # 提前取得连接，副本连接失败时回退到主库
+                db.connection()
+            except Exception:
+                db.close()
+                replica_router.mark_unhealthy(replica)
+                db = None
+    
+    if db is None:
+        db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db(request: Request):
+    """
+    只读会话：优先使用健康的副本，副本不可用或客户端处于读己之写窗口内时使用主库
+    """
+    with read_session(primary=prefers_primary(request)) as db:
+        yield db
@@ -11,8 +11,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from sqlalchemy.orm import Session
 from database import SessionLocal
 import models
-from storage_service import storage_service
-import base64
+import crud
 import logging
 
 # 配置日志
@@ -23,9 +22,11 @@ async def generate_thumbnails_for_existing_cars():
     """为现有车辆记录生成缩略图"""
     db = SessionLocal()
     try:
-        # 获取所有没有缩略图的车辆记录
+        # 获取所有没有缩略图的车辆记录（兼容BASE64、二进制和对象存储三种方式）
         cars_without_thumbnails = db.query(models.Car).filter(
-            models.Car.thumbnail_base64.is_(None)
+            models.Car.thumbnail_base64.is_(None),
+            models.Car.thumbnail_data.is_(None),
+            models.Car.thumbnail_key.is_(None)
         ).all()
         
         logger.info(f"找到 {len(cars_without_thumbnails)} 条需要生成缩略图的记录")
@@ -38,31 +39,18 @@ async def generate_thumbnails_for_existing_cars():
                 logger.info(f"正在为车辆 {car.id} 生成缩略图...")
                 
                 # 检查是否有原始图片数据
-                if not car.image_base64:
+                if car.image_data is None and not car.image_base64 and not car.image_key:
                     logger.warning(f"车辆 {car.id} 没有原始图片数据，跳过")
                     error_count += 1
                     continue
                 
-                # 提取原始图片数据
-                if ';base64,' in car.image_base64:
-                    image_data = base64.b64decode(car.image_base64.split(';base64,')[1])
-                    mime_type = car.image_base64.split(';')[0].replace('data:', '')
-                    
-                    # 生成缩略图
-                    thumbnail_data = await storage_service.create_thumbnail(image_data, mime_type)
-                    
-                    if thumbnail_data:
-                        # 更新数据库
-                        car.thumbnail_base64 = thumbnail_data
-                        db.commit()
-                        success_count += 1
-                        logger.info(f"✓ 车辆 {car.id} 缩略图生成成功")
-                    else:
-                        error_count += 1
-                        logger.error(f"✗ 车辆 {car.id} 缩略图生成失败")
+                # 生成缩略图并按当前存储模式保存
+                if crud.generate_car_thumbnail(db, car):
+                    success_count += 1
+                    logger.info(f"✓ 车辆 {car.id} 缩略图生成成功")
                 else:
                     error_count += 1
-                    logger.error(f"✗ 车辆 {car.id} 图片数据格式错误")
+                    logger.error(f"✗ 车辆 {car.id} 缩略图生成失败")
                     
             except Exception as e:
                 error_count += 1
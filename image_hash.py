@@ -0,0 +1,186 @@
+"""
+图片感知哈希与相似度索引
+使用dHash为每张车辆图片生成64位指纹，并用BK树在内存中按汉明距离检索近似重复图片
+"""
+
+import io
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# dHash尺寸：8x8 = 64位
+HASH_SIZE = 8
+
+def dhash(image: "Image.Image", hash_size: int = HASH_SIZE) -> int:
+    """
+    计算图片的dHash（差值哈希）
+    缩放为(hash_size+1) x hash_size的灰度图，逐行比较相邻像素亮度
+    """
+    from PIL import Image
+
+    gray = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = list(gray.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+def dhash_bytes(image_content: bytes) -> Optional[int]:
+    """
+    从图片字节计算dHash
+    JPEG使用draft模式按DCT缩放解码，只需解出很小的图像，开销远小于完整解码
+    """
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(image_content))
+        if image.format == 'JPEG':
+            image.draft('L', (64, 64))
+        return dhash(image)
+    except Exception as e:
+        logger.warning(f"计算图片指纹失败: {e}")
+        return None
+
+def hash_to_hex(value: int) -> str:
+    """将64位哈希转换为16位十六进制字符串（数据库存储格式）"""
+    return f"{value:016x}"
+
+def hex_to_hash(value: str) -> int:
+    """将十六进制字符串还原为整数哈希"""
+    return int(value, 16)
+
+def hamming_distance(a: int, b: int) -> int:
+    """计算两个哈希之间的汉明距离"""
+    return bin(a ^ b).count('1')
+
+class _BKNode:
+    __slots__ = ("hash", "car_ids", "children")
+
+    def __init__(self, hash_value: int):
+        self.hash = hash_value
+        self.car_ids = set()
+        self.children: Dict[int, "_BKNode"] = {}
+
+class BKTree:
+    """
+    基于汉明距离的BK树
+    相同哈希的车辆共用一个节点；删除时只移除车辆ID，空节点保留用于路由
+    """
+
+    def __init__(self):
+        self.root: Optional[_BKNode] = None
+
+    def add(self, hash_value: int, car_id: int):
+        if self.root is None:
+            self.root = _BKNode(hash_value)
+            self.root.car_ids.add(car_id)
+            return
+
+        node = self.root
+        while True:
+            distance = hamming_distance(hash_value, node.hash)
+            if distance == 0:
+                node.car_ids.add(car_id)
+                return
+            child = node.children.get(distance)
+            if child is None:
+                child = _BKNode(hash_value)
+                child.car_ids.add(car_id)
+                node.children[distance] = child
+                return
+            node = child
+
+    def remove(self, hash_value: int, car_id: int):
+        node = self.root
+        while node is not None:
+            distance = hamming_distance(hash_value, node.hash)
+            if distance == 0:
+                node.car_ids.discard(car_id)
+                return
+            node = node.children.get(distance)
+
+    def search(self, hash_value: int, max_distance: int) -> List[Tuple[int, int]]:
+        """返回 [(距离, 车辆ID)]，按距离升序"""
+        results = []
+        if self.root is None:
+            return results
+
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(hash_value, node.hash)
+            if distance <= max_distance:
+                results.extend((distance, car_id) for car_id in node.car_ids)
+            # 三角不等式剪枝：只有距离落在[d-k, d+k]内的子树可能包含结果
+            low, high = distance - max_distance, distance + max_distance
+            for child_distance, child in node.children.items():
+                if low <= child_distance <= high:
+                    stack.append(child)
+
+        results.sort()
+        return results
+
+class SimilarityIndex:
+    """
+    车辆图片相似度索引（线程安全）
+    启动时从数据库重建，创建/更新/删除车辆时增量维护
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._tree = BKTree()
+        self._car_hashes: Dict[int, int] = {}
+
+    def rebuild(self, rows: Iterable[Tuple[int, str]]):
+        """使用 (车辆ID, 十六进制哈希) 列表重建索引"""
+        tree = BKTree()
+        car_hashes = {}
+        for car_id, hex_value in rows:
+            if not hex_value:
+                continue
+            hash_value = hex_to_hash(hex_value)
+            tree.add(hash_value, car_id)
+            car_hashes[car_id] = hash_value
+
+        with self._lock:
+            self._tree = tree
+            self._car_hashes = car_hashes
+
+    def update(self, car_id: int, hex_value: Optional[str]):
+        """新增或替换车辆的图片指纹"""
+        with self._lock:
+            self.remove(car_id)
+            if hex_value:
+                hash_value = hex_to_hash(hex_value)
+                self._tree.add(hash_value, car_id)
+                self._car_hashes[car_id] = hash_value
+
+    def remove(self, car_id: int):
+        with self._lock:
+            hash_value = self._car_hashes.pop(car_id, None)
+            if hash_value is not None:
+                self._tree.remove(hash_value, car_id)
+
+    def find_similar(self, car_id: int, max_distance: int = 10, limit: int = 20) -> Optional[List[Tuple[int, int]]]:
+        """
+        查找与指定车辆图片相似的其他车辆
+        返回 [(距离, 车辆ID)]；车辆不在索引中时返回None
+        """
+        with self._lock:
+            hash_value = self._car_hashes.get(car_id)
+            if hash_value is None:
+                return None
+            matches = self._tree.search(hash_value, max_distance)
+
+        return [(distance, other_id) for distance, other_id in matches if other_id != car_id][:limit]
+
+    def __len__(self):
+        return len(self._car_hashes)
+
+# 创建全局相似度索引实例
+similarity_index = SimilarityIndex()
\ No newline at end of file
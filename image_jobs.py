@@ -0,0 +1,313 @@
+"""
+图片处理任务队列（基于数据库表 image_jobs）
+上传接口保存原始文件并插入任务后立即返回，工作进程（worker.py）领取任务生成图片和缩略图。
+领取任务使用条件UPDATE抢占租约，可以同时运行多个工作进程；
+工作进程崩溃后租约过期，任务会被重新领取；失败的任务按指数退避重试，超过次数后标记为失败。
+任务完成后工作进程使共享缓存失效；Web进程通过follow_completed_jobs跟进完成的任务，更新本进程的内存索引。
+"""
+
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import and_, or_, func, update
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+import models
+import tracing
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# 重试退避上限（秒）
+MAX_RETRY_DELAY = 300
+
+def _now() -> datetime:
+    return datetime.utcnow()
+
+def enqueue(db: Session, car_id: int, source_data: bytes = None, source_key: str = None) -> models.ImageJob:
+    """在调用方的事务中插入任务（与车辆记录一起提交），记录当前链路以便工作进程延续"""
+    job = models.ImageJob(
+        car_id=car_id,
+        source_data=source_data,
+        source_key=source_key,
+        available_at=_now(),
+        trace_parent=tracing.current_traceparent()
+    )
+    db.add(job)
+    return job
+
+def _claimable(now: datetime):
+    """可领取的任务：等待中且已到可执行时间，或运行中、租约已过期且还有重试次数"""
+    return or_(
+        and_(models.ImageJob.status == "pending", models.ImageJob.available_at <= now),
+        and_(
+            models.ImageJob.status == "running", models.ImageJob.lease_expires_at < now,
+            models.ImageJob.attempts < settings.JOB_MAX_ATTEMPTS
+        )
+    )
+
+def _exhausted(now: datetime):
+    """租约已过期且用完重试次数的任务（工作进程每次处理它时都崩溃或超时）"""
+    return and_(
+        models.ImageJob.status == "running", models.ImageJob.lease_expires_at < now,
+        models.ImageJob.attempts >= settings.JOB_MAX_ATTEMPTS
+    )
+
+def fail_exhausted_jobs(db: Session) -> int:
+    """将用完重试次数的过期任务及其车辆标记为失败，返回处理的任务数"""
+    from storage_service import storage_service
+    from page_cache import car_list_cache
+
+    now = _now()
+    jobs = db.query(models.ImageJob.id, models.ImageJob.car_id, models.ImageJob.source_key).filter(
+        _exhausted(now)
+    ).limit(50).all()
+    failed = []
+    for job in jobs:
+        result = db.execute(
+            update(models.ImageJob)
+            .where(models.ImageJob.id == job.id, _exhausted(now))
+            .values(status="failed", lease_owner=None, source_data=None, last_error="处理超时，已超过最大重试次数")
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            db.query(models.Car).filter(models.Car.id == job.car_id).update(
+                {models.Car.status: "failed"}, synchronize_session=False
+            )
+            failed.append(job)
+    db.commit()
+
+    if failed:
+        logger.warning(f"{len(failed)} 个图片处理任务超过最大重试次数，已标记为失败")
+        car_list_cache.invalidate()
+        storage_service.delete_objects([job.source_key for job in failed])
+    return len(failed)
+
+def claim_job(db: Session, owner: str) -> Optional[models.ImageJob]:
+    """
+    领取一个任务
+    先查出候选任务，再用带原条件的UPDATE抢占；其他工作进程抢先时影响行数为0，换下一个候选
+    """
+    fail_exhausted_jobs(db)
+    now = _now()
+    candidates = db.query(models.ImageJob.id).filter(_claimable(now)).order_by(models.ImageJob.id).limit(5).all()
+    for (job_id,) in candidates:
+        result = db.execute(
+            update(models.ImageJob)
+            .where(models.ImageJob.id == job_id, _claimable(now))
+            .values(
+                status="running",
+                lease_owner=owner,
+                lease_expires_at=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+                attempts=models.ImageJob.attempts + 1
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        if result.rowcount == 1:
+            return db.get(models.ImageJob, job_id)
+    return None
+
+def _release(db: Session, job: models.ImageJob, owner: str, **values) -> bool:
+    """只有仍持有租约时才能更新任务状态，租约已被他人接管时返回False"""
+    result = db.execute(
+        update(models.ImageJob)
+        .where(models.ImageJob.id == job.id, models.ImageJob.lease_owner == owner, models.ImageJob.status == "running")
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def process_job(db: Session, job: models.ImageJob, owner: str) -> str:
+    """
+    处理一个已领取的任务，返回任务结果状态（done / pending / failed / lost）
+    """
+    with tracing.span(
+        "image_job.process", root=True, traceparent=job.trace_parent,
+        **{"job.id": job.id, "job.car_id": job.car_id, "job.attempts": job.attempts}
+    ) as span:
+        outcome = _process_job(db, job, owner)
+        if span is not None:
+            span.set_attribute("job.outcome", outcome)
+        return outcome
+
+def _process_job(db: Session, job: models.ImageJob, owner: str) -> str:
+    from storage_service import storage_service
+    from page_cache import car_list_cache, thumbnail_cache
+    import crud
+
+    try:
+        if job.source_key:
+            from object_storage import get_object_storage
+            content = get_object_storage().get(job.source_key)
+        else:
+            content = job.source_data
+        upload_result = storage_service.store_image(content, strict=True)
+    except Exception as e:
+        db.rollback()
+        # 图片无法解析不会因重试而成功，直接标记失败
+        permanent = isinstance(e, HTTPException) or job.attempts >= settings.JOB_MAX_ATTEMPTS
+        error = e.detail if isinstance(e, HTTPException) else str(e)
+        source_key = job.source_key
+        if permanent:
+            released = _release(db, job, owner, status="failed", last_error=error, lease_owner=None, source_data=None)
+            if released:
+                db.query(models.Car).filter(models.Car.id == job.car_id).update(
+                    {models.Car.status: "failed"}, synchronize_session=False
+                )
+        else:
+            delay = min(2 ** job.attempts, MAX_RETRY_DELAY)
+            released = _release(
+                db, job, owner, status="pending", last_error=error, lease_owner=None,
+                available_at=_now() + timedelta(seconds=delay)
+            )
+        attempts = job.attempts
+        db.commit()
+        logger.warning(f"图片处理任务 {job.id}（车辆 {job.car_id}）第 {attempts} 次失败: {error}")
+        if not released:
+            return "lost"
+        if permanent:
+            car_list_cache.invalidate()
+            storage_service.delete_objects([source_key])
+            return "failed"
+        return "pending"
+
+    # 在同一事务中写入处理结果并完成任务；租约已被接管时放弃本次结果
+    if not _release(db, job, owner, status="done", source_data=None, last_error=None, lease_owner=None):
+        db.rollback()
+        storage_service.delete_objects([upload_result.get("image_key"), upload_result.get("thumbnail_key")])
+        logger.warning(f"图片处理任务 {job.id} 租约已过期，结果已丢弃")
+        return "lost"
+
+    updated = db.query(models.Car).filter(models.Car.id == job.car_id).update(
+        {**crud.image_fields(upload_result), "status": "ready"}, synchronize_session=False
+    )
+    db.commit()
+    # 车辆状态和缩略图已变化（共享缓存后端时所有进程立即生效）
+    car_list_cache.invalidate()
+    thumbnail_cache.delete(str(job.car_id))
+
+    if not updated:
+        # 处理期间车辆已被删除
+        storage_service.delete_objects([upload_result.get("image_key"), upload_result.get("thumbnail_key")])
+    if job.source_key:
+        storage_service.delete_objects([job.source_key])
+    return "done"
+
+class CompletedJobFollower:
+    """
+    Web进程跟进工作进程完成的任务：把新图片的指纹加入本进程的相似度索引；
+    缓存后端为进程内内存时工作进程的失效传不到本进程，同时使本进程的缓存失效
+    从创建后的第一次poll开始跟进，更早完成的任务已包含在预热时重建的索引中
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.started = False
+        self.since = None  # 已跟进到的任务更新时间
+        self._seen = set()  # 更新时间等于since的已处理任务，避免重复处理
+
+    def poll(self) -> int:
+        """处理上次以来完成或失败的任务，返回新处理的任务数"""
+        from image_hash import similarity_index
+        from page_cache import car_list_cache, thumbnail_cache
+
+        finished = models.ImageJob.status.in_(("done", "failed"))
+        db = self.session_factory()
+        try:
+            if not self.started:
+                self.since = db.query(func.max(models.ImageJob.updated_at)).filter(finished).scalar()
+                self.started = True
+                return 0
+            query = db.query(
+                models.ImageJob.id, models.ImageJob.car_id, models.ImageJob.updated_at,
+                models.Car.status, models.Car.image_phash
+            ).join(models.Car, models.Car.id == models.ImageJob.car_id).filter(finished)
+            if self.since is not None:
+                query = query.filter(models.ImageJob.updated_at >= self.since)
+            rows = query.order_by(models.ImageJob.updated_at, models.ImageJob.id).limit(500).all()
+        finally:
+            db.close()
+
+        new_rows = [row for row in rows if row.id not in self._seen]
+        if rows:
+            self.since = rows[-1].updated_at
+            self._seen = {row.id for row in rows if row.updated_at == self.since}
+
+        for row in new_rows:
+            if row.status == "ready":
+                similarity_index.update(row.car_id, row.image_phash)
+        if new_rows and settings.CACHE_BACKEND == "memory":
+            car_list_cache.invalidate()
+            for row in new_rows:
+                thumbnail_cache.delete(str(row.car_id))
+        return len(new_rows)
+
+def job_status(db: Session, car_id: int) -> dict:
+    """车辆图片处理状态（供前端轮询）"""
+    car = db.query(models.Car.id, models.Car.status).filter(models.Car.id == car_id).first()
+    if not car:
+        raise HTTPException(status_code=404, detail="车辆不存在")
+
+    job = db.query(models.ImageJob).filter(models.ImageJob.car_id == car_id).order_by(models.ImageJob.id.desc()).first()
+    return {
+        "car_id": car_id,
+        "status": car.status,
+        "attempts": job.attempts if job else 0,
+        "error": job.last_error if job and car.status == "failed" else None
+    }
+
+class Worker:
+    """
+    任务消费者：每个线程独立循环领取并处理任务
+    图片编解码时Pillow会释放GIL，多线程可以利用多核
+    """
+
+    def __init__(self, session_factory, concurrency: int = 1, poll_interval: float = None):
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval if poll_interval is not None else settings.JOB_POLL_INTERVAL
+        self.owner_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self.stop_event = threading.Event()
+        self.processed = 0
+        self._lock = threading.Lock()
+
+    def run_once(self, owner: str) -> Optional[str]:
+        """领取并处理一个任务，没有任务时返回None"""
+        db = self.session_factory()
+        try:
+            job = claim_job(db, owner)
+            if job is None:
+                return None
+            outcome = process_job(db, job, owner)
+            with self._lock:
+                self.processed += 1
+            return outcome
+        finally:
+            db.close()
+
+    def _loop(self, index: int):
+        owner = f"{self.owner_prefix}:{index}"
+        while not self.stop_event.is_set():
+            try:
+                outcome = self.run_once(owner)
+            except Exception as e:
+                logger.error(f"工作线程 {owner} 出错: {e}")
+                outcome = None
+            if outcome is None:
+                self.stop_event.wait(self.poll_interval)
+
+    def start(self) -> list:
+        threads = [
+            threading.Thread(target=self._loop, args=(index,), name=f"image-worker-{index}", daemon=True)
+            for index in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def stop(self):
+        self.stop_event.set()
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+按目标大小自适应选择JPEG质量
+在已解码（并缩放）的图像上二分搜索质量参数：取不超过目标字节数的最高质量，
+同时保证结构相似度（SSIM）不低于下限——两者冲突时优先保证画质。
+编码次数和总耗时都有上限（SSIM评估的耗时同样计入），超出时使用已找到的最佳结果，上传延迟可控。
+纯Pillow实现，SSIM在原始分辨率的亮度采样块上按8x8窗口计算，每次评估约十几毫秒。
+"""
+
+import io
+import time
+from typing import Optional, Tuple
+
+# SSIM在原始分辨率的若干采样块上计算（缩小后JPEG块效应会被平滑掉，无法反映画质）
+SSIM_TILE_SIZE = 96
+SSIM_TILE_GRID = 3  # 3x3网格，每格中心取一块
+_SSIM_C1 = (0.01 * 255) ** 2
+_SSIM_C2 = (0.03 * 255) ** 2
+
+# 最近SSIM评估（解码采样块+计算）耗时的滑动平均，用于在首次评估前判断剩余时间是否足够
+_ssim_seconds = 0.015
+
+def _tiles(gray) -> Tuple[bytes, int, int]:
+    """从灰度图的网格中心裁出采样块，纵向拼接为一张窄图（与8x8编码块对齐）"""
+    from PIL import Image
+
+    tile = min(SSIM_TILE_SIZE, gray.width // 8 * 8, gray.height // 8 * 8)
+    boxes = []
+    for row in range(SSIM_TILE_GRID):
+        for column in range(SSIM_TILE_GRID):
+            left = ((gray.width * (2 * column + 1)) // (2 * SSIM_TILE_GRID) - tile // 2) // 8 * 8
+            top = ((gray.height * (2 * row + 1)) // (2 * SSIM_TILE_GRID) - tile // 2) // 8 * 8
+            left = max(0, min(left, gray.width - tile))
+            top = max(0, min(top, gray.height - tile))
+            boxes.append((left, top, left + tile, top + tile))
+    strip = Image.new("L", (tile, tile * len(boxes)))
+    for index, box in enumerate(boxes):
+        strip.paste(gray.crop(box), (0, index * tile))
+    return strip.tobytes(), tile, tile * len(boxes)
+
+def _probe(image) -> Tuple[bytes, int, int]:
+    """参考图的采样块"""
+    return _tiles(image.convert("L"))
+
+def _decode_probe(content: bytes) -> bytes:
+    """解码候选JPEG的亮度通道并取相同位置的采样块"""
+    from PIL import Image
+
+    return _tiles(Image.open(io.BytesIO(content)).convert("L"))[0]
+
+def ssim(reference: bytes, candidate: bytes, width: int, height: int, block: int = 8) -> float:
+    """两张同尺寸灰度图的平均SSIM（不重叠的block x block窗口）"""
+    total = 0.0
+    count = 0
+    pixels = block * block
+    for top in range(0, height - block + 1, block):
+        for left in range(0, width - block + 1, block):
+            sum_x = sum_y = sum_xx = sum_yy = sum_xy = 0
+            for row in range(top, top + block):
+                start = row * width + left
+                xs = reference[start:start + block]
+                ys = candidate[start:start + block]
+                sum_x += sum(xs)
+                sum_y += sum(ys)
+                sum_xx += sum(x * x for x in xs)
+                sum_yy += sum(y * y for y in ys)
+                sum_xy += sum(x * y for x, y in zip(xs, ys))
+            mean_x = sum_x / pixels
+            mean_y = sum_y / pixels
+            var_x = sum_xx / pixels - mean_x * mean_x
+            var_y = sum_yy / pixels - mean_y * mean_y
+            covariance = sum_xy / pixels - mean_x * mean_y
+            total += ((2 * mean_x * mean_y + _SSIM_C1) * (2 * covariance + _SSIM_C2)) / (
+                (mean_x * mean_x + mean_y * mean_y + _SSIM_C1) * (var_x + var_y + _SSIM_C2)
+            )
+            count += 1
+    return total / count if count else 1.0
+
+def encode_jpeg(image, quality: int, optimize: bool = True) -> bytes:
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality, optimize=optimize)
+    return output.getvalue()
+
+def encode_adaptive(image, target_bytes: int, ssim_floor: float = 0.0, min_quality: int = 40,
+                    max_quality: int = 85, max_iterations: int = 6, time_budget: float = 0.4) -> dict:
+    """
+    为RGB图像选择JPEG质量并编码
+    返回 {"content", "quality", "iterations", "ssim"（计算过时）}
+    """
+    started = time.monotonic()
+    encoded = {}
+    slowest = 0.0
+
+    def budget_left(extra: float = 0.0) -> bool:
+        return len(encoded) < max_iterations and time.monotonic() - started + slowest + extra <= time_budget
+
+    def encode(quality: int) -> bytes:
+        nonlocal slowest
+        if quality not in encoded:
+            encode_started = time.monotonic()
+            encoded[quality] = encode_jpeg(image, quality)
+            slowest = max(slowest, time.monotonic() - encode_started)
+        return encoded[quality]
+
+    # 1. 最高质量已在预算内时直接使用（简单背景的图片通常如此）
+    if len(encode(max_quality)) <= target_bytes:
+        return {"content": encoded[max_quality], "quality": max_quality, "iterations": 1, "ssim": None}
+
+    # 2. 二分搜索不超过目标大小的最高质量，接近目标（5%以内）时提前结束
+    low, high = min_quality, max_quality - 1
+    best: Optional[int] = None
+    while low <= high and budget_left():
+        middle = (low + high) // 2
+        size = len(encode(middle))
+        if size <= target_bytes:
+            best = middle
+            if size >= target_bytes * 0.95:
+                break
+            low = middle + 1
+        else:
+            high = middle - 1
+    if best is None:
+        # 最低质量也超出预算（或预算耗尽）：使用已编码结果中最小的
+        best = min(encoded, key=lambda quality: len(encoded[quality]))
+
+    # 3. 画质下限：SSIM不足时提高质量，取满足下限的最低质量；剩余时间不够一次评估时跳过
+    score = None
+    ssim_cost = _ssim_seconds
+    if ssim_floor > 0 and time.monotonic() - started + 2 * ssim_cost <= time_budget:
+        reference, width, height = _probe(image)
+
+        def similarity(quality: int) -> float:
+            global _ssim_seconds
+            nonlocal ssim_cost
+            ssim_started = time.monotonic()
+            value = ssim(reference, _decode_probe(encoded[quality]), width, height)
+            elapsed = time.monotonic() - ssim_started
+            ssim_cost = max(ssim_cost, elapsed)
+            _ssim_seconds = _ssim_seconds * 0.7 + elapsed * 0.3
+            return value
+
+        score = similarity(best)
+        if score < ssim_floor:
+            low, high = best + 1, max_quality
+            raised = max_quality
+            # 每轮先编码再评估，两者的耗时都要在预算内
+            while low <= high and budget_left(ssim_cost):
+                middle = (low + high) // 2
+                encode(middle)
+                middle_score = similarity(middle)
+                if middle_score >= ssim_floor:
+                    raised, score = middle, middle_score
+                    high = middle - 1
+                else:
+                    low = middle + 1
+            if raised == max_quality:
+                score = None
+            best = raised
+
+    return {"content": encoded[best], "quality": best, "iterations": len(encoded), "ssim": score}
\ No newline at end of file
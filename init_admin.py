@@ -9,13 +9,14 @@ from database import engine, SessionLocal
 import models
 import crud
 import schemas
+from migrate import upgrade_schema
 
 def init_database():
     """初始化数据库，创建表和默认管理员用户"""
     
-    # 创建所有表
-    models.Base.metadata.create_all(bind=engine)
-    print("✓ 数据库表创建完成")
+    # 创建缺失的表、字段和索引
+    upgrade_schema(engine)
+    print("✓ 数据库表结构已就绪")
     
     # 创建数据库会话
     db = SessionLocal()
@@ -41,6 +42,10 @@ def init_database():
             print(f"  密码: {admin_password}")
             print("  请在生产环境中修改默认密码！")
             
+        # 初始化默认区域
+        if crud.init_default_regions(db):
+            print("✓ 默认区域初始化完成")
+            
     except Exception as e:
         print(f"✗ 创建管理员用户失败: {e}")
         db.rollback()
@@ -0,0 +1,257 @@
+"""
+请求路径的结构化日志
+- 日志记录在调用线程中只做截断/脱敏后放入内存队列，由后台线程格式化（含异常堆栈）并写出，不阻塞事件循环
+- 自动截断过长的字段，把BASE64图片数据替换为长度说明，隐藏密码、令牌等敏感字段
+- INFO及以下级别的日志可以按比例采样；支持文本或JSON输出
+- 统计每个请求产生的日志条数和字节数（/api/admin/log-stats）
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+# LogRecord的标准属性，其余属性视为通过extra传入的结构化字段
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+# 结构化字段中需要隐藏的键
+SENSITIVE_KEYS = {"password", "hashed_password", "token", "access_token", "authorization", "secret_key"}
+
+_DATA_URL = re.compile(r"data:([\w/+.-]+);base64,[A-Za-z0-9+/=]+")
+_BASE64_RUN = re.compile(r"[A-Za-z0-9+/]{256,}={0,2}")
+
+# 当前请求的日志量 [条数, 字节数]，由请求中间件设置
+_request_volume: contextvars.ContextVar = contextvars.ContextVar("request_log_volume", default=None)
+
+def redact(value: str, max_length: int) -> str:
+    """把BASE64数据替换为长度说明，并截断到max_length个字符"""
+    if len(value) > 256:
+        value = _DATA_URL.sub(lambda m: f"data:{m.group(1)};base64,<已省略{len(m.group(0))}字符>", value)
+        value = _BASE64_RUN.sub(lambda m: f"<BASE64 {len(m.group(0))}字符>", value)
+    if len(value) > max_length:
+        value = f"{value[:max_length]}…<已截断，共{len(value)}字符>"
+    return value
+
+def _redact_field(key: str, value, max_length: int):
+    if key.lower() in SENSITIVE_KEYS:
+        return "***"
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)}字节>"
+    if isinstance(value, (bool, int, float)) or value is None:
+        return value
+    return redact(str(value), max_length)
+
+class LogStats:
+    """日志量统计（进程内）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.records = 0
+            self.bytes = 0
+            self.sampled_out = 0
+            self.dropped = 0
+            self.truncated = 0
+            self.requests = 0
+            self.request_bytes = 0
+            self.max_request_bytes = 0
+            self.routes = {}
+
+    def add(self, size: int, truncated: bool):
+        with self._lock:
+            self.records += 1
+            self.bytes += size
+            self.truncated += truncated
+
+    def add_request(self, route: str, records: int, size: int):
+        with self._lock:
+            self.requests += 1
+            self.request_bytes += size
+            self.max_request_bytes = max(self.max_request_bytes, size)
+            route_stats = self.routes.setdefault(route, [0, 0, 0])
+            route_stats[0] += 1
+            route_stats[1] += records
+            route_stats[2] += size
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            routes = sorted(self.routes.items(), key=lambda item: item[1][2], reverse=True)
+            return {
+                "records": self.records,
+                "bytes": self.bytes,
+                "sampled_out": self.sampled_out,
+                "dropped": self.dropped,
+                "truncated": self.truncated,
+                "requests": self.requests,
+                "avg_request_bytes": round(self.request_bytes / self.requests, 1) if self.requests else 0,
+                "max_request_bytes": self.max_request_bytes,
+                "routes": [
+                    {"route": route, "requests": count, "records": records, "bytes": size,
+                     "avg_bytes": round(size / count, 1)}
+                    for route, (count, records, size) in routes[:20]
+                ]
+            }
+
+log_stats = LogStats()
+
+class RequestLogVolume:
+    """
+    统计一个请求的日志量
+        with RequestLogVolume() as volume:
+            ...
+        volume.records, volume.bytes
+    """
+
+    def __init__(self):
+        self.counter = [0, 0]
+        self._token = None
+
+    def __enter__(self):
+        self._token = _request_volume.set(self.counter)
+        return self
+
+    def __exit__(self, *exc_info):
+        _request_volume.reset(self._token)
+
+    @property
+    def records(self) -> int:
+        return self.counter[0]
+
+    @property
+    def bytes(self) -> int:
+        return self.counter[1]
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    在调用线程中完成采样、截断、脱敏后放入有界队列；队列满时丢弃并计数，不阻塞调用方
+    异常堆栈保留exc_info，由后台线程格式化
+    """
+
+    def __init__(self, log_queue: queue.Queue, max_length: int, info_sample_rate: float):
+        super().__init__(log_queue)
+        self.max_length = max_length
+        self.info_sample_rate = info_sample_rate
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        message = record.getMessage()
+        redacted = redact(message, self.max_length)
+        record.msg, record.args = redacted, None
+
+        for key in set(vars(record)) - _RECORD_ATTRIBUTES:
+            setattr(record, key, _redact_field(key, getattr(record, key), self.max_length))
+
+        # 在调用线程中记录链路ID（contextvars在后台线程不可见）
+        import tracing
+        span = tracing.current_span()
+        record.trace_id = span.trace_id if span else None
+
+        size = len(redacted.encode("utf-8"))
+        log_stats.add(size, redacted is not message and len(redacted) < len(message))
+        volume = _request_volume.get()
+        if volume is not None:
+            volume[0] += 1
+            volume[1] += size
+        return record
+
+    def emit(self, record: logging.LogRecord):
+        if record.levelno <= logging.INFO and self.info_sample_rate < 1 and random.random() >= self.info_sample_rate:
+            log_stats.incr("sampled_out")
+            return
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            log_stats.incr("dropped")
+        except Exception:
+            self.handleError(record)
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行JSON，extra传入的字段作为顶层键"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key in set(vars(record)) - _RECORD_ATTRIBUTES:
+            value = getattr(record, key)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_fork_hook_registered = False
+
+def setup_logging(level: str = None, log_format: str = None):
+    """
+    配置根日志器：队列处理器 + 后台写出线程（重复调用无副作用）
+    fork出的子进程（如gunicorn --preload的worker）会自动重建自己的队列和写出线程
+    """
+    global _listener
+    if _listener is not None:
+        return
+    from config import settings
+
+    output = logging.StreamHandler(sys.stderr)
+    if (log_format or settings.LOG_FORMAT) == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(BoundedQueueHandler(log_queue, settings.LOG_MAX_FIELD_LENGTH, settings.LOG_INFO_SAMPLE_RATE))
+    root.setLevel((level or settings.LOG_LEVEL).upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    global _fork_hook_registered
+    if not _fork_hook_registered and hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_restart_after_fork)
+        _fork_hook_registered = True
+
+def _restart_after_fork():
+    """
+    子进程只继承了fork时的调用线程，父进程的写出线程不存在，队列中的日志永远不会写出；
+    换用新的队列（原队列的锁可能在fork时被其他线程持有）并启动本进程的写出线程
+    """
+    global _listener
+    log_stats._lock = threading.Lock()
+    if _listener is None:
+        return
+    log_queue = queue.Queue(maxsize=_listener.queue.maxsize)
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, BoundedQueueHandler):
+            handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers)
+    _listener.start()
+
+def shutdown_logging():
+    """写出队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
\ No newline at end of file
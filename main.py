@@ -1,30 +1,128 @@
-from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Form
+from warmup import warmup_state, start_warmup
+from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Form, Request
+from fastapi.responses import JSONResponse, ORJSONResponse, RedirectResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 import uvicorn
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from database import get_db, engine
-import models
+from database import get_db, get_read_db, read_session, replica_router, prefers_primary, PRIMARY_STICKY_COOKIE
 import schemas
 import crud
+import image_jobs
+import tracing
+import concurrency
+from concurrency import upload_budget, image_budget, read_budget
+from ratelimit import rate_limiter
+from compression import response_compressor
+import page_cache
+from page_cache import car_list_cache, site_config_cache, thumbnail_cache
+from starlette.concurrency import run_in_threadpool
+from logging_setup import setup_logging, log_stats, RequestLogVolume
 from config import settings
-from storage_service import storage_service
-import traceback
+from storage_service import storage_service, to_data_url
+from typing import List
 import logging
+import hashlib
+import json
+import time
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
+# 配置日志：后台线程写出，自动截断和脱敏大字段
+setup_logging()
 logger = logging.getLogger(__name__)
 
-# 创建数据库表
-models.Base.metadata.create_all(bind=engine)
+# 数据库表结构由 migrate.py 显式创建和升级，应用导入时不访问数据库
 
-app = FastAPI(title="车辆图片管理系统", version="1.0.0")
+# 默认使用orjson序列化；车辆相关接口直接返回ORJSONResponse，跳过jsonable_encoder对大段BASE64字符串的遍历
+app = FastAPI(title="车辆图片管理系统", version="1.0.0", default_response_class=ORJSONResponse)
 
-# CORS配置
+@app.on_event("startup")
+def warm_up():
+    """启动后在后台预热连接池、Pillow、bcrypt和内存索引"""
+    start_warmup()
+    replica_router.start_health_checks()
+
+@app.middleware("http")
+async def read_your_writes(request, call_next):
+    """写操作成功后设置粘滞Cookie，短时间内该客户端的读请求走主库，避免读到副本上的旧数据"""
+    response = await call_next(request)
+    if (replica_router.engines
+            and request.method not in ("GET", "HEAD", "OPTIONS")
+            and response.status_code < 400):
+        secure = request.url.scheme == "https" or request.headers.get("x-forwarded-proto") == "https"
+        response.set_cookie(
+            PRIMARY_STICKY_COOKIE,
+            str(int(time.time()) + settings.DB_REPLICA_STICKY_SECONDS),
+            max_age=settings.DB_REPLICA_STICKY_SECONDS,
+            httponly=True,
+            secure=secure,
+            samesite="none" if secure else "lax"
+        )
+    return response
+
+@app.middleware("http")
+async def measure_log_volume(request, call_next):
+    """统计每个请求产生的日志条数和字节数，按路由汇总"""
+    with RequestLogVolume() as volume:
+        response = await call_next(request)
+    route = request.scope.get("route")
+    # 未匹配路由的请求合并统计，避免任意路径撑大统计表
+    log_stats.add_request(f"{request.method} {route.path}" if route else "unmatched", volume.records, volume.bytes)
+    span = tracing.current_span()
+    if span is not None:
+        span.set_attribute("log.records", volume.records)
+        span.set_attribute("log.bytes", volume.bytes)
+    return response
+
+@app.middleware("http")
+async def rate_limit(request, call_next):
+    """按客户端令牌桶限流，超出限制返回429；未配置规则的路由直接放行"""
+    result = await rate_limiter.check(request)
+    if result is None:
+        return await call_next(request)
+    
+    headers = {"X-RateLimit-Limit": str(result["limit"]), "X-RateLimit-Remaining": str(result["remaining"])}
+    if not result["allowed"]:
+        headers["Retry-After"] = str(result["retry_after"])
+        return JSONResponse(status_code=429, content={"detail": "请求过于频繁，请稍后重试"}, headers=headers)
+    
+    response = await call_next(request)
+    response.headers.update(headers)
+    return response
+
+@app.middleware("http")
+async def compress_responses(request, call_next):
+    """按Accept-Encoding压缩JSON和文本响应；图片、过小和BASE64为主的响应原样返回；ETag未变化时返回304"""
+    encoding = response_compressor.negotiate(request.headers.get("accept-encoding"))
+    if_none_match = request.headers.get("if-none-match") if request.method in ("GET", "HEAD") else None
+    response = await call_next(request)
+    return await response_compressor.process(response, encoding, if_none_match)
+
+@app.middleware("http")
+async def trace_requests(request, call_next):
+    """为每个请求创建根span（CORS之内最外层的中间件），延续客户端传来的traceparent；未开启追踪时直接放行"""
+    if not tracing.enabled():
+        return await call_next(request)
+    
+    with tracing.span(
+        f"{request.method} {request.url.path}",
+        kind=tracing.KIND_SERVER,
+        root=True,
+        traceparent=request.headers.get("traceparent"),
+        **{"http.method": request.method, "http.target": request.url.path}
+    ) as span:
+        response = await call_next(request)
+        if span is not None:
+            # 路由匹配后使用路径模板命名，便于按接口聚合
+            route = request.scope.get("route")
+            if route is not None:
+                span.name = f"{request.method} {route.path}"
+                span.set_attribute("http.route", route.path)
+            span.set_attribute("http.status_code", response.status_code)
+            response.headers["traceparent"] = span.traceparent
+        return response
+
+# CORS配置：最后注册，位于所有中间件的最外层，限流返回的429等响应也带有CORS头
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -43,16 +141,11 @@ SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
 def create_access_token(data: dict, expires_delta: timedelta = None):
+    from jose import jwt
+    
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -63,6 +156,8 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return encoded_jwt
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    from jose import JWTError, jwt
+    
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -79,12 +174,42 @@ async def root():
         "storage_type": "base64"
     }
 
+@app.get("/healthz")
+async def liveness():
+    """存活检查：进程能处理请求即返回200"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readiness():
+    """就绪检查：预热完成前返回503，附带各预热步骤的状态和耗时"""
+    state = warmup_state.snapshot()
+    state["replicas"] = replica_router.status()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus指标：各并发预算的上限、执行中/排队数和拒绝次数，限流放行/拒绝次数，图片原样保存命中率，响应压缩率，列表页缓存命中率"""
+    lines = (concurrency.metric_lines() + rate_limiter.metric_lines() + storage_service.metric_lines()
+             + response_compressor.metric_lines() + page_cache.metric_lines())
+    return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/api/admin/log-stats")
+async def get_log_stats(current_user: str = Depends(verify_token)):
+    """日志量统计：总条数/字节数、采样丢弃和队列丢弃数、每个请求的平均和最大日志字节数（管理员权限）"""
+    return log_stats.snapshot()
+
 @app.get("/api/config")
 async def get_config():
-    return {
-        "regions": ["福田", "罗湖", "南山", "龙华", "龙岗", "宝安", "沙井", "广州"],
-        "storage_type": "base64"
-    }
+    """站点配置（区域列表），缓存在共享缓存中，修改区域后立即失效"""
+    def load():
+        # 在主库读取：刚修改区域后从延迟的副本加载会把旧列表缓存整个有效期
+        with read_session(primary=True) as db:
+            return {
+                "regions": crud.get_regions(db)["regions"],
+                "storage_type": "base64"
+            }
+    
+    return await site_config_cache.get("config", load)
 
 # 首页密码验证相关API
 @app.post("/api/homepage/verify")
@@ -157,131 +282,329 @@ async def create_admin_user(user: schemas.UserCreate, db: Session = Depends(get_
     return {"message": f"用户 '{new_user.username}' 创建成功", "user_id": new_user.id}
 
 @app.get("/api/regions")
-async def get_regions():
-    """获取所有区域"""
-    regions = ["福田", "罗湖", "南山", "龙华", "龙岗", "宝安", "沙井", "广州"]
-    return {"regions": regions}
+def get_regions(with_counts: bool = False, db: Session = Depends(get_db)):
+    """获取所有区域；with_counts=1时附带各区域车辆数"""
+    return crud.get_regions(db, with_counts=with_counts)
+
+@app.post("/api/admin/regions")
+def create_region(region: schemas.RegionCreate, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """创建区域（需要管理员权限）"""
+    db_region = crud.create_region(db, region)
+    return {"message": f"区域 '{db_region.name}' 创建成功", "car_count": db_region.car_count}
 
-@app.get("/api/cars")
-async def get_cars(region: str = None, page: int = 1, limit: int = 20, db: Session = Depends(get_db)):
-    """获取车辆列表（支持分页）"""
-    return crud.get_cars(db, region=region, page=page, limit=limit)
+@app.delete("/api/admin/regions/{name}")
+def delete_region(name: str, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """删除区域（需要管理员权限）"""
+    return crud.delete_region(db, name)
+
+@app.get("/api/cars", dependencies=[Depends(read_budget)])
+async def get_cars(request: Request, region: str = None, page: int = 1, limit: int = 20, q: str = None,
+                   cursor: str = None, fields: str = None):
+    """
+    获取车辆列表（支持分页）；提供q时按描述和联系方式全文检索，使用cursor分页
+    fields为逗号分隔的字段名（如 fields=id,region,created_at），只查询和返回这些字段
+    渲染好的响应体在微缓存中保存几秒，车辆写操作后立即失效；命中缓存时不取数据库连接
+    """
+    def load(primary: bool = False):
+        # 合并的请求共用这次加载，使用自己的会话（发起请求结束后其会话会被关闭）
+        with read_session(primary=primary) as db:
+            if q:
+                content = crud.search_cars(db, q, region=region, cursor=cursor, limit=limit, fields=fields)
+            else:
+                content = crud.get_cars(db, region=region, page=page, limit=limit, fields=fields)
+        body = ORJSONResponse(content).body
+        return body, f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    
+    if replica_router.engines and prefers_primary(request):
+        # 读己之写窗口内直接查询主库，不读取（可能来自副本的）缓存
+        body, etag = await run_in_threadpool(load, True)
+    else:
+        body, etag = await car_list_cache.get((region, page, limit, q, cursor, fields), load)
+    # ETag使压缩中间件可以复用同一页的压缩结果
+    return Response(body, media_type="application/json", headers={"ETag": etag})
 
-@app.post("/api/cars")
+@app.post("/api/cars", dependencies=[Depends(upload_budget)])
 async def create_car(
     region: str = Form(...),
     contact: str = Form(None),
     description: str = Form(None),
     image: UploadFile = File(...),
+    fields: str = None,
     db: Session = Depends(get_db)
 ):
-    """创建新车辆记录"""
+    """创建新车辆记录（默认不回传图片，需要时通过 ?fields=id,image_base64 指定）"""
     try:
         logger.info(f"创建车辆请求: region={region}, contact={contact}, description={description}")
-        result = await crud.create_car(db, region, contact, description, image)
-        logger.info(f"车辆创建成功: {result}")
-        return result
+        result = await crud.create_car(db, region, contact, description, image, fields=fields)
+        logger.info(f"车辆创建成功: id={result['id']}, status={result.get('status', 'ready')}")
+        # 异步处理模式下图片尚未生成，返回202，前端通过status_url轮询处理进度
+        return ORJSONResponse(result, status_code=202 if result.get("status") == "processing" else 200)
+    except HTTPException:
+        # 图片校验失败等客户端错误原样返回
+        raise
     except Exception as e:
-        logger.error(f"创建车辆失败: {str(e)}")
-        logger.error(f"错误详情: {traceback.format_exc()}")
+        # 异常堆栈由日志后台线程格式化
+        logger.exception(f"创建车辆失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"创建车辆失败: {str(e)}")
 
-@app.get("/api/cars/{car_id}/details")
-async def get_car_details(car_id: int, db: Session = Depends(get_db)):
-    """获取车辆详情"""
-    return crud.get_car_details(db, car_id)
+@app.post("/api/cars/uploads")
+async def create_direct_upload(upload: schemas.DirectUploadCreate):
+    """
+    申请客户端直传（对象存储模式）
+    返回预签名POST表单，客户端把图片直接上传到对象存储后调用 /api/cars/uploads/{upload_id}/complete
+    """
+    from object_storage import get_object_storage
+    from storage_service import MAX_UPLOAD_SIZE
+    
+    if settings.IMAGE_STORAGE_MODE != "object":
+        raise HTTPException(status_code=400, detail="未启用对象存储")
+    if not upload.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="只允许上传图片文件")
+    
+    return get_object_storage().presigned_upload(upload.content_type, MAX_UPLOAD_SIZE)
+
+@app.post("/api/cars/uploads/{upload_id}/complete", dependencies=[Depends(upload_budget)])
+async def complete_direct_upload(upload_id: str, car: schemas.CarCreate, fields: str = None, db: Session = Depends(get_db)):
+    """直传完成回调：处理已上传的图片并创建车辆记录"""
+    result = await crud.create_car_from_upload(db, upload_id, car.region, car.contact, car.description, fields=fields)
+    return ORJSONResponse(result, status_code=202 if result.get("status") == "processing" else 200)
+
+@app.get("/api/cars/{car_id}/status")
+async def get_car_status(car_id: int, db: Session = Depends(get_read_db)):
+    """查询车辆图片处理状态（processing / ready / failed）"""
+    return image_jobs.job_status(db, car_id)
+
+@app.post("/api/cars/bulk", dependencies=[Depends(upload_budget)])
+async def create_cars_bulk(
+    images: List[UploadFile] = File(...),
+    items: str = Form(None),
+    region: str = Form(None),
+    db: Session = Depends(get_db),
+    current_user: str = Depends(verify_token)
+):
+    """
+    批量创建车辆记录（需要管理员权限）
+    items 为JSON数组，与images按顺序一一对应: [{"region": "...", "contact": "...", "description": "..."}]
+    未提供items时所有图片使用同一个region
+    """
+    if len(images) > settings.BULK_UPLOAD_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"单次最多上传{settings.BULK_UPLOAD_MAX_ITEMS}张图片")
+    
+    if items:
+        try:
+            metadata = json.loads(items)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="items必须是JSON数组")
+        if not isinstance(metadata, list) or len(metadata) != len(images):
+            raise HTTPException(status_code=400, detail="items数量必须与图片数量一致")
+    elif region:
+        metadata = [{"region": region} for _ in images]
+    else:
+        raise HTTPException(status_code=400, detail="必须提供items或region")
+    
+    entries = []
+    for meta, image in zip(metadata, images):
+        if not isinstance(meta, dict) or not (meta.get("region") or region):
+            raise HTTPException(status_code=400, detail="每张图片都必须指定region")
+        entries.append({
+            "region": meta.get("region") or region,
+            "contact": meta.get("contact"),
+            "description": meta.get("description"),
+            "image": image
+        })
+    
+    logger.info(f"批量创建车辆请求: {len(entries)} 张图片")
+    return ORJSONResponse(await crud.create_cars_bulk(db, entries))
+
+@app.get("/api/cars/{car_id}/details", dependencies=[Depends(image_budget)])
+async def get_car_details(car_id: int, fields: str = None, db: Session = Depends(get_read_db)):
+    """获取车辆详情（fields指定返回的字段，不含image_base64时不读取原图）"""
+    return ORJSONResponse(crud.get_car_details(db, car_id, fields=fields))
 
 @app.delete("/api/cars/{car_id}")
 async def delete_car(car_id: int, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
     """删除车辆（需要管理员权限）"""
     return await crud.delete_car(db, car_id)
 
-@app.put("/api/cars/{car_id}")
+@app.put("/api/cars/{car_id}", dependencies=[Depends(upload_budget)])
 async def update_car(
     car_id: int,
     region: str = Form(None),
     contact: str = Form(None),
     description: str = Form(None),
     image: UploadFile = File(None),
+    fields: str = None,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(verify_token)
+):
+    """更新车辆信息（需要管理员权限，默认不回传图片）"""
+    return ORJSONResponse(await crud.update_car(db, car_id, region, contact, description, image, fields=fields))
+
+# 批量操作分块执行多个事务，耗时较长，使用同步路由在线程池中执行，不阻塞事件循环
+@app.post("/api/admin/cars/batch-delete")
+def batch_delete_cars(batch: schemas.CarBatchFilter, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """按ID列表或条件批量删除车辆（需要管理员权限）"""
+    return crud.batch_delete_cars(db, batch)
+
+@app.post("/api/admin/cars/batch-move")
+def batch_move_cars(batch: schemas.CarBatchMove, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """批量修改车辆区域（需要管理员权限）"""
+    return crud.batch_update_cars(db, batch, {"region": batch.target_region})
+
+@app.post("/api/admin/cars/batch-update")
+def batch_update_cars(batch: schemas.CarBatchUpdate, db: Session = Depends(get_db), current_user: str = Depends(verify_token)):
+    """批量修改车辆联系方式、描述（需要管理员权限）"""
+    values = {}
+    if batch.contact is not None:
+        values["contact"] = batch.contact
+    if batch.description is not None:
+        values["description"] = batch.description
+    return crud.batch_update_cars(db, batch, values)
+
+@app.get("/api/admin/cars/{car_id}/similar", dependencies=[Depends(read_budget)])
+async def get_similar_cars(
+    car_id: int,
+    max_distance: int = 10,
+    limit: int = 20,
     db: Session = Depends(get_db),
     current_user: str = Depends(verify_token)
 ):
-    """更新车辆信息（需要管理员权限）"""
-    return await crud.update_car(db, car_id, region, contact, description, image)
+    """查找图片近似重复的车辆（需要管理员权限）"""
+    max_distance = max(0, min(max_distance, 32))
+    return crud.find_similar_cars(db, car_id, max_distance=max_distance, limit=limit)
 
-@app.get("/api/cars/{car_id}/image")
-async def get_car_image(car_id: int, db: Session = Depends(get_db)):
+@app.get("/api/cars/{car_id}/image", dependencies=[Depends(image_budget)])
+async def get_car_image(car_id: int, db: Session = Depends(get_read_db)):
     """获取车辆图片的BASE64数据"""
     car = crud.get_car_by_id(db, car_id)
     if not car:
         raise HTTPException(status_code=404, detail="车辆不存在")
     
-    return {
+    return ORJSONResponse({
         "car_id": car_id,
-        "image_base64": car.image_base64,
+        "image_base64": crud.car_image_url(car),
         "message": "图片数据获取成功"
-    }
+    })
 
-@app.get("/api/cars/{car_id}/thumbnail")
-async def get_car_thumbnail(car_id: int, db: Session = Depends(get_db)):
-    """获取车辆缩略图的BASE64数据"""
+@app.get("/api/cars/{car_id}/image/raw", dependencies=[Depends(image_budget)])
+async def get_car_image_raw(car_id: int, db: Session = Depends(get_read_db)):
+    """获取车辆原图（二进制，不经过BASE64编码）"""
     car = crud.get_car_by_id(db, car_id)
     if not car:
         raise HTTPException(status_code=404, detail="车辆不存在")
     
-    # 如果没有缩略图，尝试生成一个
-    if not car.thumbnail_base64 and car.image_base64:
-        try:
-            # 从原始图片生成缩略图
-            import base64
-            from storage_service import storage_service
-            
-            # 提取原始图片数据
-            if ';base64,' in car.image_base64:
-                image_data = base64.b64decode(car.image_base64.split(';base64,')[1])
-                mime_type = car.image_base64.split(';')[0].replace('data:', '')
-                
-                # 生成缩略图
-                thumbnail_data = await storage_service.create_thumbnail(image_data, mime_type)
-                
-                if thumbnail_data:
-                    # 更新数据库
-                    car.thumbnail_base64 = thumbnail_data
-                    db.commit()
-                    
-                    return {
-                        "car_id": car_id,
-                        "thumbnail_base64": thumbnail_data,
-                        "message": "缩略图生成成功"
-                    }
-        except Exception as e:
-            print(f"生成缩略图失败: {e}")
+    # 对象存储的图片重定向到签名URL，由对象存储直接返回图片
+    if car.image_key:
+        return _object_redirect(car.image_key)
     
-    return {
+    content = crud.car_image_content(car)
+    if not content:
+        raise HTTPException(status_code=404, detail="图片数据不存在")
+    
+    headers = {"ETag": f'"{car.image_hash}"'} if car.image_hash else None
+    return Response(content, media_type=car.image_mime or "image/jpeg", headers=headers)
+
+def _object_redirect(key: str) -> RedirectResponse:
+    """重定向到对象存储URL，重定向本身在签名URL复用期内可被浏览器缓存"""
+    from object_storage import get_object_storage
+    
+    url, max_age = get_object_storage().url(key)
+    return RedirectResponse(url, status_code=302, headers={"Cache-Control": f"private, max-age={max_age}"})
+
+def _has_thumbnail(car) -> bool:
+    return bool(car.thumbnail_key) or car.thumbnail_data is not None or bool(car.thumbnail_base64)
+
+@app.get("/api/cars/{car_id}/thumbnail", dependencies=[Depends(read_budget)])
+async def get_car_thumbnail(car_id: int, db: Session = Depends(get_read_db), primary_db: Session = Depends(get_db)):
+    """获取车辆缩略图的BASE64数据（读取走副本，补生成的缩略图写回主库）"""
+    car = crud.get_car_by_id(db, car_id)
+    if not car:
+        raise HTTPException(status_code=404, detail="车辆不存在")
+    
+    # 如果没有缩略图，尝试从原始图片生成一个（写入主库）
+    if not _has_thumbnail(car):
+        thumbnail_content = await run_in_threadpool(crud.generate_car_thumbnail, primary_db, car)
+        if thumbnail_content:
+            return ORJSONResponse({
+                "car_id": car_id,
+                "thumbnail_base64": to_data_url(thumbnail_content),
+                "message": "缩略图生成成功"
+            })
+    
+    return ORJSONResponse({
         "car_id": car_id,
-        "thumbnail_base64": car.thumbnail_base64,
+        "thumbnail_base64": crud.car_thumbnail_url(car),
         "message": "缩略图数据获取成功"
-    }
+    })
+
+@app.get("/api/cars/{car_id}/thumbnail/raw", dependencies=[Depends(read_budget)])
+async def get_car_thumbnail_raw(car_id: int, db: Session = Depends(get_read_db), primary_db: Session = Depends(get_db)):
+    """
+    获取车辆缩略图（二进制JPEG，不经过BASE64编码）；缩略图字节缓存在共享缓存中，命中时不访问数据库
+    缓存、数据库和缩略图生成都在线程池中执行，不阻塞事件循环
+    """
+    version, content = await thumbnail_cache.alookup(str(car_id))
+    if content is not None:
+        return Response(content, media_type="image/jpeg")
+    
+    def load():
+        """返回 (对象存储键, 缩略图字节)"""
+        car = crud.get_car_by_id(db, car_id)
+        if not car:
+            raise HTTPException(status_code=404, detail="车辆不存在")
+        if car.thumbnail_key:
+            return car.thumbnail_key, None
+        if _has_thumbnail(car):
+            return None, crud.car_thumbnail_content(car)
+        return None, crud.generate_car_thumbnail(primary_db, car)
+    
+    key, content = await run_in_threadpool(load)
+    if key:
+        return _object_redirect(key)
+    if not content:
+        raise HTTPException(status_code=404, detail="缩略图不存在")
+    
+    await thumbnail_cache.aset(str(car_id), content, version=version)
+    return Response(content, media_type="image/jpeg")
 
 @app.post("/api/validate-image")
-async def validate_image(image: UploadFile = File(...)):
-    """验证上传的图片是否有效"""
-    try:
-        upload_result = await storage_service.upload_file(image)
-        image_info = storage_service.get_image_info(upload_result["base64_data"])
-        
+async def validate_image(image: UploadFile = File(...), mode: str = "header"):
+    """
+    验证上传的图片是否有效
+    mode=header（默认）只解析文件头，返回格式、尺寸和预估压缩后大小；
+    mode=full 走完整的压缩处理流程，返回实际压缩后大小（与上传共用并发预算）
+    """
+    if mode not in ("header", "full"):
+        raise HTTPException(status_code=400, detail="mode 只能是 header 或 full")
+    
+    if mode == "full":
+        # 排队已满/超时的503直接返回，不当作图片无效；与上传一样在图片处理线程池中压缩，不保存
+        async with upload_budget:
+            try:
+                content = await storage_service.read_upload(image)
+                upload_result = await storage_service.process_image_in_pool(content, strict=True)
+            except HTTPException as e:
+                return {"is_valid": False, "error": str(e.detail), "message": "图片验证失败"}
         return {
             "is_valid": True,
-            "mime_type": image_info["mime_type"],
-            "size": image_info["size"],
+            "mode": "full",
+            "mime_type": upload_result["mime_type"],
+            "size": upload_result["size"],
+            "width": upload_result["width"],
+            "height": upload_result["height"],
             "message": "图片验证成功"
         }
+    
+    try:
+        image_info = await storage_service.inspect_upload(image)
     except HTTPException as e:
-        return {
-            "is_valid": False,
-            "error": str(e.detail),
-            "message": "图片验证失败"
-        }
+        return {"is_valid": False, "error": str(e.detail), "message": "图片验证失败"}
+    return {
+        "is_valid": True,
+        "mode": "header",
+        **image_info,
+        "message": "图片验证成功"
+    }
 
 if __name__ == "__main__":
     # 获取端口，Railway会提供PORT环境变量
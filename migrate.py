@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+数据库结构检查与升级
+应用导入时不再自动建表，部署时显式执行:
+    python migrate.py check     # 只检查，缺少表/字段/索引或字段可空性不一致时返回非0
+    python migrate.py upgrade   # 创建缺失的表、字段和索引，放宽模型中已改为可空的字段，并初始化默认数据
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn, CreateIndex
+import logging
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _is_fulltext(index) -> bool:
+    return index.dialect_options["mysql"].get("prefix") == "FULLTEXT"
+
+def check_schema(engine) -> list:
+    """
+    对比模型与数据库实际结构，返回问题列表: [(类型, 表名, 名称)]
+    类型为 table / column / index / nullable（模型中可空、数据库中仍为NOT NULL的字段，
+    如二进制和对象存储模式不再写入的image_base64）
+    """
+    import models
+
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    problems = []
+
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            problems.append(("table", table.name, table.name))
+            continue
+
+        existing_columns = {column["name"]: column for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                problems.append(("column", table.name, column.name))
+            elif column.nullable and not column.primary_key and not existing_columns[column.name]["nullable"]:
+                problems.append(("nullable", table.name, column.name))
+
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if _is_fulltext(index) and engine.dialect.name != "mysql":
+                continue
+            if index.name not in existing_indexes:
+                problems.append(("index", table.name, index.name))
+
+    return problems
+
+def _rebuild_sqlite_table(conn, table):
+    """SQLite不支持修改字段约束：按模型新建表并复制数据（同时补齐缺失的字段和索引）"""
+    inspector = inspect(conn)
+    existing_columns = [column["name"] for column in inspector.get_columns(table.name)]
+    for index in inspector.get_indexes(table.name):
+        if index["name"]:
+            conn.exec_driver_sql(f'DROP INDEX "{index["name"]}"')
+    old_name = f"_old_{table.name}"
+    conn.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "{old_name}"')
+    table.create(bind=conn)
+    columns = ", ".join(f'"{column.name}"' for column in table.columns if column.name in existing_columns)
+    conn.exec_driver_sql(f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM "{old_name}"')
+    conn.exec_driver_sql(f'DROP TABLE "{old_name}"')
+
+def relax_not_null(engine, problems):
+    """
+    把模型中已改为可空的字段改为NULL（只放宽约束，不会把可空字段改为NOT NULL）
+    MySQL使用 MODIFY COLUMN ... NULL（InnoDB在线修改）；SQLite不支持修改约束，重建表
+    """
+    import models
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            for table_name in sorted({table_name for _, table_name, _ in problems}):
+                _rebuild_sqlite_table(conn, models.Base.metadata.tables[table_name])
+                logger.info(f"✓ 重建数据表: {table_name}")
+            return
+
+        for _, table_name, name in problems:
+            column = models.Base.metadata.tables[table_name].columns[name]
+            column_type = column.type.compile(dialect=engine.dialect)
+            if engine.dialect.name in ("mysql", "mariadb"):
+                # 在线修改，不阻塞读写（与migration_to_binary_storage.py一致）
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {table_name} MODIFY COLUMN {name} {column_type} NULL, ALGORITHM=INPLACE, LOCK=NONE"
+                )
+            else:
+                conn.exec_driver_sql(f"ALTER TABLE {table_name} ALTER COLUMN {name} DROP NOT NULL")
+            logger.info(f"✓ 字段改为可空: {table_name}.{name}")
+
+def upgrade_schema(engine):
+    """
+    创建缺失的表、字段和索引，放宽模型中已改为可空的字段
+    （只做增量添加和放宽约束，不删除已有结构）
+    """
+    import models
+
+    problems = check_schema(engine)
+    relaxed = [problem for problem in problems if problem[0] == "nullable"]
+    if relaxed:
+        relax_not_null(engine, relaxed)
+        # SQLite重建表时已补齐字段和索引，重新检查剩余的问题
+        remaining = check_schema(engine)
+    else:
+        remaining = problems
+
+    missing_tables = {name for kind, name, _ in remaining if kind == "table"}
+    if missing_tables:
+        models.Base.metadata.create_all(bind=engine)
+        logger.info(f"✓ 创建数据表: {', '.join(sorted(missing_tables))}")
+
+    with engine.begin() as conn:
+        for kind, table_name, name in remaining:
+            if table_name in missing_tables:
+                continue
+            table = models.Base.metadata.tables[table_name]
+
+            if kind == "column":
+                # 新增字段均为可空或带默认值，历史数据由对应的回填脚本补全
+                column_ddl = CreateColumn(table.columns[name]).compile(dialect=engine.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {column_ddl}")
+                logger.info(f"✓ 添加字段: {table_name}.{name}")
+
+            elif kind == "index":
+                index = next(index for index in table.indexes if index.name == name)
+                conn.execute(CreateIndex(index))
+                logger.info(f"✓ 添加索引: {table_name}.{name}")
+
+    return problems
+
+def init_default_data():
+    """初始化默认数据（区域等）"""
+    from database import SessionLocal
+    import crud
+
+    db = SessionLocal()
+    try:
+        if crud.init_default_regions(db):
+            logger.info("✓ 默认区域初始化完成")
+    finally:
+        db.close()
+
+def main():
+    from database import engine
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+
+    if command == "check":
+        problems = check_schema(engine)
+        if not problems:
+            logger.info("✓ 数据库结构与模型一致")
+            return 0
+        for kind, table_name, name in problems:
+            if kind == "table":
+                logger.warning(f"✗ 缺少表: {table_name}")
+            elif kind == "nullable":
+                logger.warning(f"✗ 字段应为可空: {table_name}.{name}")
+            else:
+                logger.warning(f"✗ 缺少{kind}: {table_name}.{name}")
+        logger.warning("请运行: python migrate.py upgrade")
+        return 1
+
+    if command == "upgrade":
+        problems = upgrade_schema(engine)
+        init_default_data()
+        if not problems:
+            logger.info("✓ 数据库结构已是最新")
+        logger.info("注意：新增字段的历史数据需要运行对应的回填脚本（如 migration_add_phash_field.py）")
+        return 0
+
+    logger.error(f"未知命令: {command}（可用: check, upgrade）")
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：添加全文索引
+为cars表的description、contact字段添加FULLTEXT索引（ngram分词，支持中文检索）
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+from config import settings
+import logging
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "ft_cars_description_contact"
+
+def add_fulltext_index():
+    """添加全文索引到cars表"""
+    try:
+        engine = create_engine(settings.database_url)
+
+        with engine.begin() as db:
+            # 检查索引是否已存在
+            result = db.execute(text("""
+                SELECT INDEX_NAME
+                FROM INFORMATION_SCHEMA.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME = 'cars'
+                AND INDEX_NAME = :index_name
+            """), {"index_name": INDEX_NAME})
+
+            if result.fetchone():
+                logger.info(f"✓ {INDEX_NAME}索引已存在，跳过添加")
+                return
+
+            # InnoDB在线构建全文索引，构建期间表仍可读写
+            logger.info(f"正在添加{INDEX_NAME}索引（ngram分词）...")
+            db.execute(text(f"""
+                ALTER TABLE cars
+                ADD FULLTEXT INDEX {INDEX_NAME} (description, contact)
+                WITH PARSER ngram
+            """))
+
+            logger.info(f"✓ {INDEX_NAME}索引添加成功")
+
+    except Exception as e:
+        logger.error(f"添加全文索引失败: {e}")
+        raise
+
+if __name__ == "__main__":
+    logger.info("开始执行数据库迁移：添加全文索引")
+    add_fulltext_index()
+    logger.info("数据库迁移完成")
\ No newline at end of file
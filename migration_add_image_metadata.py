@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：添加图片元数据字段
+为cars表添加图片宽高、字节数、MIME类型和内容哈希字段，并分批为现有记录补全
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from types import SimpleNamespace
+from sqlalchemy import create_engine, inspect, text
+from config import settings
+from storage_service import storage_service
+import crud
+import logging
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+
+METADATA_COLUMNS = [
+    ("image_width", "INT NULL COMMENT '图片宽度'"),
+    ("image_height", "INT NULL COMMENT '图片高度'"),
+    ("image_bytes", "INT NULL COMMENT '压缩后图片字节数'"),
+    ("image_mime", "VARCHAR(50) NULL COMMENT '图片MIME类型'"),
+    ("image_hash", "VARCHAR(64) NULL COMMENT '图片内容SHA-256'"),
+]
+
+def add_metadata_fields(engine):
+    """添加图片元数据字段到cars表"""
+    with engine.begin() as db:
+        for column_name, definition in METADATA_COLUMNS:
+            # 检查字段是否已存在
+            result = db.execute(text("""
+                SELECT COLUMN_NAME
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME = 'cars'
+                AND COLUMN_NAME = :column_name
+            """), {"column_name": column_name})
+
+            if result.fetchone():
+                logger.info(f"✓ {column_name}字段已存在，跳过添加")
+                continue
+
+            logger.info(f"正在添加{column_name}字段...")
+            db.execute(text(f"ALTER TABLE cars ADD COLUMN {column_name} {definition}"))
+            logger.info(f"✓ {column_name}字段添加成功")
+
+# 三种存储方式的图片列（BASE64、二进制、对象存储），按数据库中已存在的列读取
+IMAGE_COLUMNS = ("image_base64", "image_data", "image_key")
+
+def backfill_metadata(engine):
+    """
+    分批为现有记录计算图片元数据（按ID递增，可中断后重新运行）
+    图片内容通过crud.car_image_content读取，兼容BASE64、二进制和对象存储三种方式
+    """
+    existing = {column["name"] for column in inspect(engine).get_columns("cars")}
+    columns = [name for name in IMAGE_COLUMNS if name in existing]
+    last_id = 0
+    success_count = 0
+    error_count = 0
+
+    while True:
+        with engine.begin() as db:
+            rows = db.execute(text(f"""
+                SELECT id, {", ".join(columns)} FROM cars
+                WHERE image_hash IS NULL AND id > :last_id
+                ORDER BY id LIMIT :batch_size
+            """), {"last_id": last_id, "batch_size": BATCH_SIZE}).fetchall()
+
+            if not rows:
+                break
+
+            for row in rows:
+                car_id = last_id = row.id
+                car = SimpleNamespace(**{**dict.fromkeys(IMAGE_COLUMNS), **row._mapping})
+                try:
+                    content = crud.car_image_content(car)
+                except Exception as e:
+                    logger.warning(f"读取车辆 {car_id} 的图片失败: {e}")
+                    content = None
+                if not content:
+                    error_count += 1
+                    continue
+
+                metadata = storage_service.describe_image(content)
+                db.execute(text("""
+                    UPDATE cars SET image_width = :width, image_height = :height, image_bytes = :size,
+                        image_mime = :mime_type, image_hash = :sha256
+                    WHERE id = :id
+                """), {**metadata, "id": car_id})
+                if metadata["width"] is None:
+                    # 无法解析尺寸的图片仍记录字节数和哈希，避免重复处理
+                    error_count += 1
+                else:
+                    success_count += 1
+
+        logger.info(f"已处理到车辆ID {last_id}: 成功 {success_count} 条，失败 {error_count} 条")
+
+    logger.info(f"图片元数据补全完成: 成功 {success_count} 条，失败 {error_count} 条")
+
+def migrate():
+    engine = create_engine(settings.database_url)
+    try:
+        add_metadata_fields(engine)
+        backfill_metadata(engine)
+    except Exception as e:
+        logger.error(f"添加图片元数据字段失败: {e}")
+        raise
+
+if __name__ == "__main__":
+    logger.info("开始执行数据库迁移：添加图片元数据字段")
+    migrate()
+    logger.info("数据库迁移完成")
\ No newline at end of file
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：添加图片感知哈希字段
+为cars表添加image_phash字段，并分批为现有记录计算图片指纹
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import base64
+from sqlalchemy import create_engine, text
+from config import settings
+from image_hash import dhash_bytes, hash_to_hex
+import logging
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+
+def add_phash_field(engine):
+    """添加image_phash字段到cars表"""
+    with engine.begin() as db:
+        # 检查字段是否已存在
+        result = db.execute(text("""
+            SELECT COLUMN_NAME
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()
+            AND TABLE_NAME = 'cars'
+            AND COLUMN_NAME = 'image_phash'
+        """))
+
+        if result.fetchone():
+            logger.info("✓ image_phash字段已存在，跳过添加")
+            return
+
+        logger.info("正在添加image_phash字段...")
+        db.execute(text("""
+            ALTER TABLE cars
+            ADD COLUMN image_phash VARCHAR(16) NULL
+            COMMENT '图片感知哈希（dHash），用于近似重复检测'
+        """))
+        logger.info("✓ image_phash字段添加成功")
+
+def backfill_phash(engine):
+    """分批为现有记录计算图片指纹（按ID递增，可中断后重新运行）"""
+    last_id = 0
+    success_count = 0
+    error_count = 0
+
+    while True:
+        with engine.begin() as db:
+            rows = db.execute(text("""
+                SELECT id, image_base64 FROM cars
+                WHERE image_phash IS NULL AND id > :last_id
+                ORDER BY id LIMIT :batch_size
+            """), {"last_id": last_id, "batch_size": BATCH_SIZE}).fetchall()
+
+            if not rows:
+                break
+
+            for car_id, image_base64 in rows:
+                last_id = car_id
+                if not image_base64 or ';base64,' not in image_base64:
+                    error_count += 1
+                    continue
+
+                phash_value = dhash_bytes(base64.b64decode(image_base64.split(';base64,')[1]))
+                if phash_value is None:
+                    error_count += 1
+                    continue
+
+                db.execute(
+                    text("UPDATE cars SET image_phash = :phash WHERE id = :id"),
+                    {"phash": hash_to_hex(phash_value), "id": car_id}
+                )
+                success_count += 1
+
+        logger.info(f"已处理到车辆ID {last_id}: 成功 {success_count} 条，失败 {error_count} 条")
+
+    logger.info(f"图片指纹计算完成: 成功 {success_count} 条，失败 {error_count} 条")
+
+def migrate():
+    engine = create_engine(settings.database_url)
+    try:
+        add_phash_field(engine)
+        backfill_phash(engine)
+    except Exception as e:
+        logger.error(f"添加图片指纹字段失败: {e}")
+        raise
+
+if __name__ == "__main__":
+    logger.info("开始执行数据库迁移：添加图片感知哈希字段")
+    migrate()
+    logger.info("数据库迁移完成")
\ No newline at end of file
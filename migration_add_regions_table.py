@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：添加区域表
+创建regions表，写入默认区域，并按现有车辆统计各区域车辆数
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import engine, SessionLocal
+import models
+import crud
+import logging
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def add_regions_table():
+    """创建regions表并初始化区域计数"""
+    db = SessionLocal()
+    try:
+        models.Region.__table__.create(bind=engine, checkfirst=True)
+        logger.info("✓ regions表已就绪")
+
+        if crud.init_default_regions(db):
+            logger.info("✓ 默认区域写入成功")
+        else:
+            logger.info("✓ 区域已存在，跳过默认区域写入")
+
+        # 重新统计计数，修复迁移前后的任何偏差
+        counts = crud.refresh_region_counts(db)
+        for region, count in counts.items():
+            logger.info(f"  {region}: {count} 辆")
+
+    except Exception as e:
+        logger.error(f"添加区域表失败: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    logger.info("开始执行数据库迁移：添加区域表")
+    add_regions_table()
+    logger.info("数据库迁移完成")
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：图片改为二进制存储
+为cars表添加LONGBLOB字段（image_data / thumbnail_data），并在服务运行期间分批把历史BASE64数据转为二进制
+
+上线步骤:
+    1. python migration_to_binary_storage.py --schema-only   # 添加字段，image_base64改为可空
+    2. 设置 IMAGE_STORAGE_MODE=binary 并重启服务（读取同时兼容两种格式）
+    3. python migration_to_binary_storage.py                 # 分批迁移历史数据，可随时中断、重复运行
+    4. python migration_to_binary_storage.py --optimize      # 可选：重建表回收BASE64占用的空间
+
+每批在独立的短事务中锁定少量行并转换，不影响服务的正常读写；
+迁移前后输出表大小和列表查询耗时，也可以用 --report 单独查看。
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import statistics
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from config import settings
+from storage_service import from_data_url
+import logging
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+
+def _column_info(db, column_name):
+    return db.execute(text("""
+        SELECT IS_NULLABLE
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+        AND TABLE_NAME = 'cars'
+        AND COLUMN_NAME = :column_name
+    """), {"column_name": column_name}).fetchone()
+
+def add_binary_fields(engine):
+    """添加二进制图片字段，并将image_base64改为可空（二进制模式下不再写入）"""
+    with engine.begin() as db:
+        for column_name, comment in (("image_data", "原始图片字节"), ("thumbnail_data", "缩略图字节（JPEG）")):
+            if _column_info(db, column_name):
+                logger.info(f"✓ {column_name}字段已存在，跳过添加")
+                continue
+
+            logger.info(f"正在添加{column_name}字段...")
+            db.execute(text(f"ALTER TABLE cars ADD COLUMN {column_name} LONGBLOB NULL COMMENT '{comment}'"))
+            logger.info(f"✓ {column_name}字段添加成功")
+
+        if _column_info(db, "image_base64")[0] == "NO":
+            logger.info("正在将image_base64改为可空...")
+            db.execute(text("ALTER TABLE cars MODIFY COLUMN image_base64 LONGTEXT NULL, ALGORITHM=INPLACE, LOCK=NONE"))
+            logger.info("✓ image_base64已改为可空")
+
+def table_size(engine) -> dict:
+    """cars表的数据和索引大小（先ANALYZE刷新统计信息）"""
+    with engine.begin() as db:
+        db.execute(text("ANALYZE TABLE cars"))
+        row = db.execute(text("""
+            SELECT TABLE_ROWS, DATA_LENGTH, INDEX_LENGTH
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'cars'
+        """)).fetchone()
+        counts = db.execute(text("""
+            SELECT
+                SUM(image_data IS NOT NULL),
+                SUM(image_data IS NULL AND image_base64 IS NOT NULL)
+            FROM cars
+        """)).fetchone()
+
+    return {
+        "rows": row[0],
+        "data_mb": round(row[1] / 1024 / 1024, 1),
+        "index_mb": round(row[2] / 1024 / 1024, 1),
+        "binary_rows": int(counts[0] or 0),
+        "base64_rows": int(counts[1] or 0)
+    }
+
+def list_latency(engine, rounds: int = 10) -> dict:
+    """按列表接口的查询方式读取第一页，统计耗时"""
+    import crud
+
+    Session = sessionmaker(bind=engine)
+    timings = []
+    for _ in range(rounds):
+        db = Session()
+        try:
+            started = time.perf_counter()
+            crud.get_cars(db, page=1, limit=20)
+            timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            db.close()
+
+    return {"median_ms": round(statistics.median(timings), 1), "max_ms": round(max(timings), 1)}
+
+def report(engine, label: str):
+    size = table_size(engine)
+    latency = list_latency(engine)
+    logger.info(
+        f"[{label}] 表大小: 数据 {size['data_mb']}MB + 索引 {size['index_mb']}MB，约 {size['rows']} 行 "
+        f"（二进制 {size['binary_rows']} 行，待迁移 {size['base64_rows']} 行）"
+    )
+    logger.info(f"[{label}] 列表查询耗时: 中位数 {latency['median_ms']}ms，最大 {latency['max_ms']}ms")
+
+def migrate_rows(engine, batch_size: int = BATCH_SIZE, sleep_seconds: float = 0.0, start_id: int = 0):
+    """
+    分批把BASE64数据转为二进制（按ID递增，可中断后重新运行）
+    每批使用 SELECT ... FOR UPDATE 锁定本批记录，与服务的并发更新互斥；
+    转换期间被更新为BASE64的记录会在下次运行时重新迁移
+    SQLite不支持FOR UPDATE（写事务本身独占数据库），省略行锁
+    """
+    lock_clause = "FOR UPDATE" if engine.dialect.name != "sqlite" else ""
+    last_id = start_id
+    success_count = 0
+    error_count = 0
+    started = time.perf_counter()
+
+    while True:
+        with engine.begin() as db:
+            rows = db.execute(text(f"""
+                SELECT id, image_base64, thumbnail_base64 FROM cars
+                WHERE image_data IS NULL AND image_base64 IS NOT NULL AND id > :last_id
+                ORDER BY id LIMIT :batch_size
+                {lock_clause}
+            """), {"last_id": last_id, "batch_size": batch_size}).fetchall()
+
+            if not rows:
+                break
+
+            for car_id, image_base64, thumbnail_base64 in rows:
+                last_id = car_id
+                try:
+                    image_data = from_data_url(image_base64)
+                    thumbnail_data = from_data_url(thumbnail_base64)
+                except Exception as e:
+                    logger.warning(f"车辆 {car_id} 图片数据解码失败，保留BASE64: {e}")
+                    image_data = None
+                if not image_data:
+                    error_count += 1
+                    continue
+
+                db.execute(text("""
+                    UPDATE cars SET
+                        image_data = :image_data,
+                        thumbnail_data = :thumbnail_data,
+                        image_mime = COALESCE(image_mime, :mime_type),
+                        image_base64 = NULL,
+                        thumbnail_base64 = NULL
+                    WHERE id = :id
+                """), {
+                    "image_data": image_data,
+                    "thumbnail_data": thumbnail_data,
+                    "mime_type": image_base64.split(';')[0].replace('data:', ''),
+                    "id": car_id
+                })
+                success_count += 1
+
+        rate = success_count / max(time.perf_counter() - started, 1e-6)
+        logger.info(f"已处理到车辆ID {last_id}: 成功 {success_count} 条，失败 {error_count} 条（{rate:.0f} 条/秒）")
+        if sleep_seconds:
+            # 批次之间暂停，降低对主库和复制延迟的影响
+            time.sleep(sleep_seconds)
+
+    logger.info(f"二进制存储迁移完成: 成功 {success_count} 条，失败 {error_count} 条")
+
+def main():
+    parser = argparse.ArgumentParser(description="图片改为二进制存储")
+    parser.add_argument("--schema-only", action="store_true", help="只添加字段，不迁移数据")
+    parser.add_argument("--report", action="store_true", help="只输出表大小和列表查询耗时")
+    parser.add_argument("--optimize", action="store_true", help="执行OPTIMIZE TABLE回收空间（在线重建表）")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_SIZE, help="每批迁移的记录数")
+    parser.add_argument("--sleep", type=float, default=0.0, help="每批之间暂停的秒数")
+    parser.add_argument("--start-id", type=int, default=0, help="从指定车辆ID之后开始迁移")
+    args = parser.parse_args()
+
+    engine = create_engine(settings.database_url)
+    try:
+        if args.report:
+            report(engine, "当前")
+            return
+
+        add_binary_fields(engine)
+        if args.schema_only:
+            return
+
+        report(engine, "迁移前")
+        migrate_rows(engine, batch_size=args.chunk_size, sleep_seconds=args.sleep, start_id=args.start_id)
+        if args.optimize:
+            logger.info("正在执行OPTIMIZE TABLE...")
+            with engine.begin() as db:
+                db.execute(text("OPTIMIZE TABLE cars"))
+        report(engine, "迁移后")
+        if not args.optimize:
+            logger.info("提示：BASE64数据占用的空间需要运行 --optimize 重建表后才会释放")
+    except Exception as e:
+        logger.error(f"二进制存储迁移失败: {e}")
+        raise
+
+if __name__ == "__main__":
+    logger.info("开始执行数据库迁移：图片改为二进制存储")
+    main()
+    logger.info("数据库迁移完成")
\ No newline at end of file
@@ -1,19 +1,81 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index, LargeBinary
 from sqlalchemy.sql import func
-from sqlalchemy.dialects.mysql import LONGTEXT
+from sqlalchemy.dialects.mysql import LONGTEXT, LONGBLOB
 from database import Base
 
+# 跨数据库的大字段类型：MySQL上使用LONGTEXT/LONGBLOB（TEXT/BLOB只有64KB），其他数据库使用通用类型
+LongText = Text().with_variant(LONGTEXT, "mysql")
+LongBinary = LargeBinary().with_variant(LONGBLOB, "mysql")
+
 class Car(Base):
     __tablename__ = "cars"
     
     id = Column(Integer, primary_key=True, index=True)
     region = Column(String(50), nullable=False, index=True)
-    image_base64 = Column(LONGTEXT, nullable=False)  # 使用LONGTEXT支持大型BASE64数据
-    thumbnail_base64 = Column(LONGTEXT, nullable=True)  # 缩略图数据，用于快速加载
+    image_base64 = Column(LongText, nullable=True)  # 使用LONGTEXT支持大型BASE64数据（base64存储模式）
+    thumbnail_base64 = Column(LongText, nullable=True)  # 缩略图数据，用于快速加载
+    # binary存储模式：原始图片字节，MIME类型见image_mime，缩略图统一为JPEG
+    image_data = Column(LongBinary, nullable=True)
+    thumbnail_data = Column(LongBinary, nullable=True)
+    # object存储模式：对象存储中的键
+    image_key = Column(String(255), nullable=True)
+    thumbnail_key = Column(String(255), nullable=True)
+    image_phash = Column(String(16), nullable=True)  # 图片感知哈希（dHash），用于近似重复检测
+    # 图片元数据，上传时计算一次，读取时无需再解析图片
+    image_width = Column(Integer, nullable=True)
+    image_height = Column(Integer, nullable=True)
+    image_bytes = Column(Integer, nullable=True)  # 压缩后图片字节数
+    image_mime = Column(String(50), nullable=True)
+    image_hash = Column(String(64), nullable=True)  # 图片内容SHA-256
+    image_quality = Column(Integer, nullable=True)  # 编码使用的JPEG质量（原样保存的图片为空）
+    status = Column(String(20), nullable=False, default="ready", server_default="ready")  # processing / ready / failed
     contact = Column(String(255), nullable=True)  # 联系方式改为可选
     description = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    __table_args__ = (
+        # 描述和联系方式的全文索引（ngram分词支持中文），仅在MySQL上创建
+        Index(
+            "ft_cars_description_contact", "description", "contact",
+            mysql_prefix="FULLTEXT", mysql_with_parser="ngram"
+        ).ddl_if(dialect="mysql"),
+    )
+
+class ImageJob(Base):
+    """
+    图片处理任务（异步上传时由工作进程消费）
+    通过条件UPDATE抢占租约，租约过期未完成的任务会被其他工作进程重新领取
+    """
+    __tablename__ = "image_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    car_id = Column(Integer, nullable=False, index=True)
+    status = Column(String(20), nullable=False, default="pending", server_default="pending")  # pending / running / done / failed
+    source_data = Column(LongBinary, nullable=True)  # 原始上传文件
+    source_key = Column(String(255), nullable=True)  # object存储模式：原始文件在对象存储中的键
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    available_at = Column(DateTime, nullable=False)  # 可被领取的时间（失败重试时延后）
+    lease_owner = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    trace_parent = Column(String(55), nullable=True)  # 上传请求的W3C traceparent，工作进程据此延续链路
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("ix_image_jobs_status_available", "status", "available_at"),
+    )
+
+class Region(Base):
+    __tablename__ = "regions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(50), unique=True, nullable=False, index=True)
+    sort_order = Column(Integer, nullable=False, default=0)
+    car_count = Column(Integer, nullable=False, default=0, server_default="0")  # 该区域车辆数，随车辆增删改在同一事务中维护
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 class User(Base):
     __tablename__ = "users"
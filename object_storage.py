@@ -0,0 +1,189 @@
+"""
+对象存储后端（S3兼容协议）
+图片和缩略图写入存储桶，接口通过签名URL重定向访问，客户端可使用预签名表单直接上传。
+七牛云Kodo、MinIO、AWS S3等都可以通过S3兼容接口接入；未单独配置时沿用QINIU_*的密钥和存储空间。
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+
+# 对象写入后不再修改（更新图片时使用新的键），可以长期缓存
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# 客户端直传的临时对象前缀，处理完成后删除
+UPLOAD_PREFIX = "uploads/"
+
+class ObjectStorage:
+    """
+    S3兼容对象存储
+    boto3在首次使用时才导入，未启用对象存储时不需要安装
+    """
+
+    def __init__(self, bucket: str, endpoint_url: str = None, access_key: str = None, secret_key: str = None,
+                 region: str = None, url_expires: int = 3600, public_base_url: str = None,
+                 url_cache_size: int = 10000):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url or None
+        self.access_key = access_key or None
+        self.secret_key = secret_key or None
+        self.region = region or None
+        self.url_expires = url_expires
+        self.public_base_url = (public_base_url or "").rstrip("/") or None
+        self._client = None
+        self._client_lock = threading.Lock()
+        # 签名URL缓存：同一对象在有效期的前半段返回相同URL，浏览器和CDN可以命中缓存
+        # 按最近使用顺序保存（LRU），超过条数上限或过了复用期的条目被淘汰
+        self._url_cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._url_cache_size = url_cache_size
+        self._url_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import boto3
+                    from botocore.config import Config
+
+                    self._client = boto3.client(
+                        "s3",
+                        endpoint_url=self.endpoint_url,
+                        aws_access_key_id=self.access_key,
+                        aws_secret_access_key=self.secret_key,
+                        region_name=self.region,
+                        config=Config(signature_version="s3v4", s3={"addressing_style": "path"})
+                    )
+        return self._client
+
+    @staticmethod
+    def new_key(prefix: str, extension: str = "jpg") -> str:
+        """生成新的对象键（随机，不与已有对象冲突）"""
+        return f"{prefix}{secrets.token_hex(16)}.{extension}"
+
+    def put(self, key: str, content: bytes, content_type: str):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=content,
+            ContentType=content_type,
+            CacheControl=IMMUTABLE_CACHE_CONTROL
+        )
+
+    def get(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    def head(self, key: str) -> Optional[dict]:
+        """对象元数据（大小、类型），对象不存在时返回None"""
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return {"size": response["ContentLength"], "content_type": response.get("ContentType")}
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        with self._url_lock:
+            self._url_cache.pop(key, None)
+
+    def delete_many(self, keys):
+        """批量删除（每次请求最多1000个对象）"""
+        keys = list(keys)
+        for start in range(0, len(keys), 1000):
+            chunk = keys[start:start + 1000]
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in chunk], "Quiet": True}
+            )
+        with self._url_lock:
+            for key in keys:
+                self._url_cache.pop(key, None)
+
+    def url(self, key: str) -> Tuple[str, int]:
+        """
+        返回 (访问URL, 可缓存秒数)
+        配置了公开访问域名（如CDN）时直接拼接URL；否则返回签名URL，
+        同一对象在有效期前半段复用同一个签名URL
+        """
+        if self.public_base_url:
+            return f"{self.public_base_url}/{key}", self.url_expires
+
+        now = time.time()
+        with self._url_lock:
+            cached = self._url_cache.get(key)
+            if cached:
+                if cached[1] - now > self.url_expires / 2:
+                    self._url_cache.move_to_end(key)
+                    return cached[0], int(cached[1] - now - self.url_expires / 2)
+                del self._url_cache[key]
+
+        url = self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.url_expires
+        )
+        with self._url_lock:
+            self._url_cache[key] = (url, now + self.url_expires)
+            self._url_cache.move_to_end(key)
+            self._evict_urls(now)
+        return url, int(self.url_expires / 2)
+
+    def _evict_urls(self, now: float):
+        """从最久未使用的一端淘汰：超过条数上限的条目，以及已过复用期的条目"""
+        while self._url_cache:
+            key, (_, expires_at) = next(iter(self._url_cache.items()))
+            if len(self._url_cache) <= self._url_cache_size and expires_at - now > self.url_expires / 2:
+                break
+            del self._url_cache[key]
+
+    def presigned_upload(self, content_type: str, max_size: int, expires: int = 900) -> dict:
+        """
+        生成客户端直传用的预签名POST表单
+        限制文件类型和大小；返回的upload_id用于上传完成后通知服务端处理
+        """
+        key = self.new_key(UPLOAD_PREFIX, extension="bin")
+        post = self.client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=key,
+            Fields={"Content-Type": content_type},
+            Conditions=[
+                {"Content-Type": content_type},
+                ["content-length-range", 1, max_size]
+            ],
+            ExpiresIn=expires
+        )
+        return {
+            "upload_id": key[len(UPLOAD_PREFIX):],
+            "url": post["url"],
+            "fields": post["fields"],
+            "expires_in": expires
+        }
+
+    @staticmethod
+    def upload_key(upload_id: str) -> Optional[str]:
+        """由upload_id还原临时对象键，格式不正确时返回None（防止访问任意对象）"""
+        name, _, extension = upload_id.partition(".")
+        if extension != "bin" or len(name) != 32 or any(c not in "0123456789abcdef" for c in name):
+            return None
+        return f"{UPLOAD_PREFIX}{upload_id}"
+
+@lru_cache(maxsize=None)
+def get_object_storage() -> ObjectStorage:
+    """按配置创建对象存储实例（IMAGE_STORAGE_MODE=object 时使用）"""
+    from config import settings
+
+    return ObjectStorage(
+        bucket=settings.OBJECT_STORAGE_BUCKET,
+        endpoint_url=settings.OBJECT_STORAGE_ENDPOINT,
+        access_key=settings.OBJECT_STORAGE_ACCESS_KEY,
+        secret_key=settings.OBJECT_STORAGE_SECRET_KEY,
+        region=settings.OBJECT_STORAGE_REGION,
+        url_expires=settings.OBJECT_STORAGE_URL_EXPIRES,
+        public_base_url=settings.OBJECT_STORAGE_PUBLIC_URL,
+        url_cache_size=settings.OBJECT_STORAGE_URL_CACHE_SIZE
+    )
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""
+热点数据的短时缓存（微缓存）
+各区域的列表首页被频繁请求，但只有新增/修改/删除车辆时才会变化。缓存渲染好的响应体几秒钟：
+    - 命中时不访问数据库，也不重新序列化缩略图
+    - 同一个键的并发未命中合并为一次数据库查询，其余请求等待同一个结果（请求合并）
+    - 车辆写操作提交后立即调用invalidate()（异步代码中用ainvalidate()）；失效前已开始的查询结果不会被后续请求读到
+缓存数据存放在共享缓存后端（cache_backend），多进程/多机部署时一个进程的写操作使所有进程的缓存失效；
+访问Redis等阻塞后端时在线程池中执行，不阻塞事件循环
+"""
+
+import asyncio
+from typing import Callable, Hashable
+
+from starlette.concurrency import run_in_threadpool
+from cache_backend import VersionedCache, cache_backend, cache_breaker
+
+class MicroCache:
+    def __init__(self, name: str, ttl: float = 2.0, backend=None):
+        self.name = name
+        self.ttl = ttl
+        self.cache = VersionedCache(backend or cache_backend, name, ttl=ttl, breaker=None if backend else cache_breaker)
+        self._pending = {}  # 键 -> 本进程正在执行的加载任务
+        self._generation = 0  # 本进程的失效次数
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def get(self, key: Hashable, loader: Callable):
+        """
+        返回键对应的缓存值，未命中时在线程池中执行loader（同步函数）加载
+        同一个键已有加载在进行时等待它的结果；加载失败时异常抛给所有等待者，不缓存
+        合并的请求共用同一次加载，loader需要自己打开数据库会话，不能使用发起请求的会话
+        """
+        if not self.enabled:
+            return await run_in_threadpool(loader)
+
+        cache_key = repr(key)
+        version, value = await self.cache.alookup(cache_key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._pending.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, cache_key, loader, version, self._generation))
+            self._pending[key] = task
+        else:
+            self.coalesced += 1
+        # 发起加载的请求被取消（客户端断开）时不影响其他等待者
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, cache_key: str, loader: Callable, version: int, generation: int):
+        try:
+            value = await run_in_threadpool(loader)
+        finally:
+            if self._pending.get(key) is asyncio.current_task():
+                del self._pending[key]
+        # 按加载前读到的版本写入：加载期间其他进程发生过写操作时，条目写入即过时；
+        # 本进程发生过写操作时不写入，避免覆盖失效后新加载的条目
+        if generation == self._generation:
+            await self.cache.aset(cache_key, value, version=version)
+        return value
+
+    def invalidate(self):
+        """使所有进程的缓存失效；之后的请求不再合并到失效前开始的加载（在线程池或工作进程中调用）"""
+        self.cache.invalidate()
+        self._forget_pending()
+
+    async def ainvalidate(self):
+        """invalidate()的异步版本，在事件循环中调用"""
+        self._forget_pending()
+        await self.cache.ainvalidate()
+
+    def _forget_pending(self):
+        self._generation += 1
+        self._pending.clear()
+        self.invalidations += 1
+
+    def metric_lines(self) -> list:
+        """Prometheus文本格式的缓存指标"""
+        lookups = self.hits + self.misses + self.coalesced
+        labels = f'{{cache="{self.name}"}}'
+        return [
+            "# HELP microcache_hits_total 命中缓存的请求数",
+            "# TYPE microcache_hits_total counter",
+            f"microcache_hits_total{labels} {self.hits}",
+            "# HELP microcache_misses_total 未命中并查询数据库的请求数",
+            "# TYPE microcache_misses_total counter",
+            f"microcache_misses_total{labels} {self.misses}",
+            "# HELP microcache_coalesced_total 未命中但合并到进行中查询的请求数",
+            "# TYPE microcache_coalesced_total counter",
+            f"microcache_coalesced_total{labels} {self.coalesced}",
+            "# HELP microcache_invalidations_total 写操作触发的失效次数",
+            "# TYPE microcache_invalidations_total counter",
+            f"microcache_invalidations_total{labels} {self.invalidations}",
+            "# HELP microcache_hit_ratio 不需要查询数据库的请求占比（命中+合并）",
+            "# TYPE microcache_hit_ratio gauge",
+            f"microcache_hit_ratio{labels} {(self.hits + self.coalesced) / lookups if lookups else 0:.4f}",
+            "# HELP microcache_backend_errors_total 缓存后端访问失败次数（失败时按未命中处理）",
+            "# TYPE microcache_backend_errors_total counter",
+            f"microcache_backend_errors_total{labels} {self.cache.errors}"
+        ]
+
+def metric_lines() -> list:
+    return car_list_cache.metric_lines() + site_config_cache.metric_lines() + [
+        "# HELP cache_breaker_open 缓存后端熔断器是否断开（断开期间按未命中处理）",
+        "# TYPE cache_breaker_open gauge",
+        f"cache_breaker_open {int(cache_breaker.is_open)}",
+        "# HELP cache_breaker_trips_total 缓存后端熔断次数",
+        "# TYPE cache_breaker_trips_total counter",
+        f"cache_breaker_trips_total {cache_breaker.trips}"
+    ]
+
+def _create_caches():
+    from config import settings
+
+    return (
+        MicroCache("car_list", ttl=settings.PAGE_CACHE_TTL),
+        MicroCache("site_config", ttl=settings.SITE_CONFIG_CACHE_TTL),
+        VersionedCache(cache_backend, "thumbnail", ttl=settings.THUMBNAIL_CACHE_TTL, breaker=cache_breaker)
+    )
+
+# 车辆列表页、站点配置（区域列表）和缩略图字节的缓存
+car_list_cache, site_config_cache, thumbnail_cache = _create_caches()
\ No newline at end of file
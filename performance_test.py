@@ -4,13 +4,15 @@
 测试优化前后的API响应时间
 """
 
+import os
 import requests
 import time
 import json
 from datetime import datetime
 
-# API基础URL
-BASE_URL = "https://carpicback-production.up.railway.app"
+# API基础URL；本地测试可启动嵌入式SQLite实例（DATABASE_URL=sqlite:///./bench.db python main.py）
+# 并设置 BASE_URL=http://localhost:8000
+BASE_URL = os.getenv("BASE_URL", "https://carpicback-production.up.railway.app")
 
 def test_api_performance():
     """测试API性能"""
@@ -0,0 +1,240 @@
+"""
+按客户端的令牌桶限流
+规则按 "方法 路径模板" 配置，每条规则指定桶容量（允许的突发请求数）、补充周期和限流键：
+    RATE_LIMITS="POST /api/admin/login=5/60:ip; POST /api/cars=20/60:ip"
+表示每个IP在60秒内最多5次登录（令牌按 5/60 每秒匀速补充）。限流键可以是：
+    ip     客户端IP
+    token  Authorization中的令牌（没有令牌时退回IP）
+    route  整条路由共用一个桶
+单进程使用内存存储；多进程/多机部署设置 RATE_LIMIT_BACKEND=redis，所有工作进程共享令牌桶。
+部署在反向代理之后时需开启 RATE_LIMIT_TRUST_FORWARDED，否则所有客户端的IP都是代理地址、共用同一个桶；
+客户端IP取 X-Forwarded-For 从右数第 RATE_LIMIT_PROXY_HOPS 个地址（最左边的地址可以被客户端伪造）。
+"""
+
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+from typing import List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+class RateLimitRule:
+    def __init__(self, method: str, path: str, capacity: int, period: float, key: str = "ip"):
+        if key not in ("ip", "token", "route"):
+            raise ValueError(f"不支持的限流键: {key}")
+        self.method = method.upper()
+        self.path = path
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period  # 每秒补充的令牌数
+        self.key = key
+        self.pattern = re.compile("^" + re.sub(r"\\\{[^/]+?\\\}", "[^/]+", re.escape(path)) + "$")
+        self.allowed = 0
+        self.limited = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.path}"
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and self.pattern.match(path) is not None
+
+def parse_rules(spec: str) -> List[RateLimitRule]:
+    """解析规则配置: "方法 路径=容量/周期秒[:限流键]"，多条规则用分号分隔"""
+    rules = []
+    for item in spec.split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        route, _, limit = item.rpartition("=")
+        method, _, path = route.strip().partition(" ")
+        limit, _, key = limit.partition(":")
+        capacity, _, period = limit.partition("/")
+        rules.append(RateLimitRule(method, path.strip(), int(capacity), float(period), key.strip() or "ip"))
+    return rules
+
+class MemoryStore:
+    """
+    进程内令牌桶存储
+    桶在补满后不再需要保存（与新建的桶等价），定期清理已补满的桶，内存占用与活跃客户端数成正比
+    """
+
+    SWEEP_EVERY = 1000
+    blocking = False
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._operations = 0
+
+    def consume(self, key: str, capacity: int, rate: float, cost: int = 1) -> Tuple[bool, float]:
+        """消耗令牌，返回 (是否允许, 剩余令牌数)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, expires = self._buckets.get(key, (capacity, now, 0))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            # 补满所需时间之后即可丢弃
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+
+            self._operations += 1
+            if self._operations % self.SWEEP_EVERY == 0:
+                self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+            return allowed, tokens
+
+    def __len__(self):
+        return len(self._buckets)
+
+# 原子地补充并消耗令牌；键在补满所需时间后过期
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+class RedisStore:
+    """
+    Redis共享令牌桶（多个工作进程/多台机器共用）
+    使用Lua脚本保证补充和消耗的原子性；redis包在首次使用时才导入
+    访问Redis是阻塞的网络调用，限流器在线程池中调用，不阻塞事件循环
+    """
+
+    blocking = True
+
+    def __init__(self, url: str = None, client=None, prefix: str = "ratelimit:"):
+        self.url = url
+        self.prefix = prefix
+        self._client = client
+        self._script = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._client
+
+    def consume(self, key: str, capacity: int, rate: float, cost: int = 1) -> Tuple[bool, float]:
+        if self._script is None:
+            self._script = self.client.register_script(_TOKEN_BUCKET_SCRIPT)
+        allowed, tokens = self._script(keys=[self.prefix + key], args=[capacity, rate, time.time(), cost])
+        return bool(allowed), float(tokens)
+
+class RateLimiter:
+    def __init__(self, rules: List[RateLimitRule], store, trust_forwarded: bool = False, proxy_hops: int = 1):
+        self.rules = rules
+        self.store = store
+        self.trust_forwarded = trust_forwarded
+        self.proxy_hops = max(1, proxy_hops)
+        self.errors = 0
+
+    def match(self, method: str, path: str) -> Optional[RateLimitRule]:
+        for rule in self.rules:
+            if rule.matches(method, path):
+                return rule
+        return None
+
+    def client_key(self, rule: RateLimitRule, request) -> str:
+        if rule.key == "route":
+            return rule.name
+        if rule.key == "token":
+            authorization = request.headers.get("authorization", "")
+            if authorization.lower().startswith("bearer "):
+                # 只保存令牌的哈希
+                return f"{rule.name}|token:{hashlib.sha256(authorization[7:].encode()).hexdigest()[:32]}"
+
+        client_ip = request.client.host if request.client else "unknown"
+        if self.trust_forwarded:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                # 每层可信代理在末尾追加它看到的来源地址，从右数第proxy_hops个是最外层代理看到的客户端IP
+                addresses = [address.strip() for address in forwarded.split(",")]
+                client_ip = addresses[-min(self.proxy_hops, len(addresses))] or client_ip
+        return f"{rule.name}|ip:{client_ip}"
+
+    async def check(self, request) -> Optional[dict]:
+        """
+        检查请求是否超出限制：未匹配规则时返回None，否则返回
+        {"allowed", "limit", "remaining", "retry_after"}；共享存储不可用时放行
+        """
+        rule = self.match(request.method, request.url.path)
+        if rule is None:
+            return None
+
+        try:
+            key = self.client_key(rule, request)
+            if self.store.blocking:
+                allowed, tokens = await run_in_threadpool(self.store.consume, key, rule.capacity, rule.rate)
+            else:
+                allowed, tokens = self.store.consume(key, rule.capacity, rule.rate)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"限流存储不可用，放行请求: {e}")
+            return None
+
+        if allowed:
+            rule.allowed += 1
+        else:
+            rule.limited += 1
+        return {
+            "allowed": allowed,
+            "limit": rule.capacity,
+            "remaining": int(tokens),
+            "retry_after": 0 if allowed else max(1, math.ceil((1 - tokens) / rule.rate))
+        }
+
+    def metric_lines(self) -> list:
+        """Prometheus文本格式的限流指标"""
+        lines = [
+            "# HELP ratelimit_allowed_total 通过限流检查的请求数",
+            "# TYPE ratelimit_allowed_total counter"
+        ]
+        lines += [f'ratelimit_allowed_total{{rule="{rule.name}"}} {rule.allowed}' for rule in self.rules]
+        lines += [
+            "# HELP ratelimit_limited_total 被限流拒绝（429）的请求数",
+            "# TYPE ratelimit_limited_total counter"
+        ]
+        lines += [f'ratelimit_limited_total{{rule="{rule.name}"}} {rule.limited}' for rule in self.rules]
+        lines += [
+            "# HELP ratelimit_backend_errors_total 限流存储访问失败次数（失败时放行）",
+            "# TYPE ratelimit_backend_errors_total counter",
+            f"ratelimit_backend_errors_total {self.errors}"
+        ]
+        return lines
+
+def create_rate_limiter() -> RateLimiter:
+    """按配置创建限流器"""
+    from config import settings
+
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        store = RedisStore(settings.RATE_LIMIT_REDIS_URL)
+    else:
+        store = MemoryStore()
+    return RateLimiter(
+        parse_rules(settings.RATE_LIMITS),
+        store,
+        trust_forwarded=settings.RATE_LIMIT_TRUST_FORWARDED,
+        proxy_hops=settings.RATE_LIMIT_PROXY_HOPS
+    )
+
+# 全局限流器
+rate_limiter = create_rate_limiter()
\ No newline at end of file
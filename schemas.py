@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class CarBase(BaseModel):
     region: str
@@ -15,6 +15,24 @@ class CarUpdate(BaseModel):
     contact: Optional[str] = None
     description: Optional[str] = None
 
+# 客户端直传（对象存储模式）
+class DirectUploadCreate(BaseModel):
+    content_type: str
+
+# 批量管理操作：按ID列表或条件（区域、创建时间范围）筛选车辆
+class CarBatchFilter(BaseModel):
+    ids: Optional[List[int]] = None
+    region: Optional[str] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+class CarBatchMove(CarBatchFilter):
+    target_region: str
+
+class CarBatchUpdate(CarBatchFilter):
+    contact: Optional[str] = None
+    description: Optional[str] = None
+
 class Car(CarBase):
     id: int
     image_base64: str
@@ -30,6 +48,11 @@ class CarDetails(Car):
 
 
 
+# 区域相关schemas
+class RegionCreate(BaseModel):
+    name: str
+    sort_order: int = 0
+
 # 管理员相关schemas
 class AdminLogin(BaseModel):
     username: str
@@ -0,0 +1,159 @@
+"""
+车辆全文检索
+MySQL使用FULLTEXT索引（ngram分词）；其他数据库（如SQLite测试环境）使用本地内存倒排索引。
+本地索引与MySQL ngram解析器保持一致的分词方式：按二元组（bigram）切分，不依赖空格分词，适用于中文。
+"""
+
+import base64
+import json
+import math
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# MySQL BOOLEAN MODE中的特殊字符
+_BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+def normalize(text: Optional[str]) -> str:
+    return (text or "").lower()
+
+def split_terms(q: str) -> List[str]:
+    """将查询拆分为检索词（按空白分隔，去除BOOLEAN MODE运算符）"""
+    terms = []
+    for term in _BOOLEAN_OPERATORS.sub(" ", normalize(q)).split():
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+def _grams(text: str) -> Set[str]:
+    """单字与二元组，单字用于支持一个字符的检索词"""
+    grams = set()
+    for run in text.split():
+        grams.update(run)
+        grams.update(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+def _term_grams(term: str) -> Set[str]:
+    if len(term) == 1:
+        return {term}
+    return {term[i:i + 2] for i in range(len(term) - 1)}
+
+def boolean_query(terms: List[str]) -> str:
+    """构造MySQL BOOLEAN MODE查询：每个检索词作为必须出现的短语（ngram下等价于子串匹配）"""
+    return " ".join(f'+"{term}"' for term in terms)
+
+def escape_like(term: str) -> str:
+    """转义LIKE通配符，检索词按字面匹配（配合 escape="\\" 使用）"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def encode_cursor(*position) -> str:
+    """
+    分页游标：本地索引为上一页最后一条的 (得分, 车辆ID)，
+    MySQL FULLTEXT和LIKE回退查询为下一页的偏移量 (offset,)
+    """
+    raw = json.dumps(list(position)).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor: str) -> Tuple:
+    """解析分页游标，格式无效时抛出ValueError"""
+    position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    if not isinstance(position, list):
+        raise ValueError("invalid cursor")
+    if len(position) == 2:
+        return float(position[0]), int(position[1])
+    if len(position) == 1 and int(position[0]) >= 0:
+        return (int(position[0]),)
+    raise ValueError("invalid cursor")
+
+class InvertedIndex:
+    """
+    本地倒排索引（线程安全），只保存描述、联系方式和区域，不涉及图片数据
+    启动时从数据库重建，写操作时增量维护；未重建前所有维护操作均为空操作
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Set[int]] = {}
+        self._docs: Dict[int, Tuple[str, str]] = {}  # 车辆ID -> (区域, 规范化文本)
+        self.ready = False
+
+    def rebuild(self, rows: Iterable[Tuple[int, str, Optional[str], Optional[str]]]):
+        """使用 (车辆ID, 区域, 描述, 联系方式) 列表重建索引"""
+        with self._lock:
+            self._postings = {}
+            self._docs = {}
+            for car_id, region, description, contact in rows:
+                self._add(car_id, region, description, contact)
+            self.ready = True
+
+    def update(self, car_id: int, region: str, description: Optional[str], contact: Optional[str]):
+        with self._lock:
+            if not self.ready:
+                return
+            self._remove(car_id)
+            self._add(car_id, region, description, contact)
+
+    def remove(self, car_id: int):
+        with self._lock:
+            if self.ready:
+                self._remove(car_id)
+
+    def _add(self, car_id, region, description, contact):
+        text = f"{normalize(description)} {normalize(contact)}"
+        self._docs[car_id] = (region, text)
+        for gram in _grams(text):
+            self._postings.setdefault(gram, set()).add(car_id)
+
+    def _remove(self, car_id):
+        doc = self._docs.pop(car_id, None)
+        if doc is None:
+            return
+        for gram in _grams(doc[1]):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(car_id)
+                if not postings:
+                    del self._postings[gram]
+
+    def search(self, terms: List[str], region: Optional[str] = None,
+               after: Optional[Tuple[float, int]] = None, limit: int = 20) -> List[Tuple[float, int]]:
+        """
+        检索包含全部检索词的车辆，按 (相关度降序, ID降序) 返回 [(得分, 车辆ID)]
+        after 为上一页最后一条的 (得分, 车辆ID)，用于键集分页
+        """
+        with self._lock:
+            total_docs = len(self._docs) or 1
+            candidates = None
+            weights = {}
+            for term in terms:
+                postings = [self._postings.get(gram, set()) for gram in _term_grams(term)]
+                rarest = min(postings, key=len)
+                # 以最稀有的gram估算检索词的IDF
+                weights[term] = math.log(1 + total_docs / (1 + len(rarest)))
+                matched = set.intersection(*postings)
+                candidates = matched if candidates is None else candidates & matched
+                if not candidates:
+                    return []
+
+            results = []
+            for car_id in candidates:
+                doc_region, text = self._docs[car_id]
+                if region and doc_region != region:
+                    continue
+                # bigram交集可能误报，用子串校验确保精确匹配
+                score = 0.0
+                for term in terms:
+                    occurrences = text.count(term)
+                    if not occurrences:
+                        break
+                    score += weights[term] * (1 + math.log(occurrences))
+                else:
+                    score = round(score, 6)
+                    if after is None or (score, car_id) < after:
+                        results.append((score, car_id))
+
+        results.sort(reverse=True)
+        return results[:limit]
+
+# 创建全局本地检索索引实例
+search_index = InvertedIndex()
\ No newline at end of file
@@ -14,6 +14,8 @@ DB_PORT=3306
 DB_NAME=car_management
 DB_USER=root
 DB_PASSWORD=your_password
+# 单机部署或本地测试可改用嵌入式SQLite（设置后忽略以上MySQL配置）
+# DATABASE_URL=sqlite:///./car_pic.db
 
 # JWT配置
 SECRET_KEY=your-secret-key-here-change-in-production
@@ -23,6 +25,15 @@ ACCESS_TOKEN_EXPIRE_MINUTES=30
 STORAGE_TYPE=qiniu  # local 或 qiniu
 UPLOAD_DIR=uploads
 
+# 多个工作进程或多台机器部署时使用共享缓存（默认进程内缓存）
+# CACHE_BACKEND=redis  # memory、redis 或 disk
+# CACHE_REDIS_URL=redis://localhost:6379/0
+
+# 限流：部署在反向代理（Railway、Nginx等）之后时必须信任X-Forwarded-For，
+# 否则所有客户端都按代理IP计数、共用同一个令牌桶（Railway上默认开启）
+# RATE_LIMIT_TRUST_FORWARDED=true
+# RATE_LIMIT_PROXY_HOPS=1  # 可信代理层数，客户端IP取X-Forwarded-For从右数第N个地址
+
 # 七牛云配置
 QINIU_ACCESS_KEY=AfdmRc7F433HD1pfW49G5FNnCN1YXubrXOjlc-kq
 QINIU_SECRET_KEY=kkptjXEMYFJIzBTZUhzF-OhPNtf4aVnsQwfmDeJz
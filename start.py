@@ -5,6 +5,7 @@
 
 import os
 import sys
+import argparse
 from pathlib import Path
 
 def check_dependencies():
@@ -13,7 +14,9 @@ def check_dependencies():
         import fastapi
         import uvicorn
         import sqlalchemy
-        import mysql.connector
+        from config import settings
+        if settings.database_url.startswith("mysql"):
+            import mysql.connector
         print("✓ 所有依赖已安装")
         return True
     except ImportError as e:
@@ -49,7 +52,141 @@ def create_upload_directory():
     upload_dir.mkdir(exist_ok=True)
     print("✓ 上传目录已创建")
 
+def detect_cpu_count():
+    """
+    检测可用CPU数，优先读取容器的cgroup CPU配额
+    """
+    # cgroup v2: "max 100000" 或 "200000 100000"
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    
+    # cgroup v1
+    try:
+        quota = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text())
+        period = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text())
+        if quota > 0 and period > 0:
+            return max(1, quota // period)
+    except (OSError, ValueError):
+        pass
+    
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def compute_pool_sizes(workers, budget):
+    """
+    将全局数据库连接预算平均分配给各工作进程
+    每个进程的连接按 常驻:溢出 = 1:2 划分（与单进程默认的10+20一致）
+    """
+    per_worker = max(2, budget // workers)
+    pool_size = max(1, per_worker // 3)
+    return pool_size, per_worker - pool_size
+
+def reserved_worker_connections(settings):
+    """
+    为图片处理工作进程（worker.py）预留的连接数
+    未显式配置时，异步处理模式下按一个默认工作进程估算：每个处理线程一个连接 + 2个溢出
+    """
+    if settings.DB_WORKER_CONNECTIONS >= 0:
+        return settings.DB_WORKER_CONNECTIONS
+    if settings.IMAGE_PROCESSING_MODE == "queue":
+        return detect_cpu_count() + 2
+    return 0
+
+def configure_production_env(workers):
+    """
+    在导入数据库模块之前设置每个进程的连接池大小（config已加载.env），工作进程继承这些设置
+    连接预算是单个数据库服务器的连接数：先扣除worker.py的连接，再平均分给Web工作进程；
+    只读副本的连接池使用相同的每进程大小，每个副本服务器上的连接数同样不超过预算
+    """
+    from config import settings
+    
+    budget = settings.DB_CONNECTION_BUDGET
+    reserved = reserved_worker_connections(settings)
+    pool_size, max_overflow = compute_pool_sizes(workers, budget - reserved)
+    if (pool_size + max_overflow) * workers + reserved > budget:
+        print(f"⚠️  连接预算 {budget}（预留工作进程 {reserved}）不足以支撑 {workers} 个Web工作进程，每进程至少需要2个连接")
+    # 已导入的settings和之后启动的子进程（uvicorn多进程模式）都使用新的连接池大小
+    settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW = pool_size, max_overflow
+    os.environ["DB_POOL_SIZE"] = str(pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = str(max_overflow)
+    # 多进程下各进程的内存索引需要定期同步其他进程的写入
+    if not os.getenv("INDEX_REFRESH_SECONDS"):
+        settings.INDEX_REFRESH_SECONDS = 60
+        os.environ["INDEX_REFRESH_SECONDS"] = "60"
+    print(
+        f"✓ Web工作进程: {workers}，每进程连接池: {pool_size} + 溢出 {max_overflow}"
+        f"（总预算 {budget}，预留工作进程 {reserved}）"
+    )
+
+def run_production(workers, port):
+    """
+    使用gunicorn管理多个uvicorn工作进程：
+    支持预加载应用、处理一定请求数后平滑重启工作进程（限制图片处理带来的内存增长）
+    """
+    from config import settings
+    
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        # 没有gunicorn时退回uvicorn多进程（不支持预加载和按请求数重启）
+        print("⚠️  未安装gunicorn，使用uvicorn多进程模式（不支持预加载和工作进程回收）")
+        import uvicorn
+        uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers)
+        return
+    
+    def post_fork(server, worker):
+        # 预加载模式下连接池可能在主进程中创建，子进程不能复用父进程的连接（主库和只读副本）；
+        # 日志写出线程由logging_setup在fork后自动重建
+        from database import engine, replica_router
+        engine.dispose(close=False)
+        for replica in replica_router.engines:
+            replica.dispose(close=False)
+    
+    class ProductionApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+        
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+        
+        def load(self):
+            from main import app
+            return app
+    
+    options = {
+        "bind": f"0.0.0.0:{port}",
+        "workers": workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": settings.PRELOAD_APP,
+        "max_requests": settings.MAX_REQUESTS,
+        "max_requests_jitter": settings.MAX_REQUESTS_JITTER,
+        "graceful_timeout": 30,
+        "timeout": 60,
+        "post_fork": post_fork,
+    }
+    ProductionApplication(options).run()
+
 def main():
+    parser = argparse.ArgumentParser(description="车辆图片管理系统后端启动脚本")
+    parser.add_argument("--production", action="store_true", help="生产模式：多进程运行")
+    parser.add_argument("--workers", type=int, default=0, help="工作进程数（默认按CPU配额自动检测）")
+    args = parser.parse_args()
+    
+    workers = 1
+    if args.production:
+        # 先导入config加载.env，再读取进程数和连接预算
+        from config import settings
+        workers = args.workers or settings.WEB_CONCURRENCY or detect_cpu_count()
+        configure_production_env(workers)
+    
     print("🚗 车辆图片管理系统后端启动中...")
     print("=" * 50)
     
@@ -66,6 +203,7 @@ def main():
         print("1. 确保MySQL服务已启动")
         print("2. 创建数据库: CREATE DATABASE pic_db;")
         print("3. 在.env文件中配置数据库连接信息")
+        print("   或设置 DATABASE_URL=sqlite:///./car_pic.db 使用嵌入式SQLite（单机部署/本地测试）")
         sys.exit(1)
     
     # 初始化数据库和管理员用户
@@ -78,12 +216,19 @@ def main():
     print("📖 API文档: http://localhost:8000/docs")
     print("=" * 50)
     
-    # 启动服务器 - 简化配置避免Railway报错
-    import uvicorn
-    
     # 获取端口，Railway会提供PORT环境变量
     port = int(os.getenv("PORT", 8000))
     
+    if args.production:
+        # 启动检查使用过的连接不能被工作进程继承
+        from database import engine
+        engine.dispose()
+        run_production(workers, port)
+        return
+    
+    # 启动服务器 - 简化配置避免Railway报错
+    import uvicorn
+    
     # 使用最简单的配置，避免reload相关问题
     uvicorn.run(
         "main:app",
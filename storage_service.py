@@ -1,25 +1,146 @@
+import asyncio
 import base64
+import hashlib
+import logging
 import mimetypes
-from typing import Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Optional, Tuple
 from fastapi import UploadFile, HTTPException
-from PIL import Image
 import io
+from image_hash import dhash_bytes, hash_to_hex
+from image_quality import encode_adaptive
+from config import settings
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# 上传文件大小限制 (5MB)
+MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+
+# 原图压缩后的最大尺寸
+MAX_IMAGE_WIDTH = 1920
+MAX_IMAGE_HEIGHT = 1080
+
+# 图片格式对应的MIME类型
+FORMAT_MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "GIF": "image/gif",
+    "WEBP": "image/webp"
+}
+
+# MIME类型对应的对象扩展名
+MIME_EXTENSIONS = {mime_type: format_name.lower().replace("jpeg", "jpg") for format_name, mime_type in FORMAT_MIME_TYPES.items()}
+
+# 质量70%的JPEG每像素平均字节数（车辆照片经验值），用于预估压缩后大小
+JPEG_BYTES_PER_PIXEL = 0.15
+
+def sniff_image_format(header: bytes) -> Optional[str]:
+    """
+    根据文件头魔数判断图片格式，无法识别时返回None
+    """
+    if header.startswith(b'\xff\xd8\xff'):  # JPEG
+        return "JPEG"
+    elif header.startswith(b'\x89PNG\r\n\x1a\n'):  # PNG
+        return "PNG"
+    elif header.startswith(b'GIF87a') or header.startswith(b'GIF89a'):  # GIF
+        return "GIF"
+    elif header.startswith(b'RIFF') and header[8:12] == b'WEBP':  # WebP
+        return "WEBP"
+    return None
+
+# 原样保存JPEG时保留的APP段：APP0（JFIF）、APP2中的ICC色彩配置、APP14（Adobe色彩变换标记）
+# 其余APP段（EXIF/XMP可能包含拍摄位置、MPF附加图像等）和注释段与重新编码时一样被去除
+_KEEP_APP_MARKERS = {0xE0, 0xE2, 0xEE}
+
+def strip_jpeg_metadata(content: bytes) -> Optional[bytes]:
+    """
+    按段解析JPEG，去除元数据段和EOI之后的附加数据，不解码像素
+    文件结构异常时返回None
+    """
+    if not content.startswith(b'\xff\xd8'):
+        return None
+    
+    parts = [content[:2]]
+    position = 2
+    while position + 4 <= len(content):
+        if content[position] != 0xFF:
+            return None
+        marker = content[position + 1]
+        if marker == 0xFF:  # 填充字节
+            position += 1
+            continue
+        if marker == 0xDA:  # SOS：之后是熵编码数据（其中的0xFF都已转义），到第一个EOI为止
+            end = content.find(b'\xff\xd9', position)
+            if end == -1:
+                return None
+            parts.append(content[position:end + 2])
+            return b''.join(parts)
+        
+        length = int.from_bytes(content[position + 2:position + 4], "big")
+        end = position + 2 + length
+        if length < 2 or end > len(content):
+            return None
+        segment = content[position:end]
+        is_metadata = (0xE0 <= marker <= 0xEF and marker not in _KEEP_APP_MARKERS) or marker == 0xFE
+        if marker == 0xE2 and segment[4:16] != b'ICC_PROFILE\x00':
+            is_metadata = True
+        if not is_metadata:
+            parts.append(segment)
+        position = end
+    return None
+
+def to_data_url(content: Optional[bytes], mime_type: str = "image/jpeg") -> Optional[str]:
+    """
+    将图片字节编码为data URL（二进制存储模式下只在JSON接口边界编码）
+    """
+    if content is None:
+        return None
+    with tracing.span("image.base64", **{"image.bytes": len(content)}):
+        return f"data:{mime_type};base64,{base64.b64encode(content).decode('utf-8')}"
+
+def from_data_url(data_url: Optional[str]) -> Optional[bytes]:
+    """
+    从data URL解码出图片字节，格式不正确时返回None
+    """
+    if not data_url or ';base64,' not in data_url:
+        return None
+    return base64.b64decode(data_url.split(';base64,')[1])
 
 class StorageService:
     def __init__(self):
-        # BASE64存储不需要特殊配置
-        pass
+        # BASE64存储不需要特殊配置；图片处理线程池用于批量上传并行处理
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PROCESS_WORKERS,
+            thread_name_prefix="image-process"
+        )
+        # 处理流水线统计：处理总数、原样保存（跳过重新编码）数
+        self._stats_lock = threading.Lock()
+        self.processed_count = 0
+        self.passthrough_count = 0
     
     async def upload_file(self, upload_file: UploadFile) -> dict:
         """
-        上传文件并转换为BASE64（带压缩优化）
+        读取上传文件并处理（带压缩优化）
         返回格式: {
-            "base64_data": "BASE64编码的图片数据",
-            "thumbnail_data": "缩略图BASE64数据",
+            "content": "压缩后的图片字节",
+            "thumbnail_content": "缩略图字节",
             "mime_type": "图片MIME类型",
-            "size": "文件大小"
+            "size": "文件大小",
+            "width"/"height": "图片尺寸",
+            "sha256": "图片内容哈希",
+            "phash": "图片感知哈希（16位十六进制）",
+            "quality": "编码使用的JPEG质量"
         }
         """
+        content = await self.read_upload(upload_file)
+        return self.process_image(content)
+    
+    def _check_upload(self, upload_file: UploadFile):
+        """
+        校验上传文件的文件名和类型
+        """
         if not upload_file.filename:
             raise HTTPException(status_code=400, detail="文件名不能为空")
         
@@ -27,40 +148,321 @@ class StorageService:
         content_type = upload_file.content_type
         if not content_type or not content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="只允许上传图片文件")
+    
+    async def read_upload(self, upload_file: UploadFile) -> bytes:
+        """
+        校验并读取上传的图片文件
+        """
+        self._check_upload(upload_file)
         
         # 读取文件内容
-        content = await upload_file.read()
-        file_size = len(content)
+        with tracing.span("image.read") as span:
+            content = await upload_file.read()
+            file_size = len(content)
+            if span is not None:
+                span.set_attribute("image.bytes", file_size)
         
         # 检查文件大小 (限制为5MB)
-        max_size = 5 * 1024 * 1024  # 5MB
-        if file_size > max_size:
+        if file_size > MAX_UPLOAD_SIZE:
             raise HTTPException(status_code=400, detail="文件大小不能超过5MB")
         
-        # 压缩图片并转换为BASE64（质量70%，比缩略图稍好）
-        compressed_content = await self.compress_image(content, content_type, quality=70)
-        base64_data = base64.b64encode(compressed_content).decode('utf-8')
+        return content
+    
+    async def inspect_upload(self, upload_file: UploadFile) -> dict:
+        """
+        只解析文件头校验上传的图片，不读入整个文件、不解码像素
+        """
+        self._check_upload(upload_file)
         
-        # 构建完整的data URL格式（压缩后统一使用JPEG格式）
-        data_url = f"data:image/jpeg;base64,{base64_data}"
+        # 通过文件指针获取大小，不读取内容
+        file = upload_file.file
+        file_size = file.seek(0, io.SEEK_END)
+        file.seek(0)
+        if file_size > MAX_UPLOAD_SIZE:
+            raise HTTPException(status_code=400, detail="文件大小不能超过5MB")
         
-        # 生成缩略图
-        thumbnail_data = await self.create_thumbnail(compressed_content, "image/jpeg")
+        return self.inspect_image(file, file_size)
+    
+    def inspect_image(self, source: BinaryIO, file_size: int) -> dict:
+        """
+        检查魔数并通过惰性 Image.open + verify() 解析图片尺寸
+        返回格式: {
+            "format": "原图格式",
+            "width"/"height": "原图尺寸",
+            "output_width"/"output_height": "压缩后尺寸",
+            "mime_type": "压缩后MIME类型",
+            "size": "预估压缩后大小",
+            "original_size": "原文件大小"
+        }
+        """
+        from PIL import Image  # 延迟导入，Pillow在启动预热时加载
+        
+        image_format = sniff_image_format(source.read(16))
+        source.seek(0)
+        if image_format is None:
+            raise HTTPException(status_code=400, detail="不支持的图片格式")
+        
+        try:
+            # Image.open只解析文件头；verify()校验文件结构（如PNG的块校验和），同样不解码像素
+            image = Image.open(source)
+            width, height = image.size
+            image.verify()
+        except Exception:
+            raise HTTPException(status_code=400, detail="无法解析图片文件")
+        finally:
+            source.seek(0)
+        
+        # 按压缩流程的缩放规则计算输出尺寸
+        ratio = min(MAX_IMAGE_WIDTH / width, MAX_IMAGE_HEIGHT / height)
+        if ratio < 1:
+            output_width, output_height = int(width * ratio), int(height * ratio)
+        else:
+            output_width, output_height = width, height
+        
+        # 满足原样保存条件的JPEG，保存大小约等于原文件大小
+        if image_format == "JPEG" and self._meets_output_targets(width, height, file_size):
+            projected_size = file_size
+        else:
+            projected_size = int(output_width * output_height * JPEG_BYTES_PER_PIXEL)
         
         return {
-            "base64_data": data_url,
-            "thumbnail_data": thumbnail_data,
+            "format": image_format,
+            "original_mime_type": FORMAT_MIME_TYPES[image_format],
+            "width": width,
+            "height": height,
+            "output_width": output_width,
+            "output_height": output_height,
             "mime_type": "image/jpeg",
-            "size": len(compressed_content)
+            "size": projected_size,
+            "original_size": file_size
         }
     
+    @tracing.traced("image.process")
+    def process_image(self, content: bytes, strict: bool = False) -> dict:
+        """
+        图片处理流水线：压缩（已满足要求的JPEG原样保存）、生成缩略图、计算元数据和感知哈希
+        返回原始字节，按存储模式编码由调用方决定（BASE64只在需要时生成）
+        纯同步CPU操作，可以放到线程池中并行执行（Pillow编解码时会释放GIL）
+        strict=True 时图片无法解码会抛出异常，而不是原样保存
+        """
+        # 已满足输出要求的JPEG原样保存（去除元数据），避免重新编码的CPU开销和二次有损压缩
+        with tracing.span("image.passthrough_check"):
+            compressed_content = self._passthrough(content)
+        thumbnail_content = None
+        quality = None
+        if compressed_content is not None:
+            with tracing.span("image.thumbnail"):
+                thumbnail_content = self._thumbnail(compressed_content, target_bytes=settings.THUMBNAIL_TARGET_BYTES)
+            if thumbnail_content is None:
+                # 文件头正常但数据损坏，走完整处理流程（strict时由压缩步骤报错）
+                compressed_content = None
+        passthrough = compressed_content is not None
+        
+        if not passthrough:
+            # 压缩图片（质量70%，比缩略图稍好；adaptive模式下按目标大小选择质量）
+            compressed_content, quality = self._compress_image(
+                content, quality=70, strict=strict, target_bytes=settings.IMAGE_TARGET_BYTES
+            )
+        
+        # 记录图片元数据，之后列表、校验、统计时无需再次解析图片
+        with tracing.span("image.describe"):
+            metadata = self.describe_image(compressed_content)
+        
+        # 生成缩略图
+        if not passthrough:
+            with tracing.span("image.thumbnail"):
+                thumbnail_content = self._thumbnail(compressed_content, target_bytes=settings.THUMBNAIL_TARGET_BYTES)
+        
+        with self._stats_lock:
+            self.processed_count += 1
+            self.passthrough_count += passthrough
+        span = tracing.current_span()
+        if span is not None:
+            span.set_attribute("image.passthrough", passthrough)
+        
+        # 计算感知哈希，用于近似重复图片检测
+        with tracing.span("image.phash"):
+            phash_value = dhash_bytes(compressed_content)
+        
+        return {
+            "content": compressed_content,
+            "thumbnail_content": thumbnail_content,
+            "mime_type": metadata["mime_type"],  # 压缩后统一为JPEG，压缩失败时保留原格式
+            "size": metadata["size"],
+            "width": metadata["width"],
+            "height": metadata["height"],
+            "sha256": metadata["sha256"],
+            "phash": hash_to_hex(phash_value) if phash_value is not None else None,
+            "quality": quality  # 编码使用的JPEG质量，原样保存或压缩失败时为None
+        }
+    
+    def _meets_output_targets(self, width: int, height: int, size: int) -> bool:
+        """尺寸在压缩限制内（压缩流程不会缩放）且每像素字节数不超过阈值（adaptive模式下还不能超过目标大小）"""
+        return (
+            settings.IMAGE_PASSTHROUGH
+            and width <= MAX_IMAGE_WIDTH and height <= MAX_IMAGE_HEIGHT
+            and size <= width * height * settings.IMAGE_PASSTHROUGH_MAX_BPP
+            and (settings.IMAGE_QUALITY_MODE != "adaptive" or size <= settings.IMAGE_TARGET_BYTES)
+        )
+    
+    def _passthrough(self, content: bytes) -> Optional[bytes]:
+        """
+        判断上传的JPEG能否原样保存：只解析文件头（尺寸、颜色模式）和文件大小，不解码像素
+        可以时返回去除元数据后的内容，否则返回None
+        """
+        if not settings.IMAGE_PASSTHROUGH or sniff_image_format(content[:16]) != "JPEG":
+            return None
+        
+        from PIL import Image  # 延迟导入，Pillow在启动预热时加载
+        
+        try:
+            image = Image.open(io.BytesIO(content))
+            width, height = image.size
+            mode = image.mode
+        except Exception:
+            return None
+        
+        # CMYK等模式在重新编码时会转换为RGB，不能原样保存
+        if mode not in ("RGB", "L"):
+            return None
+        
+        stripped = strip_jpeg_metadata(content)
+        if stripped is None or not self._meets_output_targets(width, height, len(stripped)):
+            return None
+        return stripped
+    
+    def metric_lines(self) -> list:
+        """Prometheus文本格式的图片处理统计"""
+        with self._stats_lock:
+            processed, passthrough = self.processed_count, self.passthrough_count
+        return [
+            "# HELP image_processed_total 处理的上传图片数",
+            "# TYPE image_processed_total counter",
+            f"image_processed_total {processed}",
+            "# HELP image_passthrough_total 已满足输出要求、跳过重新编码原样保存的图片数",
+            "# TYPE image_passthrough_total counter",
+            f"image_passthrough_total {passthrough}",
+            "# HELP image_passthrough_ratio 原样保存命中率",
+            "# TYPE image_passthrough_ratio gauge",
+            f"image_passthrough_ratio {passthrough / processed if processed else 0:.4f}"
+        ]
+    
+    def describe_image(self, content: bytes) -> dict:
+        """
+        计算图片元数据：尺寸（只解析文件头）、字节数、MIME类型和SHA-256内容哈希
+        """
+        from PIL import Image  # 延迟导入，Pillow在启动预热时加载
+        
+        width = height = None
+        try:
+            width, height = Image.open(io.BytesIO(content)).size
+        except Exception:
+            pass
+        
+        return {
+            "width": width,
+            "height": height,
+            "size": len(content),
+            "mime_type": FORMAT_MIME_TYPES.get(sniff_image_format(content[:16]), "image/jpeg"),
+            "sha256": hashlib.sha256(content).hexdigest()
+        }
+    
+    async def process_image_in_pool(self, content: bytes, strict: bool = False) -> dict:
+        """
+        在图片处理线程池中执行处理流水线，不阻塞事件循环
+        """
+        loop = asyncio.get_running_loop()
+        # 线程池不会自动继承contextvars，绑定当前上下文以延续链路
+        return await loop.run_in_executor(self._executor, tracing.bind_context(self.process_image), content, strict)
+    
+    @tracing.traced("image.store")
+    def store_image(self, content: bytes, strict: bool = False) -> dict:
+        """
+        处理图片并按存储模式保存
+        object模式下把图片和缩略图写入对象存储，结果中增加 image_key / thumbnail_key
+        """
+        result = self.process_image(content, strict=strict)
+        if settings.IMAGE_STORAGE_MODE == "object":
+            result["image_key"] = self.put_object("cars/", result["content"], result["mime_type"])
+            result["thumbnail_key"] = (
+                self.put_object("thumbnails/", result["thumbnail_content"], "image/jpeg")
+                if result["thumbnail_content"] else None
+            )
+        return result
+    
+    async def store_image_in_pool(self, content: bytes, strict: bool = False) -> dict:
+        """
+        在图片处理线程池中处理并保存图片（对象存储的网络写入同样不阻塞事件循环）
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, tracing.bind_context(self.store_image), content, strict)
+    
+    async def save_upload(self, upload_file: UploadFile) -> dict:
+        """
+        读取上传文件，处理并按存储模式保存
+        """
+        content = await self.read_upload(upload_file)
+        return await self.store_image_in_pool(content)
+    
+    def put_object(self, prefix: str, content: bytes, mime_type: str) -> str:
+        """
+        写入对象存储，返回对象键
+        """
+        from object_storage import get_object_storage
+        
+        storage = get_object_storage()
+        key = storage.new_key(prefix, extension=MIME_EXTENSIONS.get(mime_type, "bin"))
+        with tracing.span("object_storage.put", kind=tracing.KIND_CLIENT, **{"object.key": key, "object.bytes": len(content)}):
+            storage.put(key, content, mime_type)
+        return key
+    
+    def render_thumbnail(self, image_content: bytes) -> Optional[bytes]:
+        """
+        生成JPEG缩略图字节，失败时返回None
+        """
+        return self._thumbnail(image_content, target_bytes=settings.THUMBNAIL_TARGET_BYTES)
+    
     async def create_thumbnail(self, image_content: bytes, mime_type: str, max_width: int = 300, max_height: int = 200, quality: int = 85) -> str:
         """
-        创建缩略图
+        创建缩略图（返回data URL）
         """
+        return to_data_url(self._thumbnail(image_content, max_width, max_height, quality))
+    
+    def _encode(self, image, quality: int, target_bytes: int = None) -> Tuple[bytes, int]:
+        """
+        编码为JPEG，返回 (内容, 使用的质量)
+        adaptive模式且给定目标大小时搜索质量（复用已解码的图像，只重复编码），否则使用固定质量
+        """
+        if target_bytes and settings.IMAGE_QUALITY_MODE == "adaptive":
+            result = encode_adaptive(
+                image, target_bytes,
+                ssim_floor=settings.IMAGE_SSIM_FLOOR,
+                min_quality=settings.IMAGE_MIN_QUALITY,
+                max_quality=settings.IMAGE_MAX_QUALITY,
+                max_iterations=settings.IMAGE_QUALITY_MAX_ITERATIONS,
+                time_budget=settings.IMAGE_QUALITY_TIME_BUDGET_MS / 1000
+            )
+            content, quality, iterations = result["content"], result["quality"], result["iterations"]
+        else:
+            output = io.BytesIO()
+            image.save(output, format='JPEG', quality=quality, optimize=True)
+            content, iterations = output.getvalue(), 1
+        
+        span = tracing.current_span()
+        if span is not None:
+            span.set_attribute("image.quality", quality)
+            span.set_attribute("image.encode_iterations", iterations)
+        return content, quality
+    
+    def _thumbnail(self, image_content: bytes, max_width: int = 300, max_height: int = 200, quality: int = 85, target_bytes: int = None) -> Optional[bytes]:
+        from PIL import Image  # 延迟导入，Pillow在启动预热时加载
+        
         try:
             # 使用PIL打开图片
             image = Image.open(io.BytesIO(image_content))
+            # JPEG按DCT缩放解码（1/2~1/8），只解出不小于缩略图尺寸的图像
+            if image.format == 'JPEG':
+                image.draft('RGB', (max_width, max_height))
             
             # 转换为RGB模式（如果是RGBA，去除透明通道）
             if image.mode in ('RGBA', 'LA', 'P'):
@@ -90,39 +492,47 @@ class StorageService:
             image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
             
             # 保存为JPEG格式的缩略图
-            output = io.BytesIO()
-            image.save(output, format='JPEG', quality=quality, optimize=True)
-            thumbnail_content = output.getvalue()
-            
-            # 转换为BASE64
-            thumbnail_base64 = base64.b64encode(thumbnail_content).decode('utf-8')
-            thumbnail_data_url = f"data:image/jpeg;base64,{thumbnail_base64}"
+            thumbnail_content, _ = self._encode(image, quality, target_bytes)
             
-            return thumbnail_data_url
+            return thumbnail_content
             
         except Exception as e:
             # 如果缩略图生成失败，返回None
-            print(f"生成缩略图失败: {e}")
+            logger.warning(f"生成缩略图失败: {e}")
             return None
     
     async def compress_image(self, image_content: bytes, mime_type: str, quality: int = 50, max_width: int = 1920, max_height: int = 1080) -> bytes:
         """
         压缩图片，降低质量以减小文件大小
         """
+        return self._compress(image_content, quality, max_width, max_height)
+    
+    def _compress(self, image_content: bytes, quality: int = 50, max_width: int = MAX_IMAGE_WIDTH, max_height: int = MAX_IMAGE_HEIGHT, strict: bool = False) -> bytes:
+        return self._compress_image(image_content, quality, max_width, max_height, strict)[0]
+    
+    def _compress_image(self, image_content: bytes, quality: int = 50, max_width: int = MAX_IMAGE_WIDTH, max_height: int = MAX_IMAGE_HEIGHT,
+                        strict: bool = False, target_bytes: int = None) -> Tuple[bytes, Optional[int]]:
+        """
+        压缩图片，返回 (压缩后内容, 使用的JPEG质量)；压缩失败且非strict时返回 (原始内容, None)
+        """
+        from PIL import Image  # 延迟导入，Pillow在启动预热时加载
+        
         try:
-            # 使用PIL打开图片
-            image = Image.open(io.BytesIO(image_content))
-            
-            # 转换为RGB模式（如果是RGBA，去除透明通道）
-            if image.mode in ('RGBA', 'LA', 'P'):
-                # 创建白色背景
-                background = Image.new('RGB', image.size, (255, 255, 255))
-                if image.mode == 'P':
-                    image = image.convert('RGBA')
-                background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-                image = background
-            elif image.mode != 'RGB':
-                image = image.convert('RGB')
+            with tracing.span("image.decode", **{"image.bytes": len(image_content)}):
+                # 使用PIL打开图片（load()立即解码像素，使解码耗时计入本阶段）
+                image = Image.open(io.BytesIO(image_content))
+                image.load()
+                
+                # 转换为RGB模式（如果是RGBA，去除透明通道）
+                if image.mode in ('RGBA', 'LA', 'P'):
+                    # 创建白色背景
+                    background = Image.new('RGB', image.size, (255, 255, 255))
+                    if image.mode == 'P':
+                        image = image.convert('RGBA')
+                    background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
+                    image = background
+                elif image.mode != 'RGB':
+                    image = image.convert('RGB')
             
             # 计算缩放比例（如果图片太大）
             width, height = image.size
@@ -134,25 +544,45 @@ class StorageService:
             if ratio < 1:
                 new_width = int(width * ratio)
                 new_height = int(height * ratio)
-                image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                with tracing.span("image.resize", **{"image.width": new_width, "image.height": new_height}):
+                    image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
             
             # 保存为JPEG格式，使用指定的质量参数
-            output = io.BytesIO()
-            image.save(output, format='JPEG', quality=quality, optimize=True)
-            compressed_content = output.getvalue()
+            with tracing.span("image.encode"):
+                compressed_content, quality = self._encode(image, quality, target_bytes)
             
-            return compressed_content
+            return compressed_content, quality
             
         except Exception as e:
+            if strict:
+                raise HTTPException(status_code=400, detail="无法解析图片文件")
             # 如果压缩失败，返回原始内容
-            print(f"图片压缩失败: {e}")
-            return image_content
+            logger.warning(f"图片压缩失败: {e}")
+            return image_content, None
     
     async def delete_file(self, file_key: str) -> bool:
         """
-        删除文件（BASE64存储中此操作无意义，总是返回True）
+        删除对象存储中的文件（BASE64和二进制存储中此操作无意义，总是返回True）
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, tracing.bind_context(self.delete_objects), [file_key])
+    
+    def delete_objects(self, keys) -> bool:
+        """
+        批量删除对象存储中的文件（忽略空键），失败只记录日志：数据库记录已删除，残留对象不影响访问
         """
-        return True
+        keys = [key for key in keys if key]
+        if not keys:
+            return True
+        
+        from object_storage import get_object_storage
+        
+        try:
+            get_object_storage().delete_many(keys)
+            return True
+        except Exception:
+            logger.exception(f"删除对象失败 {keys[:5]}")
+            return False
     
     def get_file_url(self, base64_data: str) -> str:
         """
@@ -178,16 +608,7 @@ class StorageService:
             decoded = base64.b64decode(base64_part)
             
             # 检查是否为有效的图片格式（简单检查文件头）
-            if decoded.startswith(b'\xff\xd8\xff'):  # JPEG
-                return True
-            elif decoded.startswith(b'\x89PNG\r\n\x1a\n'):  # PNG
-                return True
-            elif decoded.startswith(b'GIF87a') or decoded.startswith(b'GIF89a'):  # GIF
-                return True
-            elif decoded.startswith(b'RIFF') and b'WEBP' in decoded[:12]:  # WebP
-                return True
-            
-            return False
+            return sniff_image_format(decoded[:16]) is not None
             
         except Exception:
             return False
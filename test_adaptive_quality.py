@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+测试按目标大小自适应选择JPEG质量
+"""
+
+import io
+import os
+import random
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageDraw, ImageFilter
+from config import settings
+import image_quality
+from image_quality import encode_adaptive, encode_jpeg
+from storage_service import StorageService
+
+def plain_car():
+    image = Image.new("RGB", (1600, 900), (255, 255, 255))
+    ImageDraw.Draw(image).rectangle([400, 300, 1200, 650], fill=(180, 20, 20))
+    return image
+
+def busy_street():
+    random.seed(7)
+    image = Image.new("RGB", (1920, 1080), (120, 130, 140))
+    draw = ImageDraw.Draw(image)
+    for _ in range(3000):
+        x, y = random.randrange(1920), random.randrange(1080)
+        draw.rectangle([x, y, x + random.randrange(5, 80), y + random.randrange(5, 80)],
+                       fill=tuple(random.randrange(256) for _ in range(3)))
+    return image.filter(ImageFilter.GaussianBlur(1))
+
+def test_adaptive_quality():
+    print("🧪 测试自适应JPEG质量...")
+
+    # 1. 简单图片在最高质量下已满足预算，只编码一次
+    result = encode_adaptive(plain_car(), target_bytes=200000)
+    assert result["quality"] == 85 and result["iterations"] == 1
+    print("   ✓ 预算内直接使用最高质量")
+
+    # 2. 复杂图片搜索到不超过目标大小的最高质量
+    busy = busy_street()
+    result = encode_adaptive(busy, target_bytes=180000, max_iterations=8, time_budget=5)
+    size = len(result["content"])
+    assert size <= 180000 and (size >= 180000 * 0.95 or len(encode_jpeg(busy, result["quality"] + 1)) > 180000)
+    assert result["iterations"] <= 8
+    print(f"   ✓ 目标大小搜索: 质量{result['quality']}，{len(result['content']) // 1024}KB，编码{result['iterations']}次")
+
+    # 3. SSIM下限优先于目标大小
+    floor = encode_adaptive(busy, target_bytes=100000, ssim_floor=0.99, max_iterations=10, time_budget=5)
+    assert floor["quality"] > 40 and floor["ssim"] >= 0.99
+    print(f"   ✓ 画质下限: 质量提高到{floor['quality']}（SSIM {floor['ssim']:.3f}）")
+
+    # 4. 编码次数和耗时上限
+    started = time.monotonic()
+    capped = encode_adaptive(busy, target_bytes=1000, ssim_floor=0.999, max_iterations=3, time_budget=0.05)
+    assert capped["iterations"] <= 3 and time.monotonic() - started < 1
+    print("   ✓ 编码次数/耗时上限")
+
+    # 5. SSIM评估的耗时计入时间上限：预计来不及评估时跳过，评估变慢后不再继续提高质量
+    original_ssim, original_estimate = image_quality.ssim, image_quality._ssim_seconds
+    calls = []
+
+    def slow_ssim(*args):
+        calls.append(args)
+        time.sleep(0.2)
+        return 0.5
+
+    image_quality.ssim = slow_ssim
+    try:
+        image_quality._ssim_seconds = 1.0
+        skipped = encode_adaptive(busy, target_bytes=100000, ssim_floor=0.99, max_iterations=10, time_budget=0.5)
+        assert not calls and skipped["ssim"] is None and skipped["quality"] < 85
+        image_quality._ssim_seconds = 0.01
+        started = time.monotonic()
+        encode_adaptive(busy, target_bytes=100000, ssim_floor=0.99, max_iterations=10, time_budget=0.5)
+        assert len(calls) <= 2 and time.monotonic() - started < 0.5 + 0.2
+        assert image_quality._ssim_seconds > 0.05
+    finally:
+        image_quality.ssim, image_quality._ssim_seconds = original_ssim, original_estimate
+    print(f"   ✓ SSIM耗时计入上限（慢速评估{len(calls)}次）")
+
+    # 6. 处理流水线记录所用质量
+    original_mode = settings.IMAGE_QUALITY_MODE
+    settings.IMAGE_QUALITY_MODE = "adaptive"
+    try:
+        output = io.BytesIO()
+        busy.save(output, format="PNG")
+        result = StorageService().process_image(output.getvalue())
+        assert result["quality"] is not None and result["size"] <= settings.IMAGE_TARGET_BYTES
+        assert len(result["thumbnail_content"]) <= settings.THUMBNAIL_TARGET_BYTES
+    finally:
+        settings.IMAGE_QUALITY_MODE = original_mode
+    print(f"   ✓ 流水线记录质量: {result['quality']}")
+
+if __name__ == "__main__":
+    test_adaptive_quality()
+    print("\n✅ 自适应JPEG质量测试完成！")
\ No newline at end of file
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+测试批量管理操作：按ID/区域/时间筛选、分块事务、区域计数、空条件保护、目标区域校验
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+import crud
+import models
+import schemas
+import testing
+
+def create_session():
+    db = testing.create_session(("南山", "福田", "宝安"))
+    db.add_all([models.Car(region="南山" if index % 3 else "福田", description=f"车辆{index}") for index in range(12)])
+    db.commit()
+    crud.refresh_region_counts(db)
+    return db
+
+def expect_400(func, *args):
+    try:
+        func(*args)
+    except HTTPException as e:
+        assert e.status_code == 400
+        return e.detail
+    raise AssertionError("应该返回400")
+
+def test_batch_operations():
+    print("🧪 测试批量管理操作...")
+    db = create_session()
+    original_chunk_size = crud.BATCH_CHUNK_SIZE
+    crud.BATCH_CHUNK_SIZE = 3
+    try:
+        # 1. 没有筛选条件或ids为空列表时拒绝执行，不会作用于全表
+        expect_400(crud.batch_delete_cars, db, schemas.CarBatchFilter())
+        assert expect_400(crud.batch_delete_cars, db, schemas.CarBatchFilter(ids=[])) == "ids不能为空列表"
+        assert expect_400(crud.batch_update_cars, db, schemas.CarBatchFilter(ids=[]), {"contact": "x"}) == "ids不能为空列表"
+        expect_400(crud.batch_update_cars, db, schemas.CarBatchFilter(region="南山"), {})
+        assert db.query(models.Car).count() == 12
+        print("   ✓ 空条件保护")
+
+        # 2. 移动到不存在的区域时拒绝执行，车辆和区域计数不变
+        assert expect_400(crud.batch_update_cars, db, schemas.CarBatchFilter(region="南山"), {"region": "火星"}) == "区域不存在: 火星"
+        assert db.query(models.Car).filter(models.Car.region == "南山").count() == 8
+        assert crud.get_regions(db, with_counts=True)["counts"] == {"南山": 8, "福田": 4, "宝安": 0}
+        print("   ✓ 拒绝移动到不存在的区域")
+
+        # 3. 按区域批量移动，分块提交，区域计数同步调整
+        result = crud.batch_update_cars(db, schemas.CarBatchFilter(region="南山"), {"region": "宝安"})
+        assert result["affected"] == 8
+        assert db.query(models.Car).filter(models.Car.region == "宝安").count() == 8
+        assert crud.get_regions(db, with_counts=True)["counts"] == {"南山": 0, "福田": 4, "宝安": 8}
+        print("   ✓ 批量移动区域（分块事务）")
+
+        # 4. 按ID批量修改描述，ID和区域条件同时生效
+        ids = [car_id for (car_id,) in db.query(models.Car.id).order_by(models.Car.id).limit(5)]
+        result = crud.batch_update_cars(db, schemas.CarBatchFilter(ids=ids, region="福田"), {"description": "已售"})
+        assert result["affected"] == db.query(models.Car).filter(models.Car.id.in_(ids), models.Car.region == "福田").count()
+        assert db.query(models.Car).filter(models.Car.description == "已售").count() == result["affected"]
+        print("   ✓ 按ID和条件批量修改")
+
+        # 5. 批量删除，跨多个分块，区域计数同步扣减
+        result = crud.batch_delete_cars(db, schemas.CarBatchFilter(region="宝安"))
+        assert result["affected"] == 8 and db.query(models.Car).count() == 4
+        result = crud.batch_delete_cars(db, schemas.CarBatchFilter(ids=ids))
+        assert db.query(models.Car).count() == 4 - result["affected"]
+        counts = crud.get_regions(db, with_counts=True)["counts"]
+        assert counts == {"南山": 0, "福田": db.query(models.Car).count(), "宝安": 0}
+        print("   ✓ 批量删除")
+    finally:
+        crud.BATCH_CHUNK_SIZE = original_chunk_size
+
+if __name__ == "__main__":
+    test_batch_operations()
+    print("\n✅ 批量管理操作测试完成！")
\ No newline at end of file
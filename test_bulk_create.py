@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+测试批量创建车辆：一条多行INSERT写入、逐张图片的校验错误、事务原子性、不连续自增ID下的逐行写入
+"""
+
+import asyncio
+import os
+import sys
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, insert
+from sqlalchemy.dialects import mysql
+import crud
+import models
+from testing import make_jpeg, make_upload, create_session
+
+REGIONS = ("南山", "福田")
+
+def test_bulk_create():
+    print("🧪 测试批量创建车辆...")
+    db = create_session(REGIONS)
+    engine = db.get_bind()
+    statements = []
+    threads = set()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+        if statement.startswith("INSERT INTO cars"):
+            threads.add(threading.get_ident())
+
+    # 1. 有效图片用一条INSERT写入，无效图片逐项返回错误
+    items = [
+        {"region": "南山", "contact": "a", "description": "第一辆", "image": make_upload(make_jpeg(color=(200, 30, 30)))},
+        {"region": "南山", "image": make_upload(b"not an image")},
+        {"region": "福田", "image": make_upload(make_jpeg(color=(30, 200, 30)), content_type="text/plain")},
+        {"region": "福田", "description": "第四辆", "image": make_upload(make_jpeg(color=(30, 30, 200)))},
+    ]
+    result = asyncio.run(crud.create_cars_bulk(db, items))
+    assert result["created"] == 2 and result["failed"] == 2
+    assert [item["success"] for item in result["results"]] == [True, False, False, True]
+    assert result["results"][1]["error"] and result["results"][2]["error"] == "只允许上传图片文件"
+    inserts = [statement for statement in statements if statement.startswith("INSERT INTO cars")]
+    assert len(inserts) == 1 and threading.get_ident() not in threads
+    print("   ✓ 一条多行INSERT在线程池中写入，逐张返回校验错误")
+
+    # 2. 返回的ID与输入顺序对应，区域计数随之更新
+    ids = [item["id"] for item in result["results"] if item["success"]]
+    rows = {row.id: row for row in db.query(models.Car.id, models.Car.region, models.Car.description)}
+    assert [rows[car_id].description for car_id in ids] == ["第一辆", "第四辆"]
+    assert crud.get_regions(db, with_counts=True)["counts"] == {"南山": 1, "福田": 1}
+    print("   ✓ ID按输入顺序返回，区域计数已更新")
+
+    # 3. 写入失败时整批回滚，车辆和区域计数都不变
+    original = crud._adjust_region_counts
+
+    def failing(db, deltas):
+        original(db, deltas)
+        raise RuntimeError("模拟写入失败")
+
+    crud._adjust_region_counts = failing
+    try:
+        asyncio.run(crud.create_cars_bulk(db, [{"region": "南山", "image": make_upload(make_jpeg(color=(90, 90, 90)))}]))
+        raise AssertionError("写入失败应该抛出异常")
+    except RuntimeError:
+        pass
+    finally:
+        crud._adjust_region_counts = original
+    assert db.query(models.Car).count() == 2
+    assert crud.get_regions(db, with_counts=True)["counts"] == {"南山": 1, "福田": 1}
+    print("   ✓ 写入失败整批回滚")
+
+    # 4. MySQL没有RETURNING，编译为一条多行INSERT
+    rows = [{"region": "南山", "description": str(index)} for index in range(3)]
+    sql = str(insert(models.Car.__table__).values(rows).compile(dialect=mysql.dialect()))
+    assert sql.count("INSERT INTO cars") == 1 and sql.count("), (") == 2
+    print("   ✓ MySQL下为一条多行INSERT")
+
+class FakeMySQLSession:
+    """只返回自增配置的会话"""
+
+    def __init__(self, increment, lock_mode):
+        self.row = (increment, lock_mode)
+        self.bind = type("Bind", (), {"dialect": mysql.dialect(), "url": f"mysql://fake/{increment}-{lock_mode}"})()
+
+    def get_bind(self):
+        return self.bind
+
+    def execute(self, statement):
+        return type("Result", (), {"one": lambda result: self.row})()
+
+def test_non_consecutive_ids():
+    print("🧪 测试自增ID不连续时的批量写入...")
+
+    # 1. 只有步长为1且lock_mode为0/1时按连续ID推算
+    assert crud._multirow_ids_consecutive(FakeMySQLSession(1, 1))
+    assert not crud._multirow_ids_consecutive(FakeMySQLSession(1, 2))
+    assert not crud._multirow_ids_consecutive(FakeMySQLSession(2, 1))
+    print("   ✓ 检查auto_increment_increment和innodb_autoinc_lock_mode")
+
+    # 2. 没有RETURNING且不保证连续时逐行写入，ID仍与输入顺序对应
+    db = create_session(REGIONS)
+    engine = db.get_bind()
+    engine.dialect.insert_returning = False
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO cars (region, description) VALUES ('福田', '已有')")
+    items = [{"region": "南山", "description": f"第{index}辆", "image": make_upload(make_jpeg(color=(index * 60, 30, 30)))} for index in range(3)]
+    result = asyncio.run(crud.create_cars_bulk(db, items))
+    ids = [item["id"] for item in result["results"]]
+    assert [db.get(models.Car, car_id).description for car_id in ids] == ["第0辆", "第1辆", "第2辆"]
+    print("   ✓ 逐行写入返回各自的ID")
+
+if __name__ == "__main__":
+    test_bulk_create()
+    test_non_consecutive_ids()
+    print("\n✅ 批量创建车辆测试完成！")
\ No newline at end of file
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+测试共享缓存后端：值编码、内存/磁盘/Redis后端、带版本号的跨进程失效、熔断和失效重试
+Redis后端默认使用fakeredis，也可以通过 TEST_REDIS_URL 指向本地Redis
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cache_backend import CircuitBreaker, MemoryBackend, DiskBackend, RedisBackend, VersionedCache, dumps, loads
+
+class FlakyBackend(MemoryBackend):
+    """模拟阻塞的共享后端：记录调用线程，可以切换为故障状态"""
+
+    blocking = True
+
+    def __init__(self):
+        super().__init__()
+        self.failing = False
+        self.calls = 0
+        self.threads = set()
+
+    def _access(self):
+        self.calls += 1
+        self.threads.add(threading.get_ident())
+        if self.failing:
+            raise ConnectionError("后端不可用")
+
+    def get_many(self, keys):
+        self._access()
+        return super().get_many(keys)
+
+    def set(self, key, value, ttl):
+        self._access()
+        super().set(key, value, ttl)
+
+    def delete(self, *keys):
+        self._access()
+        super().delete(*keys)
+
+    def bump(self, key):
+        self._access()
+        return super().bump(key)
+
+def check_backend(name, first, second=None):
+    """first和second模拟两个工作进程各自的后端实例（指向同一份数据）"""
+    second = second or first
+    prefix = f"test-{os.getpid()}-{time.time()}:"
+    worker_a = VersionedCache(first, "pages", ttl=0.3, prefix=prefix)
+    worker_b = VersionedCache(second, "pages", ttl=0.3, prefix=prefix)
+
+    # 1. 写入后另一个进程可以读到
+    worker_a.set("page1", (b"{}", '"etag"'))
+    assert worker_b.get("page1") == (b"{}", '"etag"')
+
+    # 2. 一个进程失效，所有进程都读不到旧条目
+    version, _ = worker_b.lookup("page1")
+    worker_a.invalidate()
+    assert worker_b.get("page1") is None and worker_a.get("page1") is None
+
+    # 3. 失效前读取的版本写入的条目直接过时
+    worker_b.set("page1", "stale", version=version)
+    assert worker_a.get("page1") is None
+    worker_b.set("page1", "fresh")
+    assert worker_a.get("page1") == "fresh"
+
+    # 4. 单个键删除和过期
+    worker_a.set("page2", "x")
+    worker_b.delete("page2")
+    assert worker_a.get("page2") is None
+    time.sleep(0.35)
+    assert worker_a.get("page1") is None
+    assert worker_a.errors == 0 and worker_b.errors == 0
+    print(f"   ✓ {name}")
+
+def test_codec():
+    print("🧪 测试缓存值编码...")
+    thumbnail = os.urandom(15000)
+    assert loads(dumps(thumbnail)) == thumbnail and len(dumps(thumbnail)) == len(thumbnail) + 1
+    value = (b"\x00body", "ETag", {"regions": ["南山"]}, ())
+    assert loads(dumps(value)) == (b"\x00body", "ETag", {"regions": ["南山"]}, ())
+    try:
+        loads(b"\x80\x04pickle")
+        raise AssertionError("未知类型应该报错")
+    except ValueError:
+        pass
+    print("   ✓ bytes原样保存，不使用pickle")
+
+def test_backends():
+    print("🧪 测试缓存后端...")
+    check_backend("内存后端", MemoryBackend())
+
+    path = tempfile.mkdtemp()
+    check_backend("磁盘后端（两个进程共享目录）", DiskBackend(path), DiskBackend(path))
+    disk = DiskBackend(path)
+    disk.set("expired", b"x", 0.01)
+    time.sleep(0.02)
+    assert disk.sweep() >= 1
+
+    # 内存后端按总字节数淘汰最久未使用的条目
+    memory = MemoryBackend(max_bytes=4000)
+    for index in range(5):
+        memory.set(f"k{index}", b"x" * 900, 60)
+    assert memory.get_many(["k0", "k4"]) == [None, b"x" * 900]
+
+def test_redis_backend():
+    print("🧪 测试Redis缓存后端...")
+    if os.getenv("TEST_REDIS_URL"):
+        check_backend("Redis后端", RedisBackend(os.getenv("TEST_REDIS_URL")), RedisBackend(os.getenv("TEST_REDIS_URL")))
+    else:
+        try:
+            import fakeredis
+        except ImportError:
+            print("   跳过：未安装fakeredis，且未设置TEST_REDIS_URL")
+            return
+        server = fakeredis.FakeServer()
+        check_backend("Redis后端（两个客户端）", RedisBackend(client=fakeredis.FakeRedis(server=server)),
+                      RedisBackend(client=fakeredis.FakeRedis(server=server)))
+
+    # Redis不可用时按未命中处理
+    unavailable = VersionedCache(RedisBackend("redis://127.0.0.1:1/0"), "pages")
+    assert unavailable.get("page1") is None
+    unavailable.set("page1", "x")
+    unavailable.invalidate()
+    assert unavailable.errors == 3
+    print("   ✓ 后端不可用时不影响调用方")
+
+def test_async_access():
+    print("🧪 测试异步访问阻塞后端...")
+    backend = FlakyBackend()
+    cache = VersionedCache(backend, "pages")
+
+    async def run():
+        await cache.aset("page1", b"body")
+        version, value = await cache.alookup("page1")
+        await cache.adelete("page1")
+        await cache.ainvalidate()
+        return threading.get_ident(), value, await cache.alookup("page1")
+
+    loop_thread, value, after = asyncio.run(run())
+    assert value == b"body" and after == (1, None)
+    assert loop_thread not in backend.threads
+    print("   ✓ 阻塞后端在线程池中访问")
+
+    # 内存后端不需要切换线程
+    memory = VersionedCache(MemoryBackend(), "pages")
+    asyncio.run(memory.aset("page1", "x"))
+    assert asyncio.run(memory.alookup("page1")) == (0, "x")
+    print("   ✓ 内存后端直接访问")
+
+def test_circuit_breaker():
+    print("🧪 测试缓存后端熔断与失效重试...")
+    backend = FlakyBackend()
+    cache = VersionedCache(backend, "pages", breaker=CircuitBreaker(max_failures=2, reset_seconds=0.1))
+    cache.set("page1", "old")
+    cache.set("thumb", "old")
+
+    # 1. 连续失败后熔断，期间不访问后端
+    backend.failing = True
+    assert cache.get("page1") is None and cache.get("page1") is None
+    assert cache.breaker.is_open and cache.errors == 2
+    calls = backend.calls
+    assert cache.get("page1") is None
+    cache.set("page1", "new")
+    assert backend.calls == calls and cache.bypassed == 2
+    print("   ✓ 连续失败后熔断，不再等待后端")
+
+    # 2. 熔断期间的失效和删除记为待重试，重试成功前不读取、不写入
+    cache.invalidate()
+    cache.delete("thumb")
+    assert cache.pending
+    backend.failing = False
+    assert cache.get("page1") is None
+    time.sleep(0.12)
+
+    # 3. 试探成功后先补做失效和删除，旧条目不会被读到
+    assert cache.get("page1") is None and not cache.pending and not cache.breaker.is_open
+    assert backend.get_many(["cache:pages:thumb"]) == [None]
+    cache.set("page1", "fresh")
+    assert cache.get("page1") == "fresh"
+    print("   ✓ 恢复后补做失效，不读到旧条目")
+
+    # 4. 试探失败时继续断开
+    backend.failing = True
+    cache.get("page1")
+    cache.get("page1")
+    assert cache.breaker.is_open and cache.breaker.trips == 2
+    time.sleep(0.12)
+    calls = backend.calls
+    assert cache.get("page1") is None and cache.get("page1") is None
+    assert backend.calls == calls + 1 and cache.breaker.is_open
+    print("   ✓ 半开状态只放行一次试探")
+
+if __name__ == "__main__":
+    test_codec()
+    test_backends()
+    test_redis_backend()
+    test_async_access()
+    test_circuit_breaker()
+    print("\n✅ 共享缓存后端测试完成！")
\ No newline at end of file
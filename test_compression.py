@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+测试响应压缩：编码协商、BASE64检测、二进制透传、按ETag缓存压缩结果和304
+"""
+
+import base64
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, Response
+from fastapi.testclient import TestClient
+from compression import ResponseCompressor, negotiate, base64_ratio, etag_matches
+
+def build_app(compressor):
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def compress_responses(request, call_next):
+        encoding = compressor.negotiate(request.headers.get("accept-encoding"))
+        if_none_match = request.headers.get("if-none-match") if request.method in ("GET", "HEAD") else None
+        return await compressor.process(await call_next(request), encoding, if_none_match)
+
+    @app.get("/metadata")
+    async def metadata():
+        cars = [{"id": index, "region": "南山", "description": "宝马X5 2020款 白色"} for index in range(100)]
+        return ORJSONResponse({"cars": cars}, headers={"ETag": '"v1"', "Set-Cookie": "a=1"})
+
+    @app.get("/image-json")
+    async def image_json():
+        return ORJSONResponse({"image_base64": "data:image/jpeg;base64," + base64.b64encode(os.urandom(200000)).decode()})
+
+    @app.get("/jpeg")
+    async def jpeg():
+        return Response(os.urandom(50000), media_type="image/jpeg", headers={"ETag": '"img"'})
+
+    return app
+
+def test_compression():
+    print("🧪 测试响应压缩...")
+
+    # 1. 编码协商
+    assert negotiate("gzip, deflate, br", ("br", "gzip")) == "br"
+    assert negotiate("br;q=0.5, gzip", ("br", "gzip")) == "gzip"
+    assert negotiate("gzip;q=0, *;q=0.1", ("gzip",)) is None
+    assert negotiate("*", ("gzip",)) == "gzip"
+    assert negotiate("identity", ("br", "gzip")) is None and negotiate(None) is None
+    print("   ✓ Accept-Encoding协商")
+
+    # 2. BASE64检测
+    assert base64_ratio(b'{"image":"data:image/jpeg;base64,' + base64.b64encode(os.urandom(300000)) + b'"}') > 0.99
+    assert base64_ratio('{"description":"宝马X5 白色 一手车"}'.encode() * 1000) == 0
+    print("   ✓ BASE64占比检测")
+
+    compressor = ResponseCompressor(min_bytes=512)
+    client = TestClient(build_app(compressor))
+
+    # 3. JSON元数据压缩，保留其他响应头，ETag区分压缩表示
+    response = client.get("/metadata", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip" and response.headers["etag"] == '"v1-gzip"'
+    assert int(response.headers["content-length"]) < len(response.content) / 5
+    assert response.headers["vary"] == "Accept-Encoding" and response.cookies["a"] == "1"
+    assert len(response.json()["cars"]) == 100
+    response = client.get("/metadata", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers and response.headers["etag"] == '"v1"'
+    print("   ✓ JSON元数据压缩")
+
+    # 4. BASE64为主的JSON和二进制图片不压缩
+    response = client.get("/image-json", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers and response.json()["image_base64"].startswith("data:")
+    response = client.get("/jpeg", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers and "vary" not in response.headers
+    assert compressor.skipped["base64"] == 1 and compressor.seconds < 0.05
+    print("   ✓ 图片和BASE64响应透传")
+
+    # 5. 相同ETag的响应复用压缩结果
+    for _ in range(3):
+        client.get("/metadata", headers={"Accept-Encoding": "gzip"})
+    assert compressor.cache_misses == 1 and compressor.cache_hits == 3 and compressor.compressed["gzip"] == 4
+    assert 'compression_cache_hits_total 3' in compressor.metric_lines()
+    print("   ✓ 按ETag缓存压缩结果")
+
+    # 6. If-None-Match匹配时返回304：压缩表示和原始表示的ETag、弱比较、列表和*
+    assert etag_matches('W/"v1", "v2"', ['"v2-gzip"', '"v2"']) == '"v2"'
+    assert etag_matches("*", ['"v1"']) == '"v1"' and etag_matches('"v3"', ['"v1"']) is None
+    compressed = compressor.compressed["gzip"]
+    response = client.get("/metadata", headers={"Accept-Encoding": "gzip", "If-None-Match": '"v1-gzip"'})
+    assert response.status_code == 304 and response.content == b"" and response.headers["etag"] == '"v1-gzip"'
+    assert response.headers["vary"] == "Accept-Encoding" and "content-length" not in response.headers
+    response = client.get("/metadata", headers={"Accept-Encoding": "identity", "If-None-Match": 'W/"v1"'})
+    assert response.status_code == 304 and response.headers["etag"] == '"v1"'
+    response = client.get("/jpeg", headers={"If-None-Match": '"other", "img"'})
+    assert response.status_code == 304 and response.headers["etag"] == '"img"'
+    assert compressor.compressed["gzip"] == compressed and compressor.not_modified == 3
+    response = client.get("/metadata", headers={"Accept-Encoding": "gzip", "If-None-Match": '"v0-gzip"'})
+    assert response.status_code == 200 and response.headers["etag"] == '"v1-gzip"'
+    assert 'compression_not_modified_total 3' in compressor.metric_lines()
+    print("   ✓ ETag未变化时返回304")
+
+if __name__ == "__main__":
+    test_compression()
+    print("\n✅ 响应压缩测试完成！")
\ No newline at end of file
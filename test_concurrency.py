@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+测试并发预算：名额转交、队列已满/排队超时返回503、指标输出
+"""
+
+import asyncio
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+import concurrency
+from concurrency import ConcurrencyBudget
+
+async def run_budget_checks():
+    budget = ConcurrencyBudget("test", limit=1, max_queue=1, queue_timeout=0.2, retry_after=3)
+    order = []
+
+    async def request(name, hold=0.05):
+        async for _ in budget():
+            order.append(name)
+            await asyncio.sleep(hold)
+
+    # 1. 超出并发的请求排队，依次执行；队列已满的请求立即被拒绝
+    first = asyncio.create_task(request("a"))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(request("b"))
+    await asyncio.sleep(0)
+    try:
+        await request("c")
+        raise AssertionError("队列已满时应该返回503")
+    except HTTPException as e:
+        assert e.status_code == 503 and e.headers["Retry-After"] == "3"
+    await asyncio.gather(first, second)
+    assert order == ["a", "b"] and budget.active == 0
+    print("   ✓ 排队执行与队列已满拒绝")
+
+    # 2. 排队超时返回503，取消的等待者不占用名额
+    holder = asyncio.create_task(request("slow", hold=0.5))
+    await asyncio.sleep(0)
+    try:
+        await request("late")
+        raise AssertionError("排队超时应该返回503")
+    except HTTPException as e:
+        assert e.status_code == 503
+    cancelled = asyncio.create_task(request("cancelled"))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.gather(cancelled, return_exceptions=True)
+    await holder
+    assert budget.active == 0 and budget.waiting == 0
+    assert budget.snapshot()["timed_out"] == 1 and budget.snapshot()["rejected"] == 1
+    print("   ✓ 排队超时与取消")
+
+    # 3. 作为上下文管理器只对部分代码路径限流
+    async with budget:
+        assert budget.active == 1
+    assert budget.active == 0
+    print("   ✓ async with 获取与释放")
+
+def test_concurrency():
+    print("🧪 测试并发预算...")
+    asyncio.run(run_budget_checks())
+
+    # 默认上限按连接池容量推导，总和不超过容量，并为轻量请求留出连接
+    for capacity in (3, 9, 30, 60):
+        limits = concurrency.derive_limits(capacity, image_workers=4)
+        assert sum(limits.values()) <= capacity and limits["upload"] <= 4
+        assert limits["read"] >= limits["image"] >= limits["upload"] >= 1
+    assert sum(concurrency.derive_limits(30, image_workers=4).values()) <= 30 - 2
+    print("   ✓ 按连接池容量推导并发上限")
+
+    lines = concurrency.metric_lines()
+    assert 'concurrency_limit{budget="upload"} ' + str(concurrency.upload_budget.limit) in lines
+    assert any(line.startswith('concurrency_rejected_total{budget="read"}') for line in lines)
+    print("   ✓ Prometheus指标")
+
+if __name__ == "__main__":
+    test_concurrency()
+    print("\n✅ 并发预算测试完成！")
\ No newline at end of file
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+测试图片感知哈希与相似度索引
+"""
+
+import io
+import random
+from PIL import Image, ImageDraw
+from image_hash import dhash_bytes, hash_to_hex, hamming_distance, BKTree, SimilarityIndex
+
+def make_jpeg(width, height, seed, quality=90, scale=1.0):
+    """生成带随机色块的测试图片（scale用于模拟重新缩放后的同一张图片）"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randint(0, width - 60), rng.randint(0, height - 60)
+        draw.rectangle([x, y, x + 60, y + 60], fill=(rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+    if scale != 1.0:
+        image = image.resize((int(width * scale), int(height * scale)), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=quality)
+    return output.getvalue()
+
+def test_dhash_near_duplicates():
+    """同一张图片重新压缩、缩放后哈希应接近，不同图片应相距较远"""
+    print("🧪 测试dHash近似重复识别...")
+    original = dhash_bytes(make_jpeg(800, 600, seed=1))
+    recompressed = dhash_bytes(make_jpeg(800, 600, seed=1, quality=40))
+    resized = dhash_bytes(make_jpeg(800, 600, seed=1, scale=0.6))
+    different = dhash_bytes(make_jpeg(800, 600, seed=2))
+
+    print(f"   重新压缩距离: {hamming_distance(original, recompressed)}")
+    print(f"   缩放距离: {hamming_distance(original, resized)}")
+    print(f"   不同图片距离: {hamming_distance(original, different)}")
+    assert hamming_distance(original, recompressed) <= 6
+    assert hamming_distance(original, resized) <= 10
+    assert hamming_distance(original, different) > 10
+    print("   ✓ dHash测试通过")
+
+def test_bk_tree_matches_linear_scan():
+    """BK树检索结果应与线性扫描一致"""
+    print("🧪 测试BK树检索...")
+    rng = random.Random(42)
+    hashes = {car_id: rng.getrandbits(64) for car_id in range(1, 2001)}
+    # 加入一批与7号车辆只差少量位的近似哈希
+    for car_id in range(2001, 2051):
+        hashes[car_id] = hashes[7] ^ rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64)
+    tree = BKTree()
+    for car_id, value in hashes.items():
+        tree.add(value, car_id)
+
+    query = hashes[7] ^ 0b1011
+    expected = sorted(
+        (hamming_distance(query, value), car_id)
+        for car_id, value in hashes.items()
+        if hamming_distance(query, value) <= 12
+    )
+    assert tree.search(query, 12) == expected
+    print(f"   ✓ 找到 {len(expected)} 条结果，与线性扫描一致")
+
+def test_similarity_index_incremental():
+    """相似度索引的增量更新与删除"""
+    print("🧪 测试相似度索引增量维护...")
+    index = SimilarityIndex()
+    index.rebuild([(1, hash_to_hex(0)), (2, hash_to_hex(0b111)), (3, None)])
+    assert index.find_similar(1, max_distance=3) == [(3, 2)]
+    assert index.find_similar(3) is None
+
+    index.update(3, hash_to_hex(0b1))
+    assert index.find_similar(1, max_distance=3) == [(1, 3), (3, 2)]
+
+    index.remove(2)
+    index.update(3, hash_to_hex(2 ** 64 - 1))
+    assert index.find_similar(1, max_distance=3) == []
+    assert len(index) == 2
+    print("   ✓ 增量维护测试通过")
+
+if __name__ == "__main__":
+    test_dhash_near_duplicates()
+    test_bk_tree_matches_linear_scan()
+    test_similarity_index_incremental()
+    print("\n✅ 图片相似度测试完成！")
\ No newline at end of file
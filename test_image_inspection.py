@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+测试只解析文件头的图片校验（/api/validate-image 默认的header模式）和完整处理的mode=full
+"""
+
+import asyncio
+import io
+import os
+import sys
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image
+from fastapi import HTTPException
+from storage_service import storage_service, MAX_UPLOAD_SIZE, JPEG_BYTES_PER_PIXEL
+import testing
+
+class CountingFile(io.BytesIO):
+    """记录实际读取的字节数"""
+
+    def __init__(self, content: bytes):
+        super().__init__(content)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+def encode(size, format_name, **params) -> bytes:
+    output = io.BytesIO()
+    image = Image.merge("RGB", (Image.linear_gradient("L").resize(size), Image.effect_noise(size, 20), Image.new("L", size, 90)))
+    image.save(output, format=format_name, **params)
+    return output.getvalue()
+
+def make_upload(content: bytes, content_type: str = "image/jpeg"):
+    return testing.make_upload(CountingFile(content), content_type)
+
+def inspect(content: bytes, content_type: str = "image/jpeg") -> dict:
+    return asyncio.run(storage_service.inspect_upload(make_upload(content, content_type)))
+
+def expect_400(content: bytes, content_type: str = "image/jpeg") -> str:
+    try:
+        inspect(content, content_type)
+    except HTTPException as e:
+        assert e.status_code == 400
+        return e.detail
+    raise AssertionError("应该返回400")
+
+def test_image_inspection():
+    print("🧪 测试文件头图片校验...")
+
+    # 1. 大图按压缩规则计算输出尺寸和预估大小，不读入整个文件
+    content = encode((3840, 2160), "JPEG", quality=95)
+    upload = make_upload(content)
+    info = asyncio.run(storage_service.inspect_upload(upload))
+    assert info["format"] == "JPEG" and (info["width"], info["height"]) == (3840, 2160)
+    assert (info["output_width"], info["output_height"]) == (1920, 1080)
+    assert info["size"] == int(1920 * 1080 * JPEG_BYTES_PER_PIXEL) and info["original_size"] == len(content)
+    assert upload.file.bytes_read < len(content) / 4, upload.file.bytes_read
+    assert upload.file.tell() == 0
+    print(f"   ✓ 大图只读取了 {upload.file.bytes_read}/{len(content)} 字节")
+
+    # 2. 小尺寸PNG不缩放，输出为JPEG
+    info = inspect(encode((800, 600), "PNG"), "image/png")
+    assert info["original_mime_type"] == "image/png" and info["mime_type"] == "image/jpeg"
+    assert (info["output_width"], info["output_height"]) == (800, 600)
+    print("   ✓ PNG解析尺寸")
+
+    # 3. 已满足要求的JPEG原样保存，预估大小等于原文件大小
+    content = encode((1280, 720), "JPEG", quality=60)
+    assert inspect(content)["size"] == len(content)
+    print("   ✓ 可原样保存的JPEG按原文件大小预估")
+
+    # 4. 无效文件
+    assert expect_400(b"hello world, not an image") == "不支持的图片格式"
+    assert expect_400(b"\x89PNG\r\n\x1a\n" + b"\x00" * 64) == "无法解析图片文件"
+    png = bytearray(encode((64, 64), "PNG"))
+    png[png.index(b"IDAT") + 20] ^= 0xFF  # 破坏IDAT块的数据，verify()校验块CRC时发现
+    assert expect_400(bytes(png), "image/png") == "无法解析图片文件"
+    assert expect_400(encode((64, 64), "JPEG"), "text/plain") == "只允许上传图片文件"
+    assert expect_400(b"\xff\xd8\xff" + b"\x00" * MAX_UPLOAD_SIZE) == "文件大小不能超过5MB"
+    print("   ✓ 无效文件返回400")
+
+def test_full_validation():
+    import main
+
+    print("🧪 测试完整处理的图片校验...")
+    threads = set()
+    original = storage_service.process_image
+
+    def recording(content, strict=False):
+        threads.add(threading.get_ident())
+        return original(content, strict=strict)
+
+    async def validate(content: bytes):
+        return await main.validate_image(make_upload(content), mode="full"), threading.get_ident()
+
+    storage_service.process_image = recording
+    try:
+        # 1. 在图片处理线程池中压缩，返回实际压缩后的大小
+        result, loop_thread = asyncio.run(validate(encode((3840, 2160), "JPEG", quality=95)))
+        assert result["is_valid"] and (result["width"], result["height"]) == (1920, 1080)
+        assert threads and loop_thread not in threads
+        print("   ✓ 压缩在线程池中执行，不阻塞事件循环")
+
+        # 2. 无法解码的文件校验失败
+        result, _ = asyncio.run(validate(b"\xff\xd8\xff" + b"\x00" * 64))
+        assert not result["is_valid"] and result["error"] == "无法解析图片文件"
+        print("   ✓ 无法解码的文件校验失败")
+    finally:
+        storage_service.process_image = original
+
+if __name__ == "__main__":
+    test_image_inspection()
+    test_full_validation()
+    print("\n✅ 文件头图片校验测试完成！")
\ No newline at end of file
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+测试图片处理任务队列：领取、租约过期、失败重试、超过重试次数，以及Web进程跟进已完成的任务
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import timedelta
+from sqlalchemy.orm import sessionmaker
+import crud
+import image_jobs
+import models
+from config import settings
+from image_hash import similarity_index
+from page_cache import car_list_cache
+from storage_service import storage_service
+from testing import make_jpeg, create_engine
+
+def create_session_factory():
+    return sessionmaker(bind=create_engine())
+
+def enqueue_car(Session, content: bytes) -> int:
+    db = Session()
+    try:
+        return crud._insert_processing_car(db, "南山", "138", "异步", content=content)["id"]
+    finally:
+        db.close()
+
+def expire_lease(Session, job_id: int):
+    db = Session()
+    db.query(models.ImageJob).filter(models.ImageJob.id == job_id).update(
+        {models.ImageJob.lease_expires_at: image_jobs._now() - timedelta(seconds=1)}
+    )
+    db.commit()
+    db.close()
+
+def test_claim_and_lease():
+    print("🧪 测试任务领取与租约...")
+    Session = create_session_factory()
+    first_car, second_car = enqueue_car(Session, make_jpeg()), enqueue_car(Session, make_jpeg(color=(30, 200, 30)))
+    db_a, db_b = Session(), Session()
+
+    # 1. 两个工作进程领取到不同的任务，没有可领取的任务时返回None
+    job_a = image_jobs.claim_job(db_a, "worker-a")
+    job_b = image_jobs.claim_job(db_b, "worker-b")
+    assert {job_a.car_id, job_b.car_id} == {first_car, second_car}
+    assert job_a.status == "running" and job_a.attempts == 1 and job_a.lease_owner == "worker-a"
+    assert image_jobs.claim_job(db_b, "worker-c") is None
+    print("   ✓ 任务只被领取一次")
+
+    # 2. 租约过期后被其他工作进程接管，原持有者的结果被丢弃
+    expire_lease(Session, job_a.id)
+    taken = image_jobs.claim_job(db_b, "worker-c")
+    assert taken.id == job_a.id and taken.attempts == 2 and taken.lease_owner == "worker-c"
+    assert image_jobs.process_job(db_a, job_a, "worker-a") == "lost"
+    assert image_jobs.process_job(db_b, taken, "worker-c") == "done"
+    car = db_b.get(models.Car, job_a.car_id)
+    db_b.refresh(car)
+    assert car.status == "ready" and car.image_base64 and car.thumbnail_base64
+    print("   ✓ 租约过期后被重新领取，过期持有者的结果被丢弃")
+
+    # 3. 用完重试次数的过期任务不再被领取，标记为失败
+    db_a.query(models.ImageJob).filter(models.ImageJob.id == job_b.id).update(
+        {models.ImageJob.attempts: settings.JOB_MAX_ATTEMPTS}
+    )
+    db_a.commit()
+    expire_lease(Session, job_b.id)
+    assert image_jobs.claim_job(db_a, "worker-d") is None
+    db_a.expire_all()
+    assert db_a.get(models.ImageJob, job_b.id).status == "failed"
+    assert db_a.get(models.Car, job_b.car_id).status == "failed"
+    assert image_jobs.job_status(db_a, job_b.car_id)["error"]
+    print("   ✓ 超过重试次数的过期任务标记为失败")
+    db_a.close()
+    db_b.close()
+
+def test_retry():
+    print("🧪 测试失败重试...")
+    Session = create_session_factory()
+    car_id = enqueue_car(Session, make_jpeg())
+    db = Session()
+    original = storage_service.store_image
+
+    def failing(content, strict=False):
+        raise RuntimeError("临时故障")
+
+    storage_service.store_image = failing
+    try:
+        # 1. 临时错误按退避延后重试，到期前不可领取
+        job = image_jobs.claim_job(db, "worker")
+        assert image_jobs.process_job(db, job, "worker") == "pending"
+        db.expire_all()
+        job = db.get(models.ImageJob, job.id)
+        assert job.status == "pending" and job.last_error == "临时故障" and job.available_at > image_jobs._now()
+        assert image_jobs.claim_job(db, "worker") is None
+        print("   ✓ 临时错误按退避重试")
+
+        # 2. 最后一次仍失败时任务和车辆标记为失败
+        for attempt in range(2, settings.JOB_MAX_ATTEMPTS + 1):
+            db.query(models.ImageJob).update({models.ImageJob.available_at: image_jobs._now()})
+            db.commit()
+            job = image_jobs.claim_job(db, "worker")
+            assert job.attempts == attempt
+            outcome = image_jobs.process_job(db, job, "worker")
+        assert outcome == "failed"
+        db.expire_all()
+        assert db.get(models.Car, car_id).status == "failed"
+        assert db.get(models.ImageJob, job.id).source_data is None
+        print("   ✓ 超过重试次数后标记为失败")
+    finally:
+        storage_service.store_image = original
+        db.close()
+
+    # 3. 无法解析的图片直接失败，不重试
+    db = Session()
+    car_id = enqueue_car(Session, make_jpeg())
+    db.query(models.ImageJob).filter(models.ImageJob.car_id == car_id).update({models.ImageJob.source_data: b"\xff\xd8\xffbroken"})
+    db.commit()
+    job = image_jobs.claim_job(db, "worker")
+    assert image_jobs.process_job(db, job, "worker") == "failed" and job.attempts == 1
+    db.close()
+    print("   ✓ 无效图片直接失败")
+
+def test_completion_followup():
+    print("🧪 测试任务完成后的缓存失效与索引更新...")
+    Session = create_session_factory()
+    follower = image_jobs.CompletedJobFollower(Session)
+    assert follower.poll() == 0  # 确定跟进起点
+
+    car_id = enqueue_car(Session, make_jpeg())
+    db = Session()
+    invalidations = car_list_cache.invalidations
+    job = image_jobs.claim_job(db, "worker")
+    assert image_jobs.process_job(db, job, "worker") == "done"
+    db.close()
+
+    # 1. 工作进程完成任务后使共享缓存失效
+    assert car_list_cache.invalidations > invalidations
+    print("   ✓ 任务完成后车辆列表缓存失效")
+
+    # 2. Web进程跟进完成的任务，更新相似度索引，不重复处理
+    similarity_index.remove(car_id)
+    try:
+        assert similarity_index.find_similar(car_id) is None
+        assert follower.poll() == 1
+        assert similarity_index.find_similar(car_id) is not None
+        assert follower.poll() == 0
+    finally:
+        similarity_index.remove(car_id)
+    print("   ✓ 跟进已完成的任务更新相似度索引")
+
+if __name__ == "__main__":
+    test_claim_and_lease()
+    test_retry()
+    test_completion_followup()
+    print("\n✅ 图片处理任务队列测试完成！")
\ No newline at end of file
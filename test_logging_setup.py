@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+测试日志截断、脱敏、采样和请求日志量统计
+"""
+
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from logging_setup import BoundedQueueHandler, JsonFormatter, RequestLogVolume, log_stats
+
+def make_logger(log_queue, sample_rate=1.0):
+    logger = logging.getLogger("test_logging_setup")
+    logger.handlers = [BoundedQueueHandler(log_queue, max_length=200, info_sample_rate=sample_rate)]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+def test_logging_setup():
+    print("🧪 测试结构化日志...")
+    log_stats.reset()
+
+    # 1. BASE64图片和过长消息被替换/截断，敏感字段被隐藏
+    log_queue = queue.Queue()
+    logger = make_logger(log_queue)
+    image = "data:image/jpeg;base64," + "QUJD" * 50000
+    with RequestLogVolume() as volume:
+        logger.info(f"车辆创建成功: {{'image_base64': '{image}'}}", extra={"password": "123456", "thumbnail": b"\xff" * 900})
+    record = log_queue.get_nowait()
+    assert "<已省略200023字符>" in record.msg and len(record.msg) < 300
+    assert record.password == "***" and record.thumbnail == "<900字节>"
+    logger.info("车辆描述 " * 1000)
+    assert "已截断，共5000字符" in log_queue.get_nowait().msg
+    print("   ✓ 截断与脱敏")
+
+    # 2. 请求日志量按截断后的大小统计
+    assert volume.records == 1 and 0 < volume.bytes < 400
+    print("   ✓ 请求日志量统计")
+
+    # 3. JSON输出，异常堆栈在写出时格式化
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("处理失败", extra={"car_id": 7})
+    entry = json.loads(JsonFormatter().format(log_queue.get_nowait()))
+    assert entry["level"] == "ERROR" and entry["car_id"] == 7 and "ValueError: boom" in entry["exception"]
+    print("   ✓ JSON格式")
+
+    # 4. 队列满时丢弃而不阻塞；INFO日志采样，WARNING不采样
+    full_logger = make_logger(queue.Queue(maxsize=1))
+    full_logger.info("a")
+    full_logger.info("b")
+    sampled_queue = queue.Queue()
+    sampled_logger = make_logger(sampled_queue, sample_rate=0.0)
+    sampled_logger.info("丢弃")
+    sampled_logger.warning("保留")
+    assert sampled_queue.qsize() == 1
+    stats = log_stats.snapshot()
+    assert stats["dropped"] == 1 and stats["sampled_out"] == 1
+    print("   ✓ 有界队列与采样")
+
+# 在独立进程中配置日志后fork（与gunicorn --preload相同），子进程退出时应写出自己的日志
+FORK_SCRIPT = """
+import logging, os, sys
+sys.path.insert(0, sys.argv[1])
+from logging_setup import setup_logging
+setup_logging(level="INFO", log_format="text")
+logger = logging.getLogger("fork-test")
+logger.warning("FROM-PARENT")
+pid = os.fork()
+if pid == 0:
+    logger.warning("FROM-CHILD %s", os.getpid())
+    sys.exit(0)
+os.waitpid(pid, 0)
+logger.warning("PARENT-AFTER-FORK")
+"""
+
+def test_logging_after_fork():
+    print("🧪 测试fork后子进程的日志写出...")
+    if not hasattr(os, "fork"):
+        print("   跳过：当前平台不支持fork")
+        return
+    result = subprocess.run(
+        [sys.executable, "-c", FORK_SCRIPT, os.path.dirname(os.path.abspath(__file__))],
+        capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert "FROM-PARENT" in result.stderr and "PARENT-AFTER-FORK" in result.stderr
+    assert "FROM-CHILD" in result.stderr, result.stderr
+    print("   ✓ 子进程的日志由子进程自己的写出线程写出")
+
+if __name__ == "__main__":
+    test_logging_setup()
+    test_logging_after_fork()
+    print("\n✅ 结构化日志测试完成！")
\ No newline at end of file
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+测试数据迁移脚本（使用SQLite，不连接生产数据库）
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import sessionmaker
+import crud
+import database
+import models
+from storage_service import to_data_url
+from testing import make_jpeg, make_upload, create_engine, create_session
+
+def test_backfill_image_metadata():
+    import migration_add_image_metadata
+
+    print("🧪 测试图片元数据补全...")
+    db = create_session()
+    engine = db.get_bind()
+    db.add_all([
+        models.Car(region="南山", image_base64=to_data_url(make_jpeg((100, 50)))),
+        models.Car(region="南山", image_data=make_jpeg((120, 60)), image_mime="image/jpeg"),
+        models.Car(region="南山", image_key="cars/object.jpg"),
+        models.Car(region="南山")
+    ])
+    db.commit()
+
+    # 三种存储方式的记录都能补全，没有图片的记录跳过
+    objects = {"cars/object.jpg": make_jpeg((140, 70))}
+    original = crud._object_content
+    crud._object_content = objects.__getitem__
+    try:
+        migration_add_image_metadata.backfill_metadata(engine)
+    finally:
+        crud._object_content = original
+    rows = db.query(models.Car.image_width, models.Car.image_height, models.Car.image_hash).order_by(models.Car.id).all()
+    assert [(row.image_width, row.image_height) for row in rows] == [(100, 50), (120, 60), (140, 70), (None, None)]
+    assert all(row.image_hash for row in rows[:3]) and rows[3].image_hash is None
+    print("   ✓ BASE64、二进制和对象存储的记录都已补全")
+
+def test_migrate_to_binary_storage():
+    import migration_to_binary_storage
+
+    print("🧪 测试BASE64迁移到二进制存储...")
+    with tempfile.TemporaryDirectory() as directory:
+        # 使用SQLite文件数据库，每批在独立的连接和事务中执行
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'cars.db')}")
+        db = sessionmaker(bind=engine)()
+        images = [make_jpeg((100 + index, 50)) for index in range(7)]
+        db.add_all([
+            models.Car(region="南山", image_base64=to_data_url(content), thumbnail_base64=to_data_url(content[:100]))
+            for content in images
+        ])
+        db.add(models.Car(region="南山", image_base64="not a data url"))
+        db.add(models.Car(region="南山", image_data=b"already binary"))
+        db.commit()
+
+        # 1. 小批量分多次提交，中断后从指定ID继续
+        migration_to_binary_storage.migrate_rows(engine, batch_size=2, start_id=3)
+        assert db.query(models.Car).filter(models.Car.image_data.isnot(None)).count() == 1 + 4
+        migration_to_binary_storage.migrate_rows(engine, batch_size=2)
+        db.expire_all()
+        rows = db.query(models.Car).order_by(models.Car.id).all()
+        assert [row.image_data for row in rows[:7]] == images
+        assert all(row.image_base64 is None and row.thumbnail_base64 is None for row in rows[:7])
+        assert all(row.image_mime == "image/jpeg" and row.thumbnail_data for row in rows[:7])
+        assert rows[7].image_data is None and rows[7].image_base64 == "not a data url"
+        assert rows[8].image_data == b"already binary"
+        print("   ✓ 分批迁移，无法解码的记录保留BASE64")
+
+        # 2. 重复运行不改变已迁移的记录
+        migration_to_binary_storage.migrate_rows(engine, batch_size=2)
+        db.expire_all()
+        assert [row.image_data for row in db.query(models.Car).order_by(models.Car.id).limit(7)] == images
+        print("   ✓ 重复运行是幂等的")
+
+        # 3. 迁移后的记录按原格式返回data URL，与迁移前一致
+        assert crud.car_image_url(rows[0]) == to_data_url(images[0])
+        assert crud.car_image_content(rows[0]) == images[0] and crud.car_thumbnail_content(rows[0]) == images[0][:100]
+        assert migration_to_binary_storage.list_latency(engine, rounds=2)["median_ms"] >= 0
+        db.close()
+        engine.dispose()
+        print("   ✓ 读取兼容二进制存储")
+
+def test_create_car_binary_mode():
+    print("🧪 测试二进制存储模式下创建车辆...")
+    db = create_session()
+    original = crud.settings.IMAGE_STORAGE_MODE
+    crud.settings.IMAGE_STORAGE_MODE = "binary"
+    try:
+        car_id = asyncio.run(crud.create_car(db, "南山", "138", "二进制", make_upload(make_jpeg((320, 240)))))["id"]
+    finally:
+        crud.settings.IMAGE_STORAGE_MODE = original
+    car = db.get(models.Car, car_id)
+    assert car.image_base64 is None and car.thumbnail_base64 is None
+    assert car.image_data.startswith(b"\xff\xd8") and car.thumbnail_data.startswith(b"\xff\xd8")
+    details = crud.get_car_details(db, car_id)
+    assert details["image_base64"] == to_data_url(car.image_data, car.image_mime)
+    assert crud.get_cars(db)["cars"][0]["thumbnail_base64"] == to_data_url(car.thumbnail_data)
+    print("   ✓ 图片和缩略图以二进制保存，接口仍返回data URL")
+
+# 上线前的cars表结构：image_base64为NOT NULL，没有后来添加的字段和表
+BASELINE_SCHEMA = (
+    """CREATE TABLE cars (
+        id INTEGER NOT NULL PRIMARY KEY,
+        region VARCHAR(50) NOT NULL,
+        image_base64 TEXT NOT NULL,
+        thumbnail_base64 TEXT,
+        contact VARCHAR(255),
+        description TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME
+    )""",
+    "CREATE INDEX ix_cars_id ON cars (id)",
+    "CREATE INDEX ix_cars_region ON cars (region)",
+)
+
+def test_upgrade_from_baseline_schema():
+    import migrate
+
+    print("🧪 测试从上线前的表结构升级...")
+    with tempfile.TemporaryDirectory() as directory:
+        engine = database._create_engine(f"sqlite:///{os.path.join(directory, 'cars.db')}")
+        with engine.begin() as conn:
+            for statement in BASELINE_SCHEMA:
+                conn.exec_driver_sql(statement)
+            conn.execute(text("INSERT INTO cars (region, image_base64, contact) VALUES ('南山', :image, '138')"),
+                         {"image": to_data_url(make_jpeg((100, 50)))})
+
+        # 1. 检查报告image_base64应为可空
+        problems = migrate.check_schema(engine)
+        assert ("nullable", "cars", "image_base64") in problems
+        assert ("nullable", "cars", "thumbnail_base64") not in problems
+
+        # 2. 升级后结构与模型一致，原有数据保留
+        migrate.upgrade_schema(engine)
+        assert migrate.check_schema(engine) == []
+        columns = {column["name"]: column for column in inspect(engine).get_columns("cars")}
+        assert columns["image_base64"]["nullable"] and "image_data" in columns
+        assert {"ix_cars_region"} <= {index["name"] for index in inspect(engine).get_indexes("cars")}
+        db = sessionmaker(bind=engine)()
+        car = db.get(models.Car, 1)
+        assert car.region == "南山" and car.contact == "138" and crud.car_image_content(car) == make_jpeg((100, 50))
+        print("   ✓ 升级放宽NOT NULL约束，保留原有数据")
+
+        # 3. 队列模式不写入image_base64的记录可以插入
+        db.add(models.Region(name="南山", sort_order=0))
+        db.commit()
+        car_id = crud._insert_processing_car(db, "南山", "139", "排队", content=make_jpeg((320, 240)))["id"]
+        assert db.get(models.Car, car_id).image_base64 is None
+        print("   ✓ 升级后队列模式可以创建车辆")
+
+        # 4. 对象存储模式同样不写入image_base64
+        upload_result = {
+            "image_key": "cars/a.jpg", "thumbnail_key": "thumbnails/a.jpg", "phash": None, "width": 320,
+            "height": 240, "size": 1000, "mime_type": "image/jpeg", "sha256": "0" * 64
+        }
+        original = crud.settings.IMAGE_STORAGE_MODE
+        crud.settings.IMAGE_STORAGE_MODE = "object"
+        try:
+            car_id = crud._insert_car(db, "南山", "140", "对象存储", upload_result)["id"]
+        finally:
+            crud.settings.IMAGE_STORAGE_MODE = original
+        car = db.get(models.Car, car_id)
+        assert car.image_base64 is None and car.image_key == "cars/a.jpg"
+        db.close()
+        engine.dispose()
+        print("   ✓ 升级后对象存储模式可以创建车辆")
+
+if __name__ == "__main__":
+    test_backfill_image_metadata()
+    test_migrate_to_binary_storage()
+    test_create_car_binary_mode()
+    test_upgrade_from_baseline_schema()
+    print("\n✅ 数据迁移脚本测试完成！")
\ No newline at end of file
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+测试对象存储后端
+默认使用moto在进程内模拟S3（pip install "moto[s3]" requests），
+也可以通过环境变量 TEST_S3_ENDPOINT / TEST_S3_ACCESS_KEY / TEST_S3_SECRET_KEY 指向本地MinIO
+缺少这些测试依赖时，pytest将S3相关测试标记为跳过（签名URL缓存的测试不需要它们）
+"""
+
+import asyncio
+import os
+import sys
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+import crud
+import object_storage
+from object_storage import ObjectStorage
+from config import settings
+from storage_service import storage_service
+from testing import make_jpeg, create_session
+
+BUCKET = "car-pic-test"
+
+def run_object_storage_checks():
+    requests = pytest.importorskip("requests")
+    storage = ObjectStorage(
+        bucket=BUCKET,
+        endpoint_url=os.getenv("TEST_S3_ENDPOINT"),
+        access_key=os.getenv("TEST_S3_ACCESS_KEY", "testing"),
+        secret_key=os.getenv("TEST_S3_SECRET_KEY", "testing"),
+        region="us-east-1",
+        url_expires=600
+    )
+    try:
+        storage.client.create_bucket(Bucket=BUCKET)
+    except storage.client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+
+    original_mode = settings.IMAGE_STORAGE_MODE
+    original_factory = object_storage.get_object_storage
+    settings.IMAGE_STORAGE_MODE = "object"
+    object_storage.get_object_storage = lambda: storage
+
+    try:
+        # 1. 处理后的原图和缩略图写入存储桶
+        result = storage_service.store_image(make_jpeg((800, 600)))
+        assert result["image_key"].startswith("cars/") and result["thumbnail_key"].startswith("thumbnails/")
+        assert storage.get(result["image_key"]) == result["content"]
+        assert storage.head(result["thumbnail_key"])["content_type"] == "image/jpeg"
+        print("   ✓ 图片和缩略图写入对象存储")
+
+        # 2. 签名URL可以访问，并在有效期前半段复用同一个URL
+        url, max_age = storage.url(result["image_key"])
+        assert storage.url(result["image_key"])[0] == url and 0 < max_age <= 300
+        response = requests.get(url)
+        assert response.status_code == 200 and response.content == result["content"]
+        print("   ✓ 签名URL访问与复用")
+
+        # 3. 预签名表单直传，超过大小限制的上传被拒绝
+        upload = storage.presigned_upload("image/jpeg", max_size=5 * 1024 * 1024)
+        response = requests.post(upload["url"], data=upload["fields"], files={"file": ("car.jpg", make_jpeg((800, 600)), "image/jpeg")})
+        assert response.status_code in (200, 204)
+        key = storage.upload_key(upload["upload_id"])
+        assert storage.head(key)["size"] > 0
+        assert storage.upload_key("../cars/x.jpg") is None
+        print("   ✓ 预签名直传")
+
+        if os.getenv("TEST_S3_ENDPOINT"):
+            # moto不校验上传策略，只在真实的S3兼容服务上检查
+            small = storage.presigned_upload("image/jpeg", max_size=10)
+            response = requests.post(small["url"], data=small["fields"], files={"file": ("car.jpg", make_jpeg((800, 600)), "image/jpeg")})
+            assert response.status_code >= 400
+            print("   ✓ 直传大小限制")
+
+        # 4. 删除对象
+        assert storage_service.delete_objects([result["image_key"], result["thumbnail_key"], None])
+        assert storage.head(result["image_key"]) is None
+        print("   ✓ 删除对象")
+    finally:
+        settings.IMAGE_STORAGE_MODE = original_mode
+        object_storage.get_object_storage = original_factory
+
+def test_object_storage():
+    print("🧪 测试对象存储后端...")
+    pytest.importorskip("boto3")
+    if os.getenv("TEST_S3_ENDPOINT"):
+        run_object_storage_checks()
+        return
+
+    moto = pytest.importorskip("moto", reason="未安装moto，且未设置TEST_S3_ENDPOINT")
+    with moto.mock_aws():
+        run_object_storage_checks()
+
+class MemoryObjectStorage(ObjectStorage):
+    """进程内的对象存储，记录访问线程"""
+
+    def __init__(self):
+        super().__init__(bucket=BUCKET)
+        self.objects = {}
+        self.threads = set()
+
+    def put(self, key, content, content_type):
+        self.threads.add(threading.get_ident())
+        self.objects[key] = content
+
+    def get(self, key):
+        self.threads.add(threading.get_ident())
+        return self.objects[key]
+
+    def head(self, key):
+        self.threads.add(threading.get_ident())
+        return {"size": len(self.objects[key]), "content_type": "image/jpeg"} if key in self.objects else None
+
+    def delete_many(self, keys):
+        self.threads.add(threading.get_ident())
+        for key in keys:
+            self.objects.pop(key, None)
+
+def test_direct_upload_off_loop():
+    print("🧪 测试直传回调和删除不在事件循环中访问对象存储...")
+    db = create_session()
+    storage = MemoryObjectStorage()
+    upload_id = "0123456789abcdef0123456789abcdef.bin"
+    storage.objects[storage.upload_key(upload_id)] = make_jpeg((800, 600))
+
+    async def run():
+        created = await crud.create_car_from_upload(db, upload_id, "南山", "138", "直传")
+        await crud.delete_car(db, created["id"])
+        return threading.get_ident()
+
+    original_mode, original_processing = settings.IMAGE_STORAGE_MODE, settings.IMAGE_PROCESSING_MODE
+    original_factory = object_storage.get_object_storage
+    settings.IMAGE_STORAGE_MODE, settings.IMAGE_PROCESSING_MODE = "object", "sync"
+    object_storage.get_object_storage = lambda: storage
+    try:
+        loop_thread = asyncio.run(run())
+    finally:
+        settings.IMAGE_STORAGE_MODE, settings.IMAGE_PROCESSING_MODE = original_mode, original_processing
+        object_storage.get_object_storage = original_factory
+        db.close()
+    assert storage.objects == {} and storage.threads and loop_thread not in storage.threads
+    print("   ✓ 读取、写入和删除对象都在线程池中执行")
+
+class FakeClient:
+    """只统计签名次数的客户端，不访问网络"""
+
+    def __init__(self):
+        self.signed = 0
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        self.signed += 1
+        return f"https://s3.test/{Params['Key']}?signature={self.signed}"
+
+def test_url_cache():
+    print("🧪 测试签名URL缓存...")
+    storage = ObjectStorage(bucket=BUCKET, url_expires=600, url_cache_size=3)
+    storage._client = client = FakeClient()
+
+    # 1. 有效期前半段复用同一个URL
+    url, _ = storage.url("cars/a.jpg")
+    assert storage.url("cars/a.jpg")[0] == url and client.signed == 1
+    print("   ✓ 复用签名URL")
+
+    # 2. 超过条数上限时淘汰最久未使用的条目
+    storage.url("cars/b.jpg")
+    storage.url("cars/c.jpg")
+    storage.url("cars/a.jpg")  # a变为最近使用
+    storage.url("cars/d.jpg")
+    assert list(storage._url_cache) == ["cars/c.jpg", "cars/a.jpg", "cars/d.jpg"]
+    signed = client.signed
+    storage.url("cars/a.jpg")
+    assert client.signed == signed
+    storage.url("cars/b.jpg")
+    assert client.signed == signed + 1
+    print("   ✓ 按LRU淘汰，缓存条数有上限")
+
+    # 3. 过了复用期的条目在写入新条目时淘汰，命中时重新签名
+    for key, (url, expires_at) in list(storage._url_cache.items()):
+        storage._url_cache[key] = (url, expires_at - 400)
+    storage.url("cars/e.jpg")
+    assert list(storage._url_cache) == ["cars/e.jpg"]
+    storage.url("cars/a.jpg")
+    assert client.signed == signed + 3
+    print("   ✓ 过期条目被淘汰")
+
+    # 4. 删除对象时移除缓存
+    storage._client = type("DeletingClient", (FakeClient,), {"delete_object": lambda self, **kwargs: None})()
+    storage.delete("cars/a.jpg")
+    assert "cars/a.jpg" not in storage._url_cache
+    print("   ✓ 删除对象时移除缓存")
+
+if __name__ == "__main__":
+    test_url_cache()
+    test_direct_upload_off_loop()
+    try:
+        test_object_storage()
+    except pytest.skip.Exception as e:
+        print(f"   跳过：{e}")
+    print("\n✅ 对象存储测试完成！")
\ No newline at end of file
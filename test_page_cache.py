@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+测试列表页微缓存：命中与过期、并发未命中合并、写操作失效、指标、阻塞后端不占用事件循环、加载使用独立会话
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+import database
+import models
+from cache_backend import MemoryBackend
+from page_cache import MicroCache, car_list_cache
+
+class ThreadRecordingBackend(MemoryBackend):
+    """模拟Redis等阻塞后端，记录访问线程"""
+
+    blocking = True
+
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def get_many(self, keys):
+        self.threads.add(threading.get_ident())
+        return super().get_many(keys)
+
+    def set(self, key, value, ttl):
+        self.threads.add(threading.get_ident())
+        super().set(key, value, ttl)
+
+    def bump(self, key):
+        self.threads.add(threading.get_ident())
+        return super().bump(key)
+
+async def run_cache_checks():
+    cache = MicroCache("test", ttl=0.2)
+    calls = []
+
+    def loader(value, delay=0.1):
+        def load():
+            calls.append(threading.get_ident())
+            time.sleep(delay)
+            return value
+        return load
+
+    # 1. 并发未命中只查询一次，之后命中缓存
+    results = await asyncio.gather(*(cache.get("page1", loader("v1")) for _ in range(20)))
+    assert results == ["v1"] * 20 and len(calls) == 1
+    assert await cache.get("page1", loader("v2")) == "v1" and len(calls) == 1
+    assert cache.misses == 1 and cache.coalesced == 19 and cache.hits == 1
+    print("   ✓ 并发未命中合并为一次查询")
+
+    # 2. 过期后重新加载
+    await asyncio.sleep(0.25)
+    assert await cache.get("page1", loader("v2", 0)) == "v2" and len(calls) == 2
+    print("   ✓ 过期后重新加载")
+
+    # 3. 加载期间失效：旧结果不写入缓存，失效后的请求不合并到旧的加载
+    stale = asyncio.ensure_future(cache.get("page3", loader("stale")))
+    await asyncio.sleep(0.02)
+    cache.invalidate()
+    fresh = await cache.get("page3", loader("fresh", 0))
+    assert await stale == "stale" and fresh == "fresh"
+    assert await cache.get("page3", loader("other", 0)) == "fresh"
+    print("   ✓ 写操作后立即失效")
+
+    # 4. 加载失败时所有等待者收到异常，不缓存
+    def failing():
+        time.sleep(0.05)
+        raise ValueError("数据库不可用")
+    outcomes = await asyncio.gather(*(cache.get("page2", failing) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    assert await cache.get("page2", loader("ok", 0)) == "ok"
+    print("   ✓ 加载失败不缓存")
+
+    lines = cache.metric_lines()
+    assert 'microcache_coalesced_total{cache="test"} 21' in lines
+    assert 'microcache_invalidations_total{cache="test"} 1' in lines
+    print("   ✓ 命中率指标")
+
+def test_page_cache():
+    print("🧪 测试列表页微缓存...")
+    asyncio.run(run_cache_checks())
+
+def test_blocking_backend():
+    print("🧪 测试阻塞后端不占用事件循环...")
+    backend = ThreadRecordingBackend()
+    cache = MicroCache("blocking", ttl=5, backend=backend)
+
+    async def run():
+        first = await cache.get("page1", lambda: "v1")
+        cached = await cache.get("page1", lambda: "v2")
+        await cache.ainvalidate()
+        reloaded = await cache.get("page1", lambda: "v3")
+        return threading.get_ident(), first, cached, reloaded
+
+    loop_thread, first, cached, reloaded = asyncio.run(run())
+    assert (first, cached, reloaded) == ("v1", "v1", "v3")
+    assert backend.threads and loop_thread not in backend.threads
+    print("   ✓ 读取、写入和失效都在线程池中访问后端")
+
+def test_list_loader_session():
+    print("🧪 测试合并的列表加载使用独立会话...")
+    import main
+
+    engine = database._create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.add_all([models.Car(region="南山", contact="138", description=f"车辆{index}") for index in range(5)])
+        db.commit()
+    original_bind = database.SessionLocal.kw["bind"]
+    database.SessionLocal.configure(bind=engine)
+    misses = car_list_cache.misses
+
+    async def request_page():
+        request = Request({"type": "http", "method": "GET", "path": "/api/cars", "headers": []})
+        response = await main.get_cars(request, region="南山", page=1, limit=20, q=None, cursor=None, fields="id,region")
+        return response.body
+
+    async def run():
+        await car_list_cache.ainvalidate()
+        return await asyncio.gather(*(request_page() for _ in range(10)))
+
+    try:
+        bodies = asyncio.run(run())
+    finally:
+        database.SessionLocal.configure(bind=original_bind)
+    assert len(set(bodies)) == 1 and "南山".encode() in bodies[0]
+    assert car_list_cache.misses == misses + 1
+    print("   ✓ 加载函数自己打开会话，合并的请求共用结果")
+
+if __name__ == "__main__":
+    test_page_cache()
+    test_blocking_backend()
+    test_list_loader_session()
+    print("\n✅ 列表页微缓存测试完成！")
\ No newline at end of file
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+测试已压缩JPEG原样保存：判定条件、元数据去除、缩略图和命中率统计
+"""
+
+import io
+import os
+import random
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image
+from storage_service import StorageService, strip_jpeg_metadata
+
+def make_photo(width, height, quality=75, mode="RGB", exif=None, noise=False):
+    image = Image.new("RGB", (width, height), (90, 120, 160))
+    # 渐变和色块，接近真实照片的压缩率
+    for x in range(0, width, 64):
+        image.paste((x % 255, (x * 3) % 255, 100), (x, 0, x + 32, height // 2))
+    if noise:
+        random.seed(1)
+        image.putdata([(random.randrange(256), random.randrange(256), random.randrange(256)) for _ in range(width * height)])
+    if mode != "RGB":
+        image = image.convert(mode)
+    output = io.BytesIO()
+    options = {"exif": exif} if exif else {}
+    image.save(output, format="JPEG", quality=quality, **options)
+    return output.getvalue()
+
+def test_passthrough():
+    print("🧪 测试JPEG原样保存...")
+    service = StorageService()
+
+    # 1. 已压缩到1920x1080以内的JPEG原样保存，EXIF被去除，像素不变
+    exif = Image.Exif()
+    exif[0x010F] = "TestPhone"
+    exif[0x8825] = {1: "N", 2: (31.0, 14.0, 0.0)}  # GPS
+    content = make_photo(1600, 900, exif=exif)
+    result = service.process_image(content)
+    assert result["content"] == strip_jpeg_metadata(content) and len(result["content"]) < len(content)
+    assert b"Exif" not in result["content"] and b"TestPhone" not in result["content"]
+    assert Image.open(io.BytesIO(result["content"])).tobytes() == Image.open(io.BytesIO(content)).tobytes()
+    assert (result["width"], result["height"]) == (1600, 900)
+    assert Image.open(io.BytesIO(result["thumbnail_content"])).size == (300, 168)
+    assert result["phash"] is not None
+    print("   ✓ 原样保存并去除EXIF")
+
+    # 2. 超出尺寸、码率过高、CMYK的图片仍然重新编码
+    for label, upload in [
+        ("尺寸超限", make_photo(2400, 1600)),
+        ("码率过高", make_photo(800, 600, quality=98, noise=True)),
+        ("CMYK", make_photo(800, 600, mode="CMYK")),
+        ("PNG", _png())
+    ]:
+        result = service.process_image(upload)
+        assert result["content"] != strip_jpeg_metadata(upload), label
+        assert Image.open(io.BytesIO(result["content"])).mode == "RGB", label
+    print("   ✓ 不满足条件的图片重新编码")
+
+    # 3. 截断的文件（缺少EOI）不原样保存
+    truncated = make_photo(1600, 900)[:-5000]
+    assert service._passthrough(truncated) is None
+    service.process_image(truncated)
+    print("   ✓ 截断文件走完整处理")
+
+    # 4. 命中率统计
+    assert service.processed_count == 6 and service.passthrough_count == 1
+    assert "image_passthrough_total 1" in service.metric_lines()
+    print("   ✓ 命中率统计")
+
+def _png():
+    output = io.BytesIO()
+    Image.new("RGB", (800, 600), (1, 2, 3)).save(output, format="PNG")
+    return output.getvalue()
+
+if __name__ == "__main__":
+    test_passthrough()
+    print("\n✅ JPEG原样保存测试完成！")
\ No newline at end of file
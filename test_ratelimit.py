@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+测试令牌桶限流：规则解析、内存存储、共享存储（Redis）、代理之后的客户端IP和429响应
+共享存储默认使用fakeredis（pip install "fakeredis[lua]"），也可以通过 TEST_REDIS_URL 指向本地Redis
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from starlette.requests import Request
+from ratelimit import MemoryStore, RateLimiter, RedisStore, parse_rules
+
+def check(limiter, request):
+    return asyncio.run(limiter.check(request))
+
+def make_request(method="POST", path="/api/admin/login", ip="10.0.0.1", headers=None):
+    raw_headers = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": method, "path": path, "headers": raw_headers, "client": (ip, 1234)})
+
+def check_store(store):
+    limiter = RateLimiter(parse_rules("POST /api/admin/login=3/60:ip; DELETE /api/cars/{car_id}=1/1:token"), store)
+
+    # 同一IP突发3次后被拒绝，其他IP不受影响
+    results = [check(limiter, make_request()) for _ in range(4)]
+    assert [r["allowed"] for r in results] == [True, True, True, False]
+    assert results[3]["retry_after"] == 20 and results[2]["remaining"] == 0
+    assert check(limiter, make_request(ip="10.0.0.2"))["allowed"]
+
+    # 按令牌限流，令牌按速率补充
+    auth = {"Authorization": "Bearer abc"}
+    assert check(limiter, make_request("DELETE", "/api/cars/7", headers=auth))["allowed"]
+    assert not check(limiter, make_request("DELETE", "/api/cars/8", ip="10.0.0.9", headers=auth))["allowed"]
+    time.sleep(1.05)
+    assert check(limiter, make_request("DELETE", "/api/cars/7", headers=auth))["allowed"]
+
+    # 未配置规则的路由不限流
+    assert check(limiter, make_request("GET", "/api/regions")) is None
+
+def test_memory_store():
+    print("🧪 测试内存令牌桶...")
+    store = MemoryStore()
+    check_store(store)
+    print("   ✓ 突发、补充与按IP/令牌区分")
+
+    # 补满的桶被清理
+    store = MemoryStore()
+    store.SWEEP_EVERY = 10
+    for index in range(30):
+        store.consume(f"k{index}", capacity=1, rate=1000)
+    time.sleep(0.01)
+    for _ in range(10):
+        store.consume("active", capacity=5, rate=0.001)
+    assert len(store) == 1
+    print("   ✓ 过期桶清理")
+
+def test_redis_store():
+    print("🧪 测试Redis共享令牌桶...")
+    if os.getenv("TEST_REDIS_URL"):
+        import redis
+        client = redis.Redis.from_url(os.getenv("TEST_REDIS_URL"))
+    else:
+        try:
+            import fakeredis
+            client = fakeredis.FakeRedis()
+        except ImportError:
+            print("   跳过：未安装fakeredis，且未设置TEST_REDIS_URL")
+            return
+    prefix = f"ratelimit-test-{os.getpid()}-{time.time()}:"
+    check_store(RedisStore(client=client, prefix=prefix))
+    # 两个进程（存储实例）共享同一个桶
+    first, second = RedisStore(client=client, prefix=prefix + "shared:"), RedisStore(client=client, prefix=prefix + "shared:")
+    assert first.consume("k", 1, 0.01)[0] and not second.consume("k", 1, 0.01)[0]
+    assert 0 < client.pttl(prefix + "shared:k") <= 101000
+    print("   ✓ 多实例共享令牌桶")
+
+    # 存储不可用时放行
+    broken = RateLimiter(parse_rules("POST /api/admin/login=1/60"), RedisStore("redis://127.0.0.1:1/0"))
+    assert check(broken, make_request()) is None and broken.errors == 1
+    print("   ✓ 存储不可用时放行")
+
+def test_blocking_store_off_loop():
+    print("🧪 测试阻塞存储不占用事件循环...")
+
+    class SlowStore(MemoryStore):
+        blocking = True
+
+        def consume(self, *args, **kwargs):
+            self.thread = threading.get_ident()
+            return super().consume(*args, **kwargs)
+
+    async def run(limiter):
+        return threading.get_ident(), await limiter.check(make_request())
+
+    store = SlowStore()
+    loop_thread, result = asyncio.run(run(RateLimiter(parse_rules("POST /api/admin/login=1/60"), store)))
+    assert result["allowed"] and store.thread != loop_thread
+    print("   ✓ Redis等阻塞存储在线程池中访问")
+
+def test_forwarded_client_ip():
+    print("🧪 测试代理之后的客户端IP...")
+    rules = "POST /api/admin/login=1/60:ip"
+    proxy = "10.1.0.1"
+
+    # 1. 不信任X-Forwarded-For时，代理之后的所有客户端共用代理IP的桶
+    limiter = RateLimiter(parse_rules(rules), MemoryStore())
+    assert check(limiter, make_request(ip=proxy, headers={"X-Forwarded-For": "1.1.1.1"}))["allowed"]
+    assert not check(limiter, make_request(ip=proxy, headers={"X-Forwarded-For": "2.2.2.2"}))["allowed"]
+
+    # 2. 信任一层代理：取最右边的地址，客户端伪造的左侧地址不影响计数
+    limiter = RateLimiter(parse_rules(rules), MemoryStore(), trust_forwarded=True)
+    assert check(limiter, make_request(ip=proxy, headers={"X-Forwarded-For": "1.1.1.1"}))["allowed"]
+    assert check(limiter, make_request(ip=proxy, headers={"X-Forwarded-For": "2.2.2.2"}))["allowed"]
+    assert not check(limiter, make_request(ip=proxy, headers={"X-Forwarded-For": "9.9.9.9, 1.1.1.1"}))["allowed"]
+    assert check(limiter, make_request(ip="3.3.3.3"))["allowed"]  # 没有请求头时使用连接地址
+    print("   ✓ 按X-Forwarded-For最右边的地址区分客户端")
+
+    # 3. 两层代理（如CDN + 负载均衡）取从右数第二个地址
+    limiter = RateLimiter(parse_rules(rules), MemoryStore(), trust_forwarded=True, proxy_hops=2)
+    assert check(limiter, make_request(ip=proxy, headers={"X-Forwarded-For": "9.9.9.9, 1.1.1.1, 172.16.0.1"}))["allowed"]
+    assert not check(limiter, make_request(ip=proxy, headers={"X-Forwarded-For": "8.8.8.8, 1.1.1.1, 172.16.0.2"}))["allowed"]
+    assert check(limiter, make_request(ip=proxy, headers={"X-Forwarded-For": "4.4.4.4"}))["allowed"]
+    print("   ✓ 多层代理按层数取地址")
+
+def test_cors_on_429():
+    print("🧪 测试429响应带CORS头...")
+    from fastapi.testclient import TestClient
+    import main
+
+    original = main.rate_limiter.rules
+    main.rate_limiter.rules = parse_rules("POST /api/admin/login=1/60:route")
+    try:
+        client = TestClient(main.app)
+        headers = {"Origin": "http://localhost:5173"}
+        client.post("/api/admin/login", json={}, headers=headers)
+        response = client.post("/api/admin/login", json={}, headers=headers)
+        assert response.status_code == 429
+        assert response.headers.get("access-control-allow-origin") in ("*", "http://localhost:5173")
+        assert response.headers["retry-after"]
+    finally:
+        main.rate_limiter.rules = original
+    print("   ✓ 浏览器可以读取限流响应")
+
+if __name__ == "__main__":
+    test_memory_store()
+    test_redis_store()
+    test_blocking_store_off_loop()
+    test_forwarded_client_ip()
+    test_cors_on_429()
+    print("\n✅ 限流测试完成！")
\ No newline at end of file
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+测试只读副本路由
+使用两个本地SQLite数据库分别模拟主库和副本（各自写入不同标记以区分读取来源），
+也可以通过环境变量 TEST_PRIMARY_URL / TEST_REPLICA_URL 指向两个本地MySQL实例
+"""
+
+import os
+import sys
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+from starlette.requests import Request
+import database
+from database import ReplicaRouter, PRIMARY_STICKY_COOKIE, get_read_db
+
+def make_request(cookies=None):
+    headers = []
+    if cookies:
+        cookie = "; ".join(f"{key}={value}" for key, value in cookies.items())
+        headers.append((b"cookie", cookie.encode()))
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+def read_source(request):
+    """通过get_read_db取得会话，读取标记判断请求落在哪个库"""
+    generator = get_read_db(request)
+    db = next(generator)
+    try:
+        return db.execute(text("SELECT name FROM probe")).scalar()
+    finally:
+        generator.close()
+
+def setup_databases():
+    workdir = tempfile.mkdtemp()
+    primary_url = os.getenv("TEST_PRIMARY_URL", f"sqlite:///{workdir}/primary.db")
+    replica_url = os.getenv("TEST_REPLICA_URL", f"sqlite:///{workdir}/replica.db")
+
+    engines = {}
+    for name, url in (("primary", primary_url), ("replica", replica_url)):
+        engine = create_engine(url)
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS probe"))
+            conn.execute(text("CREATE TABLE probe (name VARCHAR(20))"))
+            conn.execute(text("INSERT INTO probe (name) VALUES (:name)"), {"name": name})
+        engines[name] = engine
+    return engines
+
+def test_read_replica_routing():
+    print("🧪 测试只读副本路由...")
+    engines = setup_databases()
+    original_router = database.replica_router
+    original_bind = database.SessionLocal.kw["bind"]
+    database.SessionLocal.configure(bind=engines["primary"])
+    database.replica_router = ReplicaRouter([engines["replica"]])
+
+    try:
+        # 1. 普通读请求走副本
+        assert read_source(make_request()) == "replica"
+        print("   ✓ 读请求路由到副本")
+
+        # 2. 写操作后的粘滞窗口内走主库，过期后恢复走副本
+        assert read_source(make_request({PRIMARY_STICKY_COOKIE: int(time.time()) + 10})) == "primary"
+        assert read_source(make_request({PRIMARY_STICKY_COOKIE: int(time.time()) - 1})) == "replica"
+        print("   ✓ 读己之写粘滞生效")
+
+        # 3. 副本不可用时回退主库，健康检查恢复后重新使用副本
+        database.replica_router.mark_unhealthy(engines["replica"])
+        assert read_source(make_request()) == "primary"
+        database.replica_router.check_health()
+        assert read_source(make_request()) == "replica"
+        print("   ✓ 副本故障回退与恢复")
+
+        # 4. 副本连接失败时自动标记为不可用
+        broken = create_engine("sqlite:////nonexistent-dir/replica.db")
+        database.replica_router = ReplicaRouter([broken])
+        assert read_source(make_request()) == "primary"
+        assert database.replica_router.status()[0]["healthy"] is False
+        print("   ✓ 副本连接失败自动回退主库")
+    finally:
+        database.replica_router = original_router
+        database.SessionLocal.configure(bind=original_bind)
+
+if __name__ == "__main__":
+    test_read_replica_routing()
+    print("\n✅ 只读副本路由测试完成！")
\ No newline at end of file
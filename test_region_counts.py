@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+测试区域车辆计数：创建、修改（含更换区域）、删除和批量操作后，regions表的计数与车辆表一致
+"""
+
+import asyncio
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+from sqlalchemy import event, func
+import crud
+import models
+import schemas
+from storage_service import storage_service
+from testing import make_jpeg, make_upload, create_session
+
+REGIONS = ("南山", "福田", "宝安")
+
+def assert_counts(db, expected: dict):
+    """计数等于期望值，且与按车辆表实际统计的结果一致"""
+    counts = crud.get_regions(db, with_counts=True)["counts"]
+    actual = dict(db.query(models.Car.region, func.count(models.Car.id)).group_by(models.Car.region).all())
+    assert counts == {name: actual.get(name, 0) for name in REGIONS}, (counts, actual)
+    assert counts == {name: expected.get(name, 0) for name in REGIONS}, (counts, expected)
+
+def test_region_counts():
+    print("🧪 测试区域车辆计数...")
+    db = create_session(REGIONS)
+
+    # 1. 创建
+    created = [
+        asyncio.run(crud.create_car(db, region, "138", f"车辆{index}", make_upload(make_jpeg(color=(index * 40, 80, 80)))))["id"]
+        for index, region in enumerate(("南山", "南山", "福田", "宝安"))
+    ]
+    assert_counts(db, {"南山": 2, "福田": 1, "宝安": 1})
+    print("   ✓ 创建车辆")
+
+    # 2. 修改：更换区域时原区域减一、新区域加一；区域不变或只改其他字段时计数不变
+    asyncio.run(crud.update_car(db, created[0], region="福田"))
+    assert_counts(db, {"南山": 1, "福田": 2, "宝安": 1})
+    asyncio.run(crud.update_car(db, created[0], region="福田", description="同区域"))
+    asyncio.run(crud.update_car(db, created[1], contact="139"))
+    assert_counts(db, {"南山": 1, "福田": 2, "宝安": 1})
+    print("   ✓ 修改车辆（含更换区域）")
+
+    # 3. 删除；不存在的车辆不影响计数
+    asyncio.run(crud.delete_car(db, created[3]))
+    try:
+        asyncio.run(crud.delete_car(db, created[3]))
+        raise AssertionError("重复删除应该返回404")
+    except HTTPException as e:
+        assert e.status_code == 404
+    assert_counts(db, {"南山": 1, "福田": 2})
+    print("   ✓ 删除车辆")
+
+    # 4. 批量创建
+    items = [{"region": region, "image": make_upload(make_jpeg(color=(20, index * 50, 20)))} for index, region in enumerate(("宝安", "宝安", "南山"))]
+    assert asyncio.run(crud.create_cars_bulk(db, items))["created"] == 3
+    assert_counts(db, {"南山": 2, "福田": 2, "宝安": 2})
+    print("   ✓ 批量创建")
+
+    # 5. 批量移动和批量修改
+    crud.batch_update_cars(db, schemas.CarBatchFilter(region="福田"), {"region": "宝安"})
+    assert_counts(db, {"南山": 2, "宝安": 4})
+    crud.batch_update_cars(db, schemas.CarBatchFilter(region="南山"), {"region": "南山", "contact": "000"})
+    assert_counts(db, {"南山": 2, "宝安": 4})
+    print("   ✓ 批量移动区域")
+
+    # 6. 批量删除；区域下仍有车辆时不能删除区域
+    try:
+        crud.delete_region(db, "宝安")
+        raise AssertionError("区域下仍有车辆时不能删除")
+    except HTTPException as e:
+        assert e.status_code == 400
+    crud.batch_delete_cars(db, schemas.CarBatchFilter(region="宝安"))
+    assert_counts(db, {"南山": 2})
+    crud.delete_region(db, "宝安")
+    print("   ✓ 批量删除")
+
+    # 7. 计数被破坏后可以按车辆表重新统计修复
+    db.query(models.Region).update({"car_count": 99})
+    db.commit()
+    crud.refresh_region_counts(db)
+    assert crud.get_regions(db, with_counts=True)["counts"] == {"南山": 2, "福田": 0}
+    print("   ✓ 重新统计修复计数")
+
+def test_region_lock_order():
+    print("🧪 测试区域计数的加锁时机和顺序...")
+    db = create_session(REGIONS)
+    car_id = asyncio.run(crud.create_car(db, "南山", "138", "车辆", make_upload(make_jpeg(color=(200, 80, 80)))))["id"]
+    events = []
+
+    @event.listens_for(db.get_bind(), "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE regions"):
+            events.append(("regions", parameters[1]))
+
+    original = storage_service.save_upload
+
+    async def save_upload(image):
+        events.append(("image", None))
+        return await original(image)
+
+    storage_service.save_upload = save_upload
+    try:
+        # 1. 更换区域和图片：图片处理完成后才更新regions表（行锁只持有到提交）
+        asyncio.run(crud.update_car(db, car_id, region="福田", image=make_upload(make_jpeg(color=(20, 80, 200)))))
+        assert [kind for kind, _ in events] == ["image", "regions", "regions"], events
+        # 2. 按区域名顺序更新，与移动方向无关
+        asyncio.run(crud.update_car(db, car_id, region="南山"))
+        assert [region for _, region in events[1:3]] == [region for _, region in events[3:5]] == sorted(("南山", "福田"))
+    finally:
+        storage_service.save_upload = original
+        event.remove(db.get_bind(), "before_cursor_execute", record)
+    assert_counts(db, {"南山": 1})
+    print("   ✓ 图片处理后再更新计数，按固定顺序加锁")
+
+if __name__ == "__main__":
+    test_region_counts()
+    test_region_lock_order()
+    print("\n✅ 区域车辆计数测试完成！")
\ No newline at end of file
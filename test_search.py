@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+测试车辆全文检索：本地倒排索引的键集分页、索引就绪前的LIKE回退查询、MySQL的偏移量分页
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+from sqlalchemy.dialects import mysql
+import crud
+import models
+import testing
+from search_index import search_index, encode_cursor, decode_cursor
+
+def create_session():
+    db = testing.create_session(("南山", "福田"))
+    for index in range(23):
+        # 描述中"宝马"出现次数不同，得分有相同也有不同
+        description = "宝马" * (1 + index % 3) + f" 车辆{index}"
+        db.add(models.Car(region="南山" if index % 2 else "福田", description=description, contact=f"1380000{index:04d}"))
+    db.add(models.Car(region="南山", description="奔驰 100%新", contact="a_b"))
+    db.commit()
+    return db
+
+def collect_pages(db, q, limit, region=None):
+    ids, cursor, pages = [], None, 0
+    while True:
+        result = crud.search_cars(db, q, region=region, cursor=cursor, limit=limit)
+        ids.extend(car["id"] for car in result["cars"])
+        pages += 1
+        if not result["has_more"]:
+            return ids, pages
+        cursor = result["next_cursor"]
+        assert cursor
+
+def test_search():
+    print("🧪 测试车辆全文检索...")
+    db = create_session()
+    expected = sorted(car_id for (car_id,) in db.query(models.Car.id).filter(models.Car.description.like("%宝马%")))
+
+    # 1. 索引未就绪时回退到LIKE查询，而不是返回空结果
+    search_index.ready = False
+    result = crud.search_cars(db, "宝马", limit=5)
+    assert len(result["cars"]) == 5 and result["cars"][0]["score"] is None
+    assert decode_cursor(result["next_cursor"]) == (5,)
+    ids, pages = collect_pages(db, "宝马", 5)
+    assert ids == sorted(expected, reverse=True) and pages == 5
+    print("   ✓ 索引就绪前回退到LIKE查询（偏移量分页）")
+
+    # 2. LIKE通配符按字面匹配
+    assert len(crud.search_cars(db, "100%")["cars"]) == 1
+    assert len(crud.search_cars(db, "a_b")["cars"]) == 1
+    assert crud.search_cars(db, "1%0")["cars"] == []
+    print("   ✓ 检索词中的%和_按字面匹配")
+
+    # 3. 索引就绪后按相关度排序，得分相同的按ID降序，翻页不重复不遗漏
+    crud.rebuild_search_index(db)
+    try:
+        result = crud.search_cars(db, "宝马", limit=4)
+        scores = [(car["score"], car["id"]) for car in result["cars"]]
+        assert scores == sorted(scores, reverse=True)
+        assert len(decode_cursor(result["next_cursor"])) == 2
+        ids, pages = collect_pages(db, "宝马", 4)
+        assert sorted(ids) == expected and len(ids) == len(set(ids)) and pages == 6
+        ids, _ = collect_pages(db, "宝马", 3, region="南山")
+        assert sorted(ids) == sorted(car_id for car_id in expected if db.get(models.Car, car_id).region == "南山")
+        print("   ✓ 本地索引键集分页")
+
+        # 4. 回退查询的下一页游标在索引就绪后仍按原方式继续
+        ids = [car_id for car_id in sorted(expected, reverse=True)[5:10]]
+        assert [car["id"] for car in crud.search_cars(db, "宝马", cursor=encode_cursor(5), limit=5)["cars"]] == ids
+        print("   ✓ 索引就绪前的游标继续有效")
+    finally:
+        search_index.ready = False
+
+    # 5. 无效游标返回400
+    for cursor in ("!!!", encode_cursor(1, 2, 3), encode_cursor(-1)):
+        try:
+            crud.search_cars(db, "宝马", cursor=cursor)
+            raise AssertionError("无效游标应该返回400")
+        except HTTPException as e:
+            assert e.status_code == 400
+    print("   ✓ 无效游标返回400")
+
+    # 6. MySQL FULLTEXT使用偏移量分页，不按浮点得分做相等比较
+    crud.settings.SEARCH_BACKEND, original = "fulltext", crud.settings.SEARCH_BACKEND
+    statements = []
+
+    class FakeResult:
+        def all(self):
+            return []
+
+    class FakeQuery:
+        def __init__(self):
+            self.clauses = []
+
+        def filter(self, *clauses):
+            self.clauses.extend(clauses)
+            return self
+
+        def order_by(self, *clauses):
+            return self
+
+        def offset(self, offset):
+            statements.append(("offset", offset))
+            return self
+
+        def limit(self, limit):
+            return FakeResult()
+
+    class FakeDialect:
+        name = "mysql"
+
+    class FakeSession:
+        def get_bind(self):
+            return type("Bind", (), {"dialect": FakeDialect})()
+
+        def query(self, *columns):
+            query = FakeQuery()
+            statements.append(("query", query))
+            return query
+
+    try:
+        crud.search_cars(FakeSession(), "宝马", cursor=encode_cursor(40), limit=20)
+        assert ("offset", 40) in statements
+        query = next(item for kind, item in statements if kind == "query")
+        sql = " ".join(str(clause.compile(dialect=mysql.dialect())) for clause in query.clauses)
+        assert " = " not in sql
+        try:
+            crud.search_cars(FakeSession(), "宝马", cursor=encode_cursor(1.5, 3))
+            raise AssertionError("MySQL不接受键集游标")
+        except HTTPException as e:
+            assert e.status_code == 400
+    finally:
+        crud.settings.SEARCH_BACKEND = original
+    print("   ✓ MySQL FULLTEXT使用偏移量分页")
+
+if __name__ == "__main__":
+    test_search()
+    print("\n✅ 车辆全文检索测试完成！")
\ No newline at end of file
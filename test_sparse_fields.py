@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+测试fields参数：按字段选择SQL列、默认字段、更新接口不读取图片
+"""
+
+import asyncio
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+import crud
+import database
+import models
+
+def test_sparse_fields():
+    print("🧪 测试fields参数...")
+    engine = database._create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(models.Car(region="其他", contact="c", description="d", image_base64="data:image/jpeg;base64,QUJD",
+                      thumbnail_base64="data:image/jpeg;base64,REVG", image_width=800, image_height=600))
+    db.commit()
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+
+    # 1. 字段解析：id总是包含，未知字段返回400
+    assert crud.parse_fields("region, region,created_at") == ("id", "region", "created_at")
+    assert crud.parse_fields(None, crud.MUTATION_FIELDS) == crud.MUTATION_FIELDS
+    try:
+        crud.parse_fields("id,password")
+        raise AssertionError("未知字段应该返回400")
+    except HTTPException as e:
+        assert e.status_code == 400
+    print("   ✓ 字段解析")
+
+    # 2. 列表和详情只查询请求的列
+    result = crud.get_cars(db, fields="region")
+    assert result["cars"] == [{"id": 1, "region": "其他"}]
+    details = crud.get_car_details(db, 1, fields="image_width,image_height")
+    assert details == {"id": 1, "image_width": 800, "image_height": 600}
+    assert not any("image_base64" in statement or "thumbnail" in statement for statement in statements)
+    assert crud.get_car_details(db, 1)["image_base64"] == "data:image/jpeg;base64,QUJD"
+    assert crud.get_cars(db)["cars"][0]["thumbnail_base64"] == "data:image/jpeg;base64,REVG"
+    print("   ✓ 按字段选择SQL列")
+
+    # 3. 更新默认不回传图片，也不读取图片列
+    statements.clear()
+    updated = asyncio.run(crud.update_car(db, 1, region="上海", description="新描述"))
+    assert "image_base64" not in updated and updated["region"] == "上海" and updated["description"] == "新描述"
+    assert not any("image_base64" in statement for statement in statements)
+    updated = asyncio.run(crud.update_car(db, 1, contact="c2", fields="contact,image_base64"))
+    assert updated == {"id": 1, "contact": "c2", "image_base64": "data:image/jpeg;base64,QUJD"}
+    print("   ✓ 更新接口精简响应")
+    db.close()
+
+if __name__ == "__main__":
+    test_sparse_fields()
+    print("\n✅ fields参数测试完成！")
\ No newline at end of file
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+测试SQLite嵌入模式：连接参数调优、跨数据库字段类型、多线程读写
+"""
+
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+import database
+import models
+
+def test_sqlite_mode():
+    print("🧪 测试SQLite嵌入模式...")
+    path = os.path.join(tempfile.mkdtemp(), "car_pic.db")
+    engine = database._create_engine(f"sqlite:///{path}")
+
+    # 1. WAL、synchronous=NORMAL、内存映射
+    with engine.connect() as connection:
+        pragmas = {name: connection.execute(text(f"PRAGMA {name}")).scalar() for name in ("journal_mode", "synchronous", "mmap_size")}
+    assert pragmas["journal_mode"] == "wal" and pragmas["synchronous"] == 1 and pragmas["mmap_size"] > 0
+    print("   ✓ 连接调优参数")
+
+    # 2. 模型可以直接在SQLite上建表，大字段使用通用类型
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    image = "data:image/jpeg;base64," + "A" * 200000
+    with Session() as db:
+        db.add(models.Car(region="其他", image_base64=image, image_data=b"\xff\xd8" * 50000))
+        db.commit()
+        car = db.query(models.Car).first()
+        assert car.image_base64 == image and len(car.image_data) == 100000 and car.status == "ready"
+    print("   ✓ 建表与大字段读写")
+
+    # 3. 多线程并发写入和读取（WAL下读不阻塞写）
+    def insert_and_count(index):
+        with Session() as db:
+            db.add(models.Car(region=f"区域{index % 4}", description=f"车辆{index}"))
+            db.commit()
+            return db.query(models.Car).count()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        counts = list(pool.map(insert_and_count, range(40)))
+    assert max(counts) == 41
+    print("   ✓ 多线程读写")
+
+    # 4. 内存数据库在所有会话间共享同一个连接
+    memory_engine = database._create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=memory_engine)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        assert pool.submit(lambda: sessionmaker(bind=memory_engine)().query(models.Car).count()).result() == 0
+    print("   ✓ 内存数据库")
+
+if __name__ == "__main__":
+    test_sqlite_mode()
+    print("\n✅ SQLite嵌入模式测试完成！")
\ No newline at end of file
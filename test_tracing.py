@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+测试链路追踪：嵌套span、线程池上下文传递、SQL span和OTLP/JSON文件导出
+"""
+
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+import database  # noqa: F401  注册SQL事件
+import tracing
+from config import settings
+from storage_service import storage_service
+from testing import make_jpeg
+
+def read_spans(path):
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            for resource in json.loads(line)["resourceSpans"]:
+                for scope in resource["scopeSpans"]:
+                    spans.extend(scope["spans"])
+    return {span["name"]: span for span in spans}
+
+def test_tracing():
+    print("🧪 测试链路追踪...")
+    path = os.path.join(tempfile.mkdtemp(), "spans.jsonl")
+    original_export, original_rate = settings.TRACE_EXPORT, settings.TRACE_SAMPLE_RATE
+    settings.TRACE_EXPORT, settings.TRACE_SAMPLE_RATE = f"file:{path}", 1.0
+    tracing._exporter = None
+
+    # database模块导入时已为Engine类注册SQL事件，对任何引擎都生效
+    engine = create_engine("sqlite://")
+    
+    try:
+        # 1. 没有根span时不记录
+        with tracing.span("orphan") as span:
+            assert span is None
+        print("   ✓ 请求外不产生span")
+
+        # 2. 根span → 线程池中的图片处理 → SQL
+        traceparent = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+        with tracing.span("POST /api/cars", kind=tracing.KIND_SERVER, root=True, traceparent=traceparent) as root:
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(tracing.bind_context(storage_service.process_image), make_jpeg((2400, 1600))).result()
+            assert result["width"] == 1620
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        tracing.flush()
+
+        spans = read_spans(path)
+        assert "orphan" not in spans
+        assert spans["POST /api/cars"]["traceId"] == "a" * 32
+        assert spans["POST /api/cars"]["parentSpanId"] == "b" * 16
+        assert {span["traceId"] for span in spans.values()} == {"a" * 32}
+        print("   ✓ 延续客户端traceparent")
+
+        process = spans["image.process"]
+        assert process["parentSpanId"] == root.span_id
+        for stage in ("image.decode", "image.resize", "image.encode", "image.thumbnail", "image.phash"):
+            assert spans[stage]["parentSpanId"] == process["spanId"], stage
+        print("   ✓ 线程池中的图片处理阶段挂在请求链路下")
+
+        sql = spans["sql SELECT"]
+        assert sql["parentSpanId"] == root.span_id and sql["kind"] == tracing.KIND_CLIENT
+        assert {"key": "db.statement", "value": {"stringValue": "SELECT 1"}} in sql["attributes"]
+        print("   ✓ SQL语句span")
+    finally:
+        settings.TRACE_EXPORT, settings.TRACE_SAMPLE_RATE = original_export, original_rate
+        tracing._exporter = None
+
+if __name__ == "__main__":
+    test_tracing()
+    print("\n✅ 链路追踪测试完成！")
\ No newline at end of file
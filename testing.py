@@ -0,0 +1,36 @@
+"""
+测试共用的构造函数：测试图片、上传文件和SQLite内存数据库
+测试文件既可以用pytest运行也可以直接作为脚本运行，因此放在普通模块中而不是conftest.py
+"""
+
+import io
+from PIL import Image
+from sqlalchemy.orm import sessionmaker
+from starlette.datastructures import Headers, UploadFile
+import database
+import models
+
+def make_jpeg(size=(320, 240), color=(200, 30, 30), quality=90) -> bytes:
+    """生成纯色JPEG图片"""
+    output = io.BytesIO()
+    Image.new("RGB", size, color).save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+def make_upload(content, content_type: str = "image/jpeg", filename: str = "car.jpg") -> UploadFile:
+    """构造上传文件，content为字节或文件对象"""
+    file = io.BytesIO(content) if isinstance(content, bytes) else content
+    return UploadFile(file=file, filename=filename, headers=Headers({"content-type": content_type}))
+
+def create_engine(url: str = "sqlite://"):
+    """创建数据库引擎并建表（默认SQLite内存数据库，不连接生产数据库）"""
+    engine = database._create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    return engine
+
+def create_session(regions=(), url: str = "sqlite://"):
+    """创建会话，并按顺序写入区域"""
+    db = sessionmaker(bind=create_engine(url))()
+    if regions:
+        db.add_all([models.Region(name=name, sort_order=index) for index, name in enumerate(regions)])
+        db.commit()
+    return db
\ No newline at end of file
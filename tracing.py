@@ -0,0 +1,311 @@
+"""
+请求链路追踪
+记录 接口 → crud → 图片处理各阶段 → SQL 的嵌套耗时（span），以OTLP/JSON格式导出到本地文件或采集器，
+用于离线分析关键路径。通过 TRACE_EXPORT 开启：
+    TRACE_EXPORT=file:traces.jsonl                      # 每批span写一行OTLP/JSON
+    TRACE_EXPORT=http://localhost:4318/v1/traces        # 发送到OpenTelemetry Collector（OTLP/HTTP JSON）
+未开启或请求未被采样时，span() 直接返回，几乎没有开销。
+"""
+
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "car-pic-back"
+
+# OTLP span kind
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str] = None, kind: int = KIND_INTERNAL):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = {}
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self, error: BaseException = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _export(self)
+
+    @property
+    def traceparent(self) -> str:
+        """W3C traceparent，用于跨进程传递（如写入图片处理任务）"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def parse_traceparent(header: Optional[str]):
+    """解析W3C traceparent，返回 (trace_id, parent_span_id) 或 None"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def current_traceparent() -> Optional[str]:
+    span = _current_span.get()
+    return span.traceparent if span else None
+
+def enabled() -> bool:
+    return _get_exporter() is not None
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, root: bool = False, traceparent: str = None, **attributes):
+    """
+    创建嵌套span
+    默认只在已有span（已采样的请求或任务）内部创建子span；root=True 时开始新的链路（按采样率采样），
+    traceparent 用于延续其他进程传来的链路
+    """
+    parent = _current_span.get()
+    if parent is not None:
+        trace_id, parent_span_id = parent.trace_id, parent.span_id
+    elif (root or traceparent) and enabled():
+        remote = parse_traceparent(traceparent)
+        if remote:
+            trace_id, parent_span_id = remote
+        elif random.random() < _sample_rate():
+            trace_id, parent_span_id = os.urandom(16).hex(), None
+        else:
+            yield None
+            return
+    else:
+        yield None
+        return
+
+    current = Span(name, trace_id, parent_span_id, kind)
+    current.attributes.update(attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(error=e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+def start_span(name: str, kind: int = KIND_INTERNAL, **attributes) -> Optional[Span]:
+    """创建不改变当前上下文的子span（用于SQL等无法使用with的场景），需要调用方 end()"""
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    child = Span(name, parent.trace_id, parent.span_id, kind)
+    child.attributes.update(attributes)
+    return child
+
+def traced(name: str = None):
+    """为函数（同步或异步）创建span，默认名称为 模块.函数名"""
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__name__}"
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def bind_context(func):
+    """
+    绑定当前上下文，使线程池中执行的函数延续调用方的链路
+    （run_in_executor 不会自动复制contextvars）
+    """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, func)
+
+def instrument_engine(engine_class):
+    """为SQLAlchemy引擎注册事件，每条SQL语句记录一个span"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine_class, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        child = start_span(
+            "sql " + statement.split(None, 1)[0].upper() if statement else "sql",
+            kind=KIND_CLIENT,
+            **{"db.system": conn.dialect.name, "db.statement": statement[:500]}
+        )
+        if context is not None:
+            context._trace_span = child
+
+    @event.listens_for(engine_class, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        child = getattr(context, "_trace_span", None)
+        if child is not None:
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                child.set_attribute("db.rowcount", cursor.rowcount)
+            child.end()
+
+    @event.listens_for(engine_class, "handle_error")
+    def _handle_error(exception_context):
+        child = getattr(exception_context.execution_context, "_trace_span", None)
+        if child is not None:
+            child.end(error=exception_context.original_exception)
+
+# 导出
+
+class _Exporter:
+    """后台线程批量导出span，队列满时丢弃（不阻塞请求）"""
+
+    def __init__(self, target: str, batch_size: int = 512, interval: float = 1.0):
+        self.target = target
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=10000)
+        self.dropped = 0
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, name="trace-exporter", daemon=True).start()
+        atexit.register(self.flush)
+
+    def submit(self, finished: Span):
+        try:
+            self.queue.put_nowait(finished)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self) -> list:
+        spans = []
+        while len(spans) < self.batch_size:
+            try:
+                spans.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return spans
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            while True:
+                spans = self._drain()
+                if not spans:
+                    return
+                try:
+                    self._write(spans)
+                except Exception as e:
+                    logger.warning(f"导出链路追踪数据失败: {e}")
+                    return
+
+    def _write(self, spans: list):
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+                    {"key": "process.pid", "value": {"intValue": str(os.getpid())}}
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "tracing"},
+                    "spans": [item.to_otlp() for item in spans]
+                }]
+            }]
+        }
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+        if self.target.startswith(("http://", "https://")):
+            request = urllib.request.Request(
+                self.target, data=body.encode("utf-8"), headers={"Content-Type": "application/json"}, method="POST"
+            )
+            urllib.request.urlopen(request, timeout=5).close()
+        else:
+            path = self.target[len("file:"):] if self.target.startswith("file:") else self.target
+            with open(path, "a", encoding="utf-8") as output:
+                output.write(body + "\n")
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+def _get_exporter() -> Optional[_Exporter]:
+    global _exporter
+    if _exporter is None:
+        from config import settings
+        if not settings.TRACE_EXPORT:
+            return None
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = _Exporter(settings.TRACE_EXPORT)
+    return _exporter
+
+def _sample_rate() -> float:
+    from config import settings
+    return settings.TRACE_SAMPLE_RATE
+
+def _export(finished: Span):
+    exporter = _get_exporter()
+    if exporter is not None:
+        exporter.submit(finished)
+
+def flush():
+    """立即导出缓冲中的span（测试和进程退出时使用）"""
+    exporter = _get_exporter()
+    if exporter is not None:
+        exporter.flush()
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+应用预热
+启动后在后台线程中预热数据库连接池、Pillow编解码器、bcrypt后端和内存索引，
+预热完成前就绪检查（/readyz）返回503，存活检查（/healthz）始终返回200。
+"""
+
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 进程导入起点，用于统计“导入到就绪”耗时
+IMPORT_STARTED = time.perf_counter()
+
+class WarmupState:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = False
+        self.ready = False
+        self.steps = {}  # 步骤名 -> {"status": "ok"/"failed", "ms": 耗时, "error": 错误}
+        self.import_to_ready_ms = None
+
+    def record(self, name: str, elapsed: float, error: Exception = None):
+        with self._lock:
+            step = {"status": "failed" if error else "ok", "ms": round(elapsed * 1000, 1)}
+            if error:
+                step["error"] = str(error)
+            self.steps[name] = step
+
+    def mark_ready(self):
+        with self._lock:
+            self.ready = True
+            self.import_to_ready_ms = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+
+    def mark_started(self) -> bool:
+        """标记预热已开始，重复调用返回False"""
+        with self._lock:
+            if self.started:
+                return False
+            self.started = True
+            return True
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "steps": dict(self.steps),
+                "import_to_ready_ms": self.import_to_ready_ms,
+                "uptime_s": round(time.perf_counter() - IMPORT_STARTED, 1)
+            }
+
+warmup_state = WarmupState()
+
+def warm_database_pool():
+    """同时建立多个连接，使连接池在首个请求前就有可用连接"""
+    from database import engine
+    from config import settings
+
+    connections = []
+    try:
+        for _ in range(min(settings.DB_POOL_WARM_CONNECTIONS, settings.DB_POOL_SIZE)):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.exec_driver_sql("SELECT 1")
+    finally:
+        for connection in connections:
+            connection.close()
+
+def check_database_schema():
+    """检查数据库结构（不修改），缺失时记录警告并提示运行migrate.py"""
+    from database import engine
+    from migrate import check_schema
+
+    problems = check_schema(engine)
+    if problems:
+        missing = ", ".join(f"{table}.{name}" for _, table, name in problems)
+        raise RuntimeError(f"数据库结构与模型不一致: {missing}，请运行 python migrate.py upgrade")
+
+def warm_pillow():
+    """加载Pillow编解码插件，并完整走一遍JPEG编码、解码、缩放"""
+    import io
+    from PIL import Image
+
+    Image.init()
+    output = io.BytesIO()
+    Image.new('RGB', (64, 64), (128, 128, 128)).save(output, format='JPEG', quality=70, optimize=True)
+    image = Image.open(io.BytesIO(output.getvalue()))
+    image.draft('L', (8, 8))
+    image.convert('RGB').resize((32, 32), Image.Resampling.LANCZOS)
+
+# 低成本（rounds=4）的bcrypt哈希，只用于触发后端加载
+_WARMUP_BCRYPT_HASH = "$2b$04$jaEXcAb2.iii9n6Y9cOo8./LmS51nS5skElkxmd.56wXShxVmW9De"
+
+def warm_auth():
+    """加载bcrypt后端与JWT库（bcrypt后端在首次使用时才会加载）"""
+    import crud
+    from jose import jwt
+
+    crud.get_pwd_context().verify("warmup", _WARMUP_BCRYPT_HASH)
+    jwt.encode({"sub": "warmup"}, "warmup", algorithm="HS256")
+
+def load_indexes():
+    """从数据库重建图片相似度索引和本地全文检索索引"""
+    from database import SessionLocal
+    import crud
+
+    db = SessionLocal()
+    try:
+        count = crud.rebuild_similarity_index(db)
+        logger.info(f"图片相似度索引已加载: {count} 条")
+        count = crud.rebuild_search_index(db)
+        if count is not None:
+            logger.info(f"本地全文检索索引已加载: {count} 条")
+    finally:
+        db.close()
+
+WARMUP_STEPS = [
+    ("database_pool", warm_database_pool),
+    ("database_schema", check_database_schema),
+    ("pillow", warm_pillow),
+    ("auth", warm_auth),
+    ("indexes", load_indexes),
+]
+
+# 这些步骤失败时服务不可用，会按间隔重试直到成功；其余步骤失败只记录警告
+# 数据库结构缺失时请求会报错，就绪检查保持503直到运行migrate.py后重试通过
+REQUIRED_STEPS = {"database_pool", "database_schema"}
+RETRY_INTERVAL_SECONDS = 5
+
+def run_warmup():
+    """依次执行预热步骤，全部完成后标记就绪"""
+    for name, step in WARMUP_STEPS:
+        while True:
+            started = time.perf_counter()
+            try:
+                step()
+                warmup_state.record(name, time.perf_counter() - started)
+                break
+            except Exception as e:
+                warmup_state.record(name, time.perf_counter() - started, e)
+                logger.warning(f"预热步骤 {name} 失败: {e}")
+                if name not in REQUIRED_STEPS:
+                    break
+                time.sleep(RETRY_INTERVAL_SECONDS)
+
+    warmup_state.mark_ready()
+    logger.info(f"预热完成，导入到就绪耗时 {warmup_state.import_to_ready_ms}ms")
+
+def refresh_indexes_periodically(interval: int):
+    """
+    定期重建内存索引
+    多进程部署时每个进程各自维护索引，只能感知本进程的写入，定期重建以同步其他进程的变更
+    """
+    while True:
+        time.sleep(interval)
+        try:
+            load_indexes()
+        except Exception as e:
+            logger.warning(f"内存索引重建失败: {e}")
+
+def follow_completed_jobs(interval: float):
+    """
+    异步处理模式下跟进工作进程完成的任务（更新本进程的相似度索引，内存缓存时使其失效）
+    """
+    from database import SessionLocal
+    from image_jobs import CompletedJobFollower
+
+    follower = CompletedJobFollower(SessionLocal)
+    while True:
+        try:
+            follower.poll()
+        except Exception as e:
+            logger.warning(f"跟进已完成的图片处理任务失败: {e}")
+        time.sleep(interval)
+
+def start_warmup():
+    """在后台线程中启动预热，不阻塞事件循环和端口监听"""
+    from config import settings
+
+    if not warmup_state.mark_started():
+        return
+    threading.Thread(target=run_warmup, name="warmup", daemon=True).start()
+    if settings.INDEX_REFRESH_SECONDS > 0:
+        threading.Thread(
+            target=refresh_indexes_periodically,
+            args=(settings.INDEX_REFRESH_SECONDS,),
+            name="index-refresh",
+            daemon=True
+        ).start()
+    if settings.IMAGE_PROCESSING_MODE == "queue":
+        threading.Thread(
+            target=follow_completed_jobs,
+            args=(settings.JOB_FOLLOW_INTERVAL,),
+            name="job-follower",
+            daemon=True
+        ).start()
\ No newline at end of file
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+图片处理工作进程
+消费 image_jobs 任务表，为异步上传（IMAGE_PROCESSING_MODE=queue）的车辆生成图片和缩略图
+
+用法:
+    python worker.py                    # 按CPU配额启动处理线程，持续运行
+    python worker.py --concurrency 4    # 指定处理线程数
+    python worker.py --once             # 处理完当前所有任务后退出
+可以在多台机器上同时运行多个工作进程，任务通过数据库租约分配，不会重复处理
+"""
+
+import os
+import sys
+import argparse
+import signal
+import logging
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    from start import detect_cpu_count
+
+    parser = argparse.ArgumentParser(description="图片处理工作进程")
+    parser.add_argument("--concurrency", type=int, default=0, help="处理线程数（默认按CPU配额自动检测）")
+    parser.add_argument("--once", action="store_true", help="处理完当前任务后退出")
+    args = parser.parse_args()
+
+    concurrency = args.concurrency or detect_cpu_count()
+    # 每个处理线程占用一个数据库连接
+    os.environ.setdefault("DB_POOL_SIZE", str(concurrency))
+    os.environ.setdefault("DB_MAX_OVERFLOW", "2")
+
+    from database import SessionLocal
+    from image_jobs import Worker
+
+    worker = Worker(SessionLocal, concurrency=concurrency)
+
+    if args.once:
+        owner = f"{worker.owner_prefix}:once"
+        while worker.run_once(owner) is not None:
+            pass
+        logger.info(f"✓ 任务处理完成，共处理 {worker.processed} 个")
+        return
+
+    def shutdown(signum, frame):
+        logger.info("收到退出信号，处理完当前任务后退出...")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    logger.info(f"🚗 图片处理工作进程启动: {concurrency} 个处理线程")
+    threads = worker.start()
+    for thread in threads:
+        # 带超时的join，保证主线程能及时响应信号
+        while thread.is_alive():
+            thread.join(timeout=1)
+    logger.info(f"✓ 工作进程已退出，共处理 {worker.processed} 个任务")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file